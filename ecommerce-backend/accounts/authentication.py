@@ -0,0 +1,130 @@
+"""
+JWT authentication without a ``users`` query per request.
+
+``CachedJWTAuthentication`` resolves the user of a token from a bounded
+in-process LRU (``AUTH_USER_CACHE_SIZE`` users, each kept for
+``AUTH_USER_CACHE_LOCAL_SECONDS``), then from the shared cache (kept for
+``AUTH_USER_CACHE_SECONDS``), and only then from the database. The checks
+``JWTAuthentication`` makes (inactive users, ``CHECK_REVOKE_TOKEN``) apply
+to cached users the same way.
+
+Saving or deleting a user (profile updates, password changes, deactivation
+in the admin) drops the entry from the shared cache and from the LRU of the
+worker that made the change, and again once the transaction commits so a
+concurrent request cannot cache the row as it was. Other workers' LRUs keep
+their copy for up to ``AUTH_USER_CACHE_LOCAL_SECONDS``; that is how long a
+deactivated user can still be served by them. Updates that bypass
+``save()`` (``QuerySet.update``) must call ``invalidate_user``.
+
+Every request gets its own copy of the cached user, so views may change and
+save ``request.user``. The cached row includes the password hash, which
+``ChangePasswordView`` checks; the shared cache must not be reachable from
+outside.
+"""
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from monitoring.metrics import record_cache
+
+
+def cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+class UserCache:
+    """Thread-safe LRU of users with a time to live."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._users[user_id] = (time.monotonic() + settings.AUTH_USER_CACHE_LOCAL_SECONDS, user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > settings.AUTH_USER_CACHE_SIZE:
+                self._users.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+users = UserCache()
+
+
+def _drop(user_id):
+    users.discard(user_id)
+    cache.delete(cache_key(user_id))
+
+
+def invalidate_user(user_id):
+    """Forget the cached user now and once the current transaction commits."""
+    _drop(user_id)
+    transaction.on_commit(lambda: _drop(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` resolving users through ``UserCache`` and the shared cache."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = self.cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
+
+    def cached_user(self, user_id):
+        """Return a copy of the user with ``user_id``, or ``None`` if there is none."""
+        user = users.get(user_id)
+        record_cache('auth_user_local', user is not None)
+        if user is None:
+            user = cache.get(cache_key(user_id))
+            record_cache('auth_user', user is not None)
+            if user is None:
+                try:
+                    user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+                except self.user_model.DoesNotExist:
+                    return None
+                cache.set(cache_key(user_id), user, settings.AUTH_USER_CACHE_SECONDS)
+            users.set(user_id, user)
+        return copy.copy(user)
@@ -0,0 +1,170 @@
+"""
+Refresh token blacklist.
+
+Rotated and logged-out refresh tokens are recorded in ``RevokedToken`` by
+id (``jti``). Each worker keeps a Bloom filter of the ids that have not
+expired, so checking a token that was never revoked, which is nearly every
+refresh, needs no query. A token the filter reports is confirmed with one
+indexed lookup, which also absorbs the filter's false positives
+(``TOKEN_BLACKLIST_ERROR_RATE``).
+
+The filter learns about revocations made by its own worker at once and
+about other workers' on the first check after ``TOKEN_BLACKLIST_SYNC_SECONDS``,
+which reads the rows revoked since the previous sync. A Bloom filter cannot
+forget, so every ``TOKEN_BLACKLIST_REBUILD_SECONDS``, or once it holds more
+ids than it was sized for, it is rebuilt from the unexpired rows in a
+background thread while the old one keeps answering. Expired rows are
+deleted in batches by ``manage.py prune_revoked_tokens``; the filter drops
+them at its next rebuild.
+"""
+from datetime import timedelta
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from monitoring.metrics import record_cache
+from .models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Incremental syncs re-read this much before the previous one, so rows of
+# transactions that committed after it started are not missed.
+SYNC_OVERLAP = timedelta(seconds=10)
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationFilter:
+    """The worker's Bloom filter of revoked token ids; see the module docstring."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._synced_from = None
+        self._synced_at = 0.0
+        self._built_at = 0.0
+        self._rebuilding = False
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+
+    def _build(self):
+        """Return a filter of the unexpired ids and the time its rows were read from."""
+        started = timezone.now()
+        jtis = list(RevokedToken.objects.filter(expires_at__gt=started).values_list('jti', flat=True))
+        bloom = BloomFilter(
+            max(len(jtis) * 2, settings.TOKEN_BLACKLIST_MIN_CAPACITY), settings.TOKEN_BLACKLIST_ERROR_RATE
+        )
+        for jti in jtis:
+            bloom.add(jti)
+        return bloom, started
+
+    def _sync(self):
+        """Add the ids revoked since the last sync (caller holds the lock)."""
+        started = timezone.now()
+        for jti in RevokedToken.objects.filter(revoked_at__gte=self._synced_from - SYNC_OVERLAP).values_list(
+            'jti', flat=True
+        ):
+            self._filter.add(jti)
+        self._synced_from = started
+        self._synced_at = time.monotonic()
+
+    def _rebuild_in_background(self):
+        def run():
+            try:
+                bloom, started = self._build()
+                with self._lock:
+                    self._filter = bloom
+                    self._built_at = time.monotonic()
+                    # Catch up on what was revoked while building.
+                    self._synced_from = min(started, self._synced_from)
+                    self._sync()
+            except Exception:
+                logger.exception('Revoked token filter rebuild failed')
+            finally:
+                self._rebuilding = False
+                connection.close()
+
+        self._rebuilding = True
+        threading.Thread(target=run, name='RevocationFilter-rebuild', daemon=True).start()
+
+    def _ensure_fresh(self):
+        with self._lock:
+            if self._filter is None:
+                self._filter, self._synced_from = self._build()
+                self._synced_at = self._built_at = time.monotonic()
+                return
+            now = time.monotonic()
+            if now - self._synced_at > settings.TOKEN_BLACKLIST_SYNC_SECONDS:
+                self._sync()
+            if not self._rebuilding and (
+                now - self._built_at > settings.TOKEN_BLACKLIST_REBUILD_SECONDS
+                or self._filter.count > self._filter.capacity
+            ):
+                self._rebuild_in_background()
+
+    def might_contain(self, jti):
+        self._ensure_fresh()
+        return jti in self._filter
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+
+revoked = RevocationFilter()
+
+
+def is_revoked(jti):
+    """Whether the refresh token ``jti`` was revoked; queries only if the filter says so."""
+    maybe = revoked.might_contain(jti)
+    record_cache('revoked_token_filter', not maybe)
+    return maybe and RevokedToken.objects.filter(jti=jti).exists()
+
+
+def revoke(jti, expires_at):
+    RevokedToken.objects.bulk_create([RevokedToken(jti=jti, expires_at=expires_at)], ignore_conflicts=True)
+    revoked.add(jti)
+
+
+def prune_expired(batch_size=1000):
+    """Delete expired rows ``batch_size`` at a time; returns how many were deleted."""
+    deleted = 0
+    expired = RevokedToken.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at')
+    while True:
+        ids = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += RevokedToken.objects.filter(pk__in=ids).delete()[0]
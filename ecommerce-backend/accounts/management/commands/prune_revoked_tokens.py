@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from accounts.blacklist import prune_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired refresh tokens from the blacklist, in batches (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = prune_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired revoked token(s)'))
@@ -64,4 +64,25 @@ class User(AbstractBaseUser, PermissionsMixin):
     
     def get_short_name(self):
         """Return the user's first name."""
-        return self.first_name or self.email
\ No newline at end of file
+        return self.first_name or self.email
+
+
+class RevokedToken(models.Model):
+    """
+    Refresh tokens that can no longer be used (rotated or logged out).
+
+    Only the token id is kept; rows past ``expires_at`` are pruned by
+    ``manage.py prune_revoked_tokens``. See ``accounts/blacklist.py``.
+    """
+    
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        db_table = 'revoked_tokens'
+        verbose_name = 'Revoked Token'
+        verbose_name_plural = 'Revoked Tokens'
+    
+    def __str__(self):
+        return self.jti
@@ -1,3 +1,223 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.settings import api_settings
+from config.throttling import retry_after
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import UserCache, cache_key, users
+from .blacklist import BloomFilter, is_revoked, prune_expired, revoked
+from .models import RevokedToken, User
 
-# Create your tests here.
+
+class CachedAuthenticationTests(APITestCase):
+    def setUp(self):
+        users.clear()
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        self.authenticate(self.user)
+
+    def authenticate(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def profile(self):
+        return self.client.get('/api/auth/profile/')
+
+    def test_user_resolved_from_caches(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.profile().status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.profile().json()['email'], 'buyer@example.com')
+        # Another worker: its LRU is empty but the shared cache has the user.
+        users.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.profile().status_code, 200)
+
+    def test_changes_invalidate_the_cached_user(self):
+        self.profile()
+        response = self.client.patch('/api/auth/profile/', {'first_name': 'Ada'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(cache.get(cache_key(self.user.pk)))
+        self.assertEqual(self.profile().json()['first_name'], 'Ada')
+
+        response = self.client.post('/api/auth/change-password/', {
+            'old_password': 'pass12345', 'new_password': 'NewPass123!', 'new_password2': 'NewPass123!',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(users.get(self.user.pk))
+        response = self.client.post('/api/auth/change-password/', {
+            'old_password': 'NewPass123!', 'new_password': 'OtherPass123!', 'new_password2': 'OtherPass123!',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.user.refresh_from_db()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.profile().status_code, 401)
+
+    def test_revoked_tokens_rejected_for_cached_users(self):
+        with mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True):
+            self.authenticate(self.user)
+            self.assertEqual(self.profile().status_code, 200)
+            self.user.set_password('NewPass123!')
+            self.user.save()
+            self.assertEqual(self.profile().status_code, 401)
+
+    def test_requests_get_their_own_copy(self):
+        self.profile()
+        first = users.get(self.user.pk)
+        self.client.patch('/api/auth/profile/', {'last_name': 'Lovelace'}, format='json')
+        self.assertEqual(first.last_name, '')
+
+
+class UserCacheTests(APITestCase):
+    @override_settings(AUTH_USER_CACHE_SIZE=2, AUTH_USER_CACHE_LOCAL_SECONDS=30)
+    def test_bounded_lru_with_ttl(self):
+        lru = UserCache()
+        lru.set(1, 'one')
+        lru.set(2, 'two')
+        lru.get(1)
+        lru.set(3, 'three')
+        self.assertIsNone(lru.get(2))
+        self.assertEqual(lru.get(1), 'one')
+        with mock.patch('accounts.authentication.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(lru.get(3))
+
+
+class TokenBlacklistTests(APITestCase):
+    def setUp(self):
+        revoked.reset()
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        response = self.client.post(
+            '/api/auth/login/', {'email': 'buyer@example.com', 'password': 'pass12345'}, format='json'
+        )
+        self.tokens = response.json()
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/token/refresh/', {'refresh': token}, format='json')
+
+    def test_rotated_tokens_cannot_be_reused(self):
+        response = self.refresh(self.tokens['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+        self.assertEqual(self.refresh(response.json()['refresh']).status_code, 200)
+
+    def test_logout_revokes_the_refresh_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+        response = self.client.post('/api/auth/logout/', {'refresh_token': self.tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+
+    def test_only_positives_query_the_database(self):
+        expires_at = timezone.now() + timedelta(days=1)
+        RevokedToken.objects.create(jti='revoked', expires_at=expires_at)
+        self.assertFalse(is_revoked('valid'))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_revoked('other'))
+        with self.assertNumQueries(1):
+            self.assertTrue(is_revoked('revoked'))
+
+        # Revoked by another worker: seen once the filter syncs.
+        RevokedToken.objects.create(jti='elsewhere', expires_at=expires_at)
+        self.assertFalse(is_revoked('elsewhere'))
+        with self.settings(TOKEN_BLACKLIST_SYNC_SECONDS=-1):
+            self.assertTrue(is_revoked('elsewhere'))
+
+    def test_expired_rows_pruned_in_batches(self):
+        now = timezone.now()
+        RevokedToken.objects.bulk_create(
+            RevokedToken(jti=f'expired-{idx}', expires_at=now - timedelta(minutes=idx + 1)) for idx in range(5)
+        )
+        RevokedToken.objects.create(jti='live', expires_at=now + timedelta(days=1))
+        with self.assertNumQueries(7):
+            self.assertEqual(prune_expired(batch_size=2), 5)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+
+    def test_bloom_filter_error_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for idx in range(1000):
+            bloom.add(f'member-{idx}')
+        self.assertTrue(all(f'member-{idx}' in bloom for idx in range(1000)))
+        false_positives = sum(f'other-{idx}' in bloom for idx in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+THROTTLE_RATES = dict(
+    settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'],
+    login='3/min', registration='2/hour', search='1/min', checkout='1/min',
+)
+
+
+@override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=THROTTLE_RATES))
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        User.objects.create_user(email='buyer@example.com', password='pass12345')
+
+    def login(self, address='10.0.0.1', **headers):
+        return self.client.post(
+            '/api/auth/login/', {'email': 'buyer@example.com', 'password': 'wrong'},
+            format='json', REMOTE_ADDR=address, **headers,
+        )
+
+    def test_login_throttled_per_ip_with_retry_after(self):
+        with mock.patch('config.throttling.time.time', return_value=600.0):
+            self.assertEqual([self.login().status_code for _ in range(3)], [401] * 3)
+            response = self.login()
+            self.assertEqual(response.status_code, 429)
+            # The rejected attempt counts too: 4 requests in this window.
+            self.assertEqual(response['Retry-After'], '75')
+            self.assertEqual(self.login('10.0.0.2').status_code, 401)
+        # Half the previous window still counts: 4 * 0.5 + 1 is within 3 ...
+        with mock.patch('config.throttling.time.time', return_value=690.0):
+            self.assertEqual(self.login().status_code, 401)
+            # ... and 4 * 0.5 + 2 no longer is.
+            response = self.login()
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '15')
+
+    def test_forwarded_for_cannot_reset_the_counter(self):
+        statuses = [
+            self.login(HTTP_X_FORWARDED_FOR=f'203.0.113.{idx}').status_code for idx in range(4)
+        ]
+        self.assertEqual(statuses, [401] * 3 + [429])
+
+        # Behind one proxy, the address it appended is the client's.
+        with self.settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, NUM_PROXIES=1)):
+            statuses = [
+                self.login(HTTP_X_FORWARDED_FOR=f'203.0.113.{idx}, 198.51.100.7').status_code for idx in range(4)
+            ]
+            self.assertEqual(statuses, [401] * 3 + [429])
+            self.assertEqual(self.login(HTTP_X_FORWARDED_FOR='198.51.100.8').status_code, 401)
+
+    def test_registration_throttled(self):
+        statuses = [
+            self.client.post('/api/auth/register/', {}, format='json').status_code for _ in range(3)
+        ]
+        self.assertEqual(statuses, [400, 400, 429])
+
+    def test_search_and_checkout_throttled_per_user(self):
+        other = User.objects.create_user(email='other@example.com', password='pass12345')
+        self.client.force_authenticate(User.objects.get(email='buyer@example.com'))
+        self.assertEqual(self.client.get('/api/products/search/').status_code, 200)
+        self.assertEqual(self.client.get('/api/products/search/').status_code, 429)
+        self.assertEqual(self.client.get('/api/products/').status_code, 200)
+        self.assertEqual(self.client.post('/api/orders/', {}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/orders/', {}, format='json').status_code, 429)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/api/products/search/').status_code, 200)
+
+    def test_disabled(self):
+        with self.settings(THROTTLING_ENABLED=False):
+            self.assertEqual([self.login().status_code for _ in range(5)], [401] * 5)
+
+    def test_retry_after(self):
+        # 10/min, 30s into a window: 10 now, so wait for the window to end.
+        self.assertEqual(retry_after(10, 60, 10, 0, 30), 30)
+        # 5 now and 10 before: wait until the previous window weighs under 5.
+        self.assertEqual(retry_after(10, 60, 5, 10, 20), 10)
@@ -0,0 +1,25 @@
+"""
+Refresh tokens checked against the blacklist in ``accounts/blacklist.py``
+(simplejwt's own blacklist app is not installed).
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from . import blacklist
+
+
+class RefreshToken(tokens.RefreshToken):
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        self.check_blacklist()
+
+    def check_blacklist(self):
+        if blacklist.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        """Revoke this token: rotation (``BLACKLIST_AFTER_ROTATION``) and logout."""
+        blacklist.revoke(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp']))
@@ -2,8 +2,10 @@ from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
+from config.throttling import LoginThrottle, RegistrationThrottle
 from .models import User
+from .tokens import RefreshToken
 from .serializers import (
     UserRegistrationSerializer,
     UserSerializer,
@@ -20,6 +22,7 @@ class UserRegistrationView(generics.CreateAPIView):
     """
     queryset = User.objects.all()
     permission_classes = [AllowAny]
+    throttle_classes = [RegistrationThrottle]
     serializer_class = UserRegistrationSerializer
     
     def create(self, request, *args, **kwargs):
@@ -40,6 +43,15 @@ class UserRegistrationView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class LoginView(TokenObtainPairView):
+    """
+    API endpoint for obtaining JWT tokens, throttled per client IP.
+    
+    POST /api/auth/login/
+    """
+    throttle_classes = [LoginThrottle]
+
+
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """
     API endpoint for viewing and updating user profile.
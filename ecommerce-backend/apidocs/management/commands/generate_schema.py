@@ -0,0 +1,19 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from apidocs.schema import OUTPUT_FILE, generate
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema served as a static file (run before collectstatic)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(OUTPUT_FILE), help='File to write the schema to')
+
+    def handle(self, *args, **options):
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        schema = generate()
+        output.write_bytes(schema)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(schema)} bytes of OpenAPI schema to {output}'))
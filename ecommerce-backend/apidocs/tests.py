@@ -0,0 +1,37 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+
+class GenerateSchemaTests(TestCase):
+    def test_schema_is_written_without_queries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'openapi.json'
+            with self.assertNumQueries(0):
+                call_command('generate_schema', '--output', str(output), stdout=StringIO())
+            schema = json.loads(output.read_text())
+        self.assertEqual(schema['info']['title'], 'E-Commerce API')
+        self.assertNotIn('host', schema)
+        self.assertIn('/products/', schema['paths'])
+        self.assertIn('/orders/{id}/', schema['paths'])
+        self.assertIn('Bearer', schema['securityDefinitions'])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class DocsViewTests(TestCase):
+    def test_root_is_a_health_check(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_docs_load_the_static_schema(self):
+        for path in ('/api/docs/', '/api/redoc/'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, '"url": "/api/schema/"')
+        self.assertRedirects(
+            self.client.get('/api/schema/'), '/static/apidocs/openapi.json', fetch_redirect_response=False
+        )
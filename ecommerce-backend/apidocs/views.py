@@ -0,0 +1,31 @@
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+from django.views import View
+
+from .schema import STATIC_PATH, TITLE
+
+
+class DocsView(View):
+    """
+    Swagger UI or ReDoc page. The UI fetches the schema from ``SPEC_URL``
+    (``schema-json``), so rendering the page never generates it.
+    """
+    # Name of the drf_yasg renderer class.
+    renderer = None
+
+    def get(self, request):
+        # Imported on first use: workers that never serve docs skip drf_yasg.
+        from drf_yasg import renderers
+
+        renderer = getattr(renderers, self.renderer)()
+        context = {'request': request}
+        renderer.set_context(context)
+        context['title'] = TITLE
+        return HttpResponse(render_to_string(renderer.template, context, request))
+
+
+def schema_view(request):
+    """Redirect to the pregenerated schema, served by whitenoise."""
+    return redirect(static(STATIC_PATH))
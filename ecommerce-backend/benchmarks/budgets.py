@@ -0,0 +1,169 @@
+"""
+Per-endpoint query budgets, enforced by ``QueryBudgetTests``.
+
+Each scenario in ``SCENARIOS`` has a budget: the most queries one request
+may run. Budgets must hold whatever the amount of data, so every scenario
+is run against two dataset sizes; a query count that grows with the size is
+an N+1 even while it is still under budget. Failures list the statements
+that repeat within the request, grouped by fingerprint, with the line of
+application code that issued them.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from accounts.models import User
+from orders.models import Cart, CartItem, Order, OrderItem
+from products.models import Category, Product, ProductImage, Review
+from .runner import ClientDriver, QueryRecorder
+from .scenarios import BENCHMARK_STOCK, SCENARIOS
+
+QUERY_BUDGETS = {
+    # count, page, images, reviews
+    'product-list': 4,
+    'product-list-filtered': 4,
+    'product-search': 4,
+    # product, images, reviews, review users, category children and count
+    'product-detail': 6,
+    # count, page, all categories, product counts
+    'category-tree': 4,
+    # category, products, images, reviews
+    'category-products': 4,
+    # user, stock checks, cart upsert (with savepoint) and the cart below
+    'cart-add': 11,
+    # user, cart, items with products, images, reviews
+    'cart-read': 5,
+    # user, stock check, order, item and stock update per item (one item)
+    'order-create': 6,
+    # user, count, page with item counts
+    'order-list': 3,
+    # user, order, items with products, images, reviews
+    'order-detail': 5,
+    'login': 1,
+}
+
+DATASET_SIZES = (2, 8)
+PASSWORD = 'budget-password'
+
+
+def populate(size):
+    """
+    Create a dataset where every collection an endpoint returns has ``size``
+    members, and return the scenario fixtures.
+
+    A customer has ``size`` orders of ``size`` items and a cart of ``size``
+    items; the category has ``size`` products (two images and two reviews
+    each) and ``size`` subcategories with one child each.
+    """
+    password = make_password(PASSWORD)
+    customer = User.objects.create(email=f'budget-{size}@example.com', password=password)
+    reviewers = User.objects.bulk_create(
+        User(email=f'budget-{size}-reviewer-{idx}@example.com', password=password) for idx in range(2)
+    )
+
+    root = Category.objects.create(name=f'Budget {size}', slug=f'budget-{size}')
+    children = Category.objects.bulk_create(
+        Category(name=f'Budget {size} {idx}', slug=f'budget-{size}-{idx}', parent=root)
+        for idx in range(size)
+    )
+    Category.objects.bulk_create(
+        Category(name=f'{child.name} leaf', slug=f'{child.slug}-leaf', parent=child)
+        for child in children
+    )
+
+    products = Product.objects.bulk_create(
+        Product(
+            name=f'Budget Product {size} {idx}', slug=f'budget-product-{size}-{idx}',
+            description='Budget product', price=Decimal('10.00') + idx, category=root,
+            stock_quantity=BENCHMARK_STOCK, sku=f'BUDGET-{size}-{idx}',
+        )
+        for idx in range(size)
+    )
+    ProductImage.objects.bulk_create(
+        ProductImage(product=product, image_url=f'https://images.example.com/{product.slug}/{idx}.jpg',
+                     is_primary=idx == 0, display_order=idx)
+        for product in products for idx in range(2)
+    )
+    Review.objects.bulk_create(
+        Review(product=product, user=reviewer, rating=5) for product in products for reviewer in reviewers
+    )
+
+    cart = Cart.objects.create(user=customer)
+    CartItem.objects.bulk_create(CartItem(cart=cart, product=product) for product in products)
+    orders = Order.objects.bulk_create(
+        Order(order_number=f'BUDGET-{size}-{idx}', user=customer, total_amount=Decimal('10.00'),
+              shipping_address='1 Budget Street', billing_address='1 Budget Street')
+        for idx in range(size)
+    )
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=product, quantity=1, unit_price=product.price, subtotal=product.price)
+        for order in orders for product in products
+    )
+
+    return {
+        'user': customer,
+        'password': PASSWORD,
+        'order': orders[0],
+        'product': products[0],
+        'category': root,
+        'term': 'budget',
+    }
+
+
+def measure(driver, scenario, fixtures, token):
+    """Run ``scenario`` once and return the recorder with its statements."""
+    path, data = scenario.build(fixtures)
+    recorder = QueryRecorder(keep_sql=True)
+    with transaction.atomic():
+        if scenario.prepare:
+            scenario.prepare(fixtures)
+        with connection.execute_wrapper(recorder):
+            driver.request(scenario.method, path, data, token if scenario.auth else None)
+        transaction.set_rollback(True)
+    return recorder
+
+
+def repeated_statements(recorder):
+    """Return report lines for statements that ran more than once."""
+    counts = Counter(zip(recorder.fingerprints(), recorder.origins))
+    return [
+        f'    {count}x {fingerprint}\n       at {origin}'
+        for (fingerprint, origin), count in counts.most_common()
+        if count > 1
+    ]
+
+
+def check_budgets(scenarios=SCENARIOS, sizes=DATASET_SIZES, budgets=QUERY_BUDGETS):
+    """Return failure messages for scenarios over budget or growing with size."""
+    driver = ClientDriver()
+    runs = {scenario.name: [] for scenario in scenarios}
+    for size in sizes:
+        with transaction.atomic():
+            fixtures = populate(size)
+            token = driver.token(fixtures['user'], fixtures['password'])
+            for scenario in scenarios:
+                runs[scenario.name].append(measure(driver, scenario, fixtures, token))
+            transaction.set_rollback(True)
+
+    failures = []
+    for scenario in scenarios:
+        counts = [recorder.queries for recorder in runs[scenario.name]]
+        budget = budgets.get(scenario.name)
+        problems = []
+        if budget is None:
+            problems.append('no budget declared')
+        elif max(counts) > budget:
+            problems.append(f'over budget of {budget}')
+        if len(set(counts)) > 1:
+            problems.append('grows with dataset size')
+        if problems:
+            sizes_text = ' -> '.join(str(size) for size in sizes)
+            counts_text = ' -> '.join(str(count) for count in counts)
+            failures.append('\n'.join(
+                [f'{scenario.name}: {counts_text} queries at dataset sizes {sizes_text} '
+                 f"({', '.join(problems)})"]
+                + repeated_statements(runs[scenario.name][-1])
+            ))
+    return failures
@@ -0,0 +1,92 @@
+"""
+Concurrent load against a running server, for comparing deployments (sync
+gunicorn workers against ASGI workers, see the README).
+
+``concurrency`` clients share a fixed number of requests and each keeps one
+request in flight. Requests are plain HTTP/1.1 over a new connection each
+(gunicorn's sync workers close connections anyway), sent from one asyncio
+loop so the load generator itself does not need a thread per client.
+"""
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+async def _send(host, port, raw):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        status_line = await reader.readline()
+        # Connection: close, so the body ends with the connection.
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1]), time.perf_counter() - started
+
+
+async def _load(base_url, path, headers, requests, concurrency):
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    lines = [f'GET {path} HTTP/1.1', f'Host: {parts.netloc}', 'Connection: close']
+    lines += [f'{name}: {value}' for name, value in headers.items()]
+    raw = ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+    pending = iter(range(requests))
+    statuses, latencies = [], []
+
+    async def client():
+        for _ in pending:
+            try:
+                status, elapsed = await _send(host, port, raw)
+            except (OSError, IndexError, ValueError):
+                status, elapsed = 0, 0.0
+            statuses.append(status)
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return statuses, np.array(latencies), time.perf_counter() - started
+
+
+def run_scenario(base_url, scenario, fixtures, token, requests, concurrency, warmup):
+    """Load one GET scenario and return its result dict."""
+    path, _ = scenario.build(fixtures)
+    headers = {'Authorization': f'Bearer {token}'} if scenario.auth else {}
+    requests = max(int(requests * scenario.iterations_factor), concurrency)
+    if warmup:
+        asyncio.run(_load(base_url, path, headers, warmup, min(warmup, concurrency)))
+    statuses, latencies, elapsed = asyncio.run(_load(base_url, path, headers, requests, concurrency))
+
+    p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+    return {
+        'iterations': requests,
+        'concurrency': concurrency,
+        'errors': sum(status not in scenario.expected for status in statuses),
+        'throughput_rps': round(requests / elapsed, 1),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(latencies.mean() * 1000), 3),
+        'queries': None,
+        'rows': None,
+        'peak_memory_kb': None,
+    }
+
+
+def run(base_url, scenarios, fixtures, token, requests, concurrency, warmup=5, log=None):
+    """Load the GET ``scenarios`` one after another and return ``{name: result}``."""
+    results = {}
+    for scenario in scenarios:
+        if scenario.method != 'get':
+            # Writes need per-request preparation; they are measured sequentially.
+            continue
+        results[scenario.name] = run_scenario(
+            base_url, scenario, fixtures, token, requests, concurrency, warmup
+        )
+        if log:
+            log(scenario.name, results[scenario.name])
+    return results
@@ -0,0 +1,171 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from benchmarks import load, runner
+from benchmarks.scenarios import SCENARIOS, load_fixtures
+from products.synthetic import DatasetGenerator, DEFAULT_VOLUMES
+import json
+import platform
+import time
+
+DATASETS = {
+    'small': {name: value // 10 or value for name, value in DEFAULT_VOLUMES.items()},
+    'medium': DEFAULT_VOLUMES,
+    'large': {
+        name: value * 10 if name not in ('category_depth', 'images_per_product', 'cart_items', 'order_items')
+        else value
+        for name, value in DEFAULT_VOLUMES.items()
+    },
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark API endpoints: latency percentiles, queries, rows fetched and peak memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dataset',
+            choices=DATASETS,
+            default='small',
+            help='Size of the generated dataset (in-process runs)'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=[scenario.name for scenario in SCENARIOS],
+            help='Run only this scenario (repeatable)'
+        )
+        parser.add_argument(
+            '--url',
+            help='Benchmark a running server instead, e.g. http://localhost:8000; '
+                 'fixtures are read from the configured database'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='With --url: keep this many requests in flight and report throughput (GET scenarios)'
+        )
+        parser.add_argument('--password', default='loadtest123')
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the benchmark database (and its dataset) between runs'
+        )
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--compare', help='Baseline JSON file to check for regressions')
+        parser.add_argument('--threshold', type=float, default=runner.DEFAULT_THRESHOLD)
+
+    def handle(self, *args, **options):
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if not options['scenario'] or scenario.name in options['scenario']
+        ]
+
+        if options['concurrency'] > 1 and not options['url']:
+            raise CommandError('--concurrency needs --url.')
+        if options['url']:
+            results = self.benchmark(runner.LiveDriver(options['url']), scenarios, options)
+        else:
+            results = self.benchmark_in_process(scenarios, options)
+
+        report = {
+            'meta': {
+                'mode': 'live' if options['url'] else 'in-process',
+                'dataset': None if options['url'] else options['dataset'],
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'concurrency': options['concurrency'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = runner.compare(baseline['scenarios'], results, options['threshold'])
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(f'REGRESSION {regression}'))
+                raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+
+    def benchmark_in_process(self, scenarios, options):
+        setup_test_environment()
+        creation = connection.creation
+        old_name = connection.settings_dict['NAME']
+        creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+        try:
+            from products.models import Product
+            if not Product.objects.exists():
+                self.stdout.write(f"Generating {options['dataset']} dataset...")
+                DatasetGenerator(
+                    DATASETS[options['dataset']],
+                    seed=options['seed'],
+                    password=options['password'],
+                    log=lambda message: None,
+                ).run()
+            # One client sending every request would be throttled.
+            with override_settings(THROTTLING_ENABLED=False):
+                return self.benchmark(runner.ClientDriver(), scenarios, options)
+        finally:
+            creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+    def benchmark(self, driver, scenarios, options):
+        try:
+            fixtures = load_fixtures(options['password'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['concurrency'] > 1:
+            return self.benchmark_concurrent(driver, scenarios, fixtures, options)
+
+        self.stdout.write(
+            f"{'scenario':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'queries':>9}{'rows':>8}{'peak KB':>10}{'errors':>8}"
+        )
+
+        def log(name, result):
+            self.stdout.write(
+                f"{name:<24}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                f"{_fmt(result['queries']):>9}{_fmt(result['rows']):>8}"
+                f"{_fmt(result['peak_memory_kb']):>10}{result['errors']:>8}"
+            )
+
+        return runner.run(
+            driver, scenarios, fixtures,
+            iterations=options['iterations'], warmup=options['warmup'], log=log,
+        )
+
+    def benchmark_concurrent(self, driver, scenarios, fixtures, options):
+        token = driver.token(fixtures['user'], fixtures['password'])
+        self.stdout.write(
+            f"{'scenario':<24}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+        )
+
+        def log(name, result):
+            self.stdout.write(
+                f"{name:<24}{result['throughput_rps']:>9.1f}{result['p50_ms']:>9.2f}"
+                f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['errors']:>8}"
+            )
+
+        return load.run(
+            options['url'], scenarios, fixtures, token,
+            requests=options['iterations'], concurrency=options['concurrency'],
+            warmup=options['warmup'], log=log,
+        )
+
+
+def _fmt(value):
+    return '-' if value is None else value
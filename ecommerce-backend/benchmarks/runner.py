@@ -0,0 +1,265 @@
+"""
+Endpoint benchmark runner.
+
+Each scenario is requested a fixed number of times, either in-process
+through the Django test client or over HTTP against a running server.
+
+In-process runs also record the queries of every request (through a
+connection execute wrapper) and the rows fetched from the database, and
+trace one extra request with ``tracemalloc`` for peak memory. Each scenario
+runs in a transaction that is rolled back afterwards, so write scenarios do
+not change what later scenarios read.
+"""
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import json
+import os
+import time
+import traceback
+import tracemalloc
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from monitoring.sql import fingerprint
+
+# Relative slowdown (and absolute floor, in ms) tolerated by ``compare``.
+DEFAULT_THRESHOLD = 0.25
+MIN_LATENCY_DELTA_MS = 1.0
+
+
+def _origin():
+    """Return the innermost application frame issuing a query, as text."""
+    base = str(settings.BASE_DIR) + os.sep
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if filename.startswith(base) and filename != __file__:
+            return f'{filename[len(base):]}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+
+class RowCountingCursor:
+    """DB-API cursor proxy counting the rows fetched through it."""
+
+    def __init__(self, cursor, recorder):
+        self._cursor = cursor
+        self._recorder = recorder
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._recorder.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._recorder.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._recorder.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._recorder.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class QueryRecorder:
+    """
+    Execute wrapper counting queries and fetched rows on a connection.
+
+    Use as ``with connection.execute_wrapper(recorder):``. With
+    ``keep_sql=True`` the executed statements are kept as well, with the
+    application code line that issued each of them.
+    """
+
+    def __init__(self, keep_sql=False):
+        self.keep_sql = keep_sql
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.rows = 0
+        self.statements = []
+        self.origins = []
+
+    def fingerprints(self):
+        return [fingerprint(sql) for sql in self.statements]
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        if self.keep_sql:
+            self.statements.append(sql)
+            self.origins.append(_origin())
+        cursor = context['cursor']
+        if not isinstance(cursor.cursor, RowCountingCursor):
+            cursor.cursor = RowCountingCursor(cursor.cursor, self)
+        return execute(sql, params, many, context)
+
+
+class ClientDriver:
+    """Sends requests in-process through the Django test client."""
+
+    in_process = True
+
+    def __init__(self):
+        self.client = Client()
+
+    def token(self, user, password):
+        return str(RefreshToken.for_user(user).access_token)
+
+    def request(self, method, path, data=None, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        call = getattr(self.client, method)
+        if data is None:
+            response = call(path, secure=True, **headers)
+        else:
+            response = call(path, json.dumps(data), content_type='application/json', secure=True, **headers)
+        return response.status_code
+
+
+class LiveDriver:
+    """Sends requests over HTTP to a running server."""
+
+    in_process = False
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def token(self, user, password):
+        status, body = self._send('post', '/api/auth/login/', {'email': user.email, 'password': password})
+        if status != 200:
+            raise ValueError(f'Login as {user.email} failed with status {status}.')
+        return json.loads(body)['access']
+
+    def request(self, method, path, data=None, token=None):
+        return self._send(method, path, data, token)[0]
+
+    def _send(self, method, path, data=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        body = json.dumps(data).encode() if data is not None else None
+        request = Request(self.base_url + path, data=body, headers=headers, method=method.upper())
+        try:
+            with urlopen(request) as response:
+                return response.status, response.read()
+        except HTTPError as exc:
+            return exc.code, exc.read()
+
+
+def run_scenario(driver, scenario, fixtures, token, iterations, warmup):
+    """Run one scenario and return its result dict."""
+    path, data = scenario.build(fixtures)
+    token = token if scenario.auth else None
+    iterations = max(int(iterations * scenario.iterations_factor), 1)
+    recorder = QueryRecorder()
+
+    def send():
+        if scenario.prepare:
+            scenario.prepare(fixtures)
+        recorder.reset()
+        started = time.perf_counter()
+        status = driver.request(scenario.method, path, data, token)
+        return status, time.perf_counter() - started
+
+    for _ in range(warmup):
+        send()
+
+    latencies = np.empty(iterations)
+    queries = np.empty(iterations, dtype=np.int64)
+    rows = np.empty(iterations, dtype=np.int64)
+    errors = 0
+    with connection.execute_wrapper(recorder):
+        for idx in range(iterations):
+            status, latencies[idx] = send()
+            queries[idx], rows[idx] = recorder.queries, recorder.rows
+            errors += status not in scenario.expected
+
+        peak = None
+        if driver.in_process:
+            if scenario.prepare:
+                scenario.prepare(fixtures)
+            tracemalloc.start()
+            try:
+                driver.request(scenario.method, path, data, token)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+    result = {
+        'iterations': iterations,
+        'errors': errors,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(latencies.mean() * 1000), 3),
+        'queries': None,
+        'rows': None,
+        'peak_memory_kb': None,
+    }
+    if driver.in_process:
+        # Report the worst request: counts should not vary between calls.
+        result['queries'] = int(queries.max())
+        result['rows'] = int(rows.max())
+        result['peak_memory_kb'] = round(peak / 1024, 1)
+    return result
+
+
+def run(driver, scenarios, fixtures, iterations=100, warmup=5, log=None):
+    """Run ``scenarios`` and return ``{name: result}``."""
+    token = driver.token(fixtures['user'], fixtures['password'])
+    results = {}
+    for scenario in scenarios:
+        if driver.in_process:
+            with transaction.atomic():
+                results[scenario.name] = run_scenario(driver, scenario, fixtures, token, iterations, warmup)
+                transaction.set_rollback(True)
+        else:
+            results[scenario.name] = run_scenario(driver, scenario, fixtures, token, iterations, warmup)
+        if log:
+            log(scenario.name, results[scenario.name])
+    return results
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Return a list of regression messages of ``current`` against ``baseline``.
+
+    p50/p95 latency, rows and peak memory regress when they grow by more
+    than ``threshold``, throughput (concurrent runs) when it drops by more;
+    any growth in the query count is a regression. p99
+    is reported but too noisy at usual iteration counts to gate on.
+    """
+    regressions = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['errors'] > before['errors']:
+            regressions.append(f"{name}: errors {before['errors']} -> {result['errors']}")
+        for metric in ('p50_ms', 'p95_ms'):
+            old, new = before[metric], result[metric]
+            if new > old * (1 + threshold) and new - old >= MIN_LATENCY_DELTA_MS:
+                regressions.append(f'{name}: {metric} {old} -> {new}')
+        old, new = before.get('throughput_rps'), result.get('throughput_rps')
+        if old is not None and new is not None and new < old * (1 - threshold):
+            regressions.append(f'{name}: throughput_rps {old} -> {new}')
+        old, new = before.get('queries'), result['queries']
+        if old is not None and new is not None and new > old:
+            regressions.append(f'{name}: queries {old} -> {new}')
+        for metric in ('rows', 'peak_memory_kb'):
+            old, new = before.get(metric), result[metric]
+            if old is not None and new is not None and new > old * (1 + threshold):
+                regressions.append(f'{name}: {metric} {old} -> {new}')
+    return regressions
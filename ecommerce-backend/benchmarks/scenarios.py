@@ -0,0 +1,117 @@
+"""
+API scenarios driven by the endpoint benchmarks.
+
+Paths and request bodies are callables of the fixtures returned by
+``load_fixtures``, so the same scenarios run against any generated dataset.
+"""
+from django.db.models import Count
+
+from accounts.models import User
+from orders.models import Cart, CartItem
+from products.models import Category, Product
+
+# Stock given to the benchmark product so repeated orders never run out.
+BENCHMARK_STOCK = 1_000_000
+
+
+class Scenario:
+    """One API call to measure."""
+
+    def __init__(self, name, method, path, data=None, auth=False, expected=(200,),
+                 prepare=None, iterations_factor=1.0):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.auth = auth
+        self.expected = expected
+        # Untimed hook run before every request, e.g. to reset a cart.
+        self.prepare = prepare
+        self.iterations_factor = iterations_factor
+
+    def build(self, fixtures):
+        """Return ``(path, data)`` for the given fixtures."""
+        data = self.data(fixtures) if callable(self.data) else self.data
+        return self.path(fixtures), data
+
+
+def load_fixtures(password):
+    """
+    Pick the objects scenarios act on: the most active customer, their
+    latest order, the best-selling product and a top-level category.
+
+    The benchmark product gets ``BENCHMARK_STOCK`` units so cart and order
+    scenarios can repeat without running out, and the customer's cart is
+    filled with a few other products.
+    """
+    user = User.objects.filter(is_active=True, is_staff=False).annotate(
+        order_count=Count('orders')
+    ).order_by('-order_count', 'id').first()
+    product = Product.objects.filter(is_active=True).annotate(
+        sales=Count('order_items')
+    ).order_by('-sales', 'id').first()
+    category = Category.objects.filter(parent__isnull=True).order_by('id').first()
+    if user is None or product is None or category is None:
+        raise ValueError('The database has no customers, products or categories; run generate_dataset first.')
+
+    order = user.orders.order_by('-id').first()
+    if order is None:
+        raise ValueError(f'{user.email} has no orders; run generate_dataset first.')
+
+    Product.objects.filter(pk=product.pk).update(stock_quantity=BENCHMARK_STOCK)
+    cart, _ = Cart.objects.get_or_create(user=user)
+    if not cart.items.exists():
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=item, quantity=1)
+            for item in Product.objects.filter(is_active=True).exclude(pk=product.pk).order_by('id')[:3]
+        )
+    return {
+        'user': user,
+        'password': password,
+        'order': order,
+        'product': product,
+        'category': category,
+        'term': product.name.split()[0].lower(),
+    }
+
+
+def _remove_from_cart(fixtures):
+    CartItem.objects.filter(cart__user=fixtures['user'], product=fixtures['product']).delete()
+
+
+SCENARIOS = [
+    Scenario('product-list', 'get', lambda f: '/api/products/'),
+    Scenario(
+        'product-list-filtered', 'get',
+        lambda f: f"/api/products/?category={f['product'].category_id}&in_stock=true&ordering=-price",
+    ),
+    Scenario('product-search', 'get', lambda f: f"/api/products/search/?q={f['term']}"),
+    Scenario('product-detail', 'get', lambda f: f"/api/products/{f['product'].slug}/"),
+    Scenario('category-tree', 'get', lambda f: '/api/categories/'),
+    Scenario(
+        'category-products', 'get', lambda f: f"/api/categories/{f['category'].slug}/products/",
+    ),
+    Scenario(
+        'cart-add', 'post', lambda f: '/api/cart/add/',
+        data=lambda f: {'product_id': f['product'].pk, 'quantity': 1},
+        auth=True, expected=(201,), prepare=_remove_from_cart,
+    ),
+    Scenario('cart-read', 'get', lambda f: '/api/cart/', auth=True),
+    Scenario(
+        'order-create', 'post', lambda f: '/api/orders/',
+        data=lambda f: {
+            'shipping_address': '1 Benchmark Street',
+            'billing_address': '1 Benchmark Street',
+            'items': [{'product_id': f['product'].pk, 'quantity': 1}],
+        },
+        auth=True, expected=(201,),
+    ),
+    Scenario('order-list', 'get', lambda f: '/api/orders/', auth=True),
+    Scenario('order-detail', 'get', lambda f: f"/api/orders/{f['order'].pk}/", auth=True),
+    # Password hashing dominates; fewer iterations keep the suite quick.
+    Scenario(
+        'login', 'post', lambda f: '/api/auth/login/',
+        data=lambda f: {'email': f['user'].email, 'password': f['password']},
+        iterations_factor=0.1,
+    ),
+]
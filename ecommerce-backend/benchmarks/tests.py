@@ -0,0 +1,77 @@
+from unittest import mock
+from django.db import connection
+from django.test import TestCase
+from products.models import Product
+from products.serializers import ProductListSerializer
+from products.synthetic import DatasetGenerator
+from .budgets import check_budgets
+from .runner import ClientDriver, QueryRecorder, compare, run
+from .scenarios import SCENARIOS, load_fixtures
+
+
+class QueryRecorderTests(TestCase):
+    def test_counts_queries_and_rows(self):
+        DatasetGenerator({'products': 30, 'reviews': 0, 'carts': 0, 'orders': 0},
+                         log=lambda message: None).run()
+        recorder = QueryRecorder(keep_sql=True)
+        with connection.execute_wrapper(recorder):
+            list(Product.objects.all()[:12])
+            Product.objects.count()
+        self.assertEqual(recorder.queries, 2)
+        self.assertEqual(recorder.rows, 13)
+        self.assertIn('COUNT', recorder.statements[1])
+
+
+class CompareTests(TestCase):
+    def result(self, **values):
+        return dict({'errors': 0, 'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0,
+                     'queries': 4, 'rows': 100, 'peak_memory_kb': 500.0}, **values)
+
+    def test_flags_regressions(self):
+        baseline = {'product-list': self.result()}
+        self.assertEqual(compare(baseline, {'product-list': self.result(p50_ms=11.0, p99_ms=90.0)}), [])
+        regressions = compare(baseline, {
+            'product-list': self.result(p95_ms=40.0, queries=5, rows=200),
+            'new-scenario': self.result(),
+        })
+        self.assertEqual(regressions, [
+            'product-list: p95_ms 20.0 -> 40.0',
+            'product-list: queries 4 -> 5',
+            'product-list: rows 100 -> 200',
+        ])
+
+
+class EndpointBenchmarkTests(TestCase):
+    def test_in_process_run(self):
+        DatasetGenerator({'users': 5, 'categories': 4, 'products': 20, 'reviews': 10,
+                          'carts': 2, 'orders': 10}, log=lambda message: None).run()
+        fixtures = load_fixtures('loadtest123')
+        orders = fixtures['user'].orders.count()
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name != 'login']
+        results = run(ClientDriver(), scenarios, fixtures, iterations=2, warmup=0)
+
+        self.assertEqual(set(results), {scenario.name for scenario in scenarios})
+        for name, result in results.items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertGreater(result['queries'], 0, name)
+        # Write scenarios are rolled back.
+        self.assertEqual(fixtures['user'].orders.count(), orders)
+
+
+class QueryBudgetTests(TestCase):
+    def test_endpoints_within_budget(self):
+        failures = check_budgets()
+        self.assertFalse(failures, '\n' + '\n'.join(failures))
+
+    def test_reports_repeated_statements(self):
+        def get_primary_image(serializer, obj):
+            return obj.images.filter(is_primary=True).exists()
+
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name == 'product-list']
+        with mock.patch.object(ProductListSerializer, 'get_primary_image', get_primary_image):
+            failures = check_budgets(scenarios)
+
+        self.assertEqual(len(failures), 1)
+        self.assertIn('product-list: 6 -> 12 queries at dataset sizes 2 -> 8', failures[0])
+        self.assertIn('8x SELECT ? AS "a" FROM "product_images"', failures[0])
+        self.assertIn('at benchmarks/tests.py', failures[0])
@@ -5,5 +5,6 @@ set -o errexit
 pip install --upgrade pip
 pip install -r requirements.txt
 
+python manage.py generate_schema
 python manage.py collectstatic --no-input
 python manage.py migrate
\ No newline at end of file
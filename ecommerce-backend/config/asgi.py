@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The async read endpoints are routed through ``config.asgi_urls``; run it
+with ``gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -12,5 +14,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('ROOT_URLCONF', 'config.asgi_urls')
 
 application = get_asgi_application()
+
+# Import the views and, when enabled, load the indexes; see config/preload.py.
+from config.preload import preload
+
+preload()
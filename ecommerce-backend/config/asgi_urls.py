@@ -0,0 +1,65 @@
+"""
+URLconf of the ASGI application (see ``config/asgi.py``).
+
+The async read endpoints answer GET and HEAD on the paths of the DRF views
+they replace, which still handle the other methods; every other route falls
+through to ``config.urls``. They keep the namespaces and names of the views
+they replace, so metrics, deadlines, load shedding priorities and profiling
+key them the same way under ASGI and WSGI.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.urls import include, path, re_path, resolve
+from django.views.decorators.csrf import csrf_exempt
+
+from orders import urls as order_urls
+from orders.async_views import order_detail
+from products import urls as product_urls
+from products.async_views import category_list, product_detail, product_list
+from products.views import ProductViewSet
+
+from .urls import urlpatterns as sync_urlpatterns
+
+# ``products/search/`` and the other list actions are not product slugs.
+PRODUCT_ACTIONS = '|'.join(
+    action.url_path for action in ProductViewSet.get_extra_actions() if not action.detail
+)
+
+
+def reads(async_view):
+    """Serve GET and HEAD with ``async_view`` and other methods with the sync route."""
+
+    # The sync views are exempt too; DRF enforces CSRF for session auth.
+    @csrf_exempt
+    @wraps(async_view)
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        match = resolve(request.path_info, urlconf='config.urls')
+        request.resolver_match = match
+        return await sync_to_async(match.func)(request, *match.args, **match.kwargs)
+
+    return view
+
+
+product_patterns = [
+    path('products/', reads(product_list), name='product-list'),
+    re_path(
+        rf'^products/(?!(?:{PRODUCT_ACTIONS})/)(?P<slug>[-\w]+)/$', reads(product_detail), name='product-detail'
+    ),
+    path('categories/', reads(category_list), name='category-list'),
+]
+
+order_patterns = [
+    path('orders/<int:pk>/', reads(order_detail), name='order-detail'),
+]
+
+# The async routes go first in the apps' own namespaces, which replace the
+# sync includes so each namespace is registered once and still reverses.
+urlpatterns = [
+    path('api/', include((product_patterns + product_urls.urlpatterns, 'products'))),
+    path('api/', include((order_patterns + order_urls.urlpatterns, 'orders'))),
+] + [
+    pattern for pattern in sync_urlpatterns if getattr(pattern, 'namespace', None) not in ('products', 'orders')
+]
@@ -0,0 +1,194 @@
+"""
+Batch endpoint: several GET requests in one round trip (``POST /api/batch/``).
+
+::
+
+    {"requests": [{"path": "/api/auth/profile/"}, {"path": "/api/cart/"},
+                  {"path": "/api/products/?category=3&page=2"}]}
+
+Each sub-request is resolved against ``config.urls`` and its view called
+directly, without HTTP or the middleware stack, under its own route's
+deadline (``config/deadlines.py``) and, with ``LOAD_SHEDDING_ENABLED``,
+admitted by the load shedding limiter at its route's priority. The batch
+request is
+authenticated once and the user handed to every sub-request; permissions,
+filtering and pagination are applied by the views as usual. Up to
+``BATCH_MAX_WORKERS`` sub-requests run at the same time on a thread pool
+shared by the worker's requests, and the response lists one
+``{"path", "status", "body"}`` entry per sub-request, in order, with the
+bodies spliced in as rendered by the views.
+
+Only GET is allowed: sub-requests may run in any order. Inside a
+transaction (``ATOMIC_REQUESTS``, tests) the sub-requests run one after
+another in the request's thread, as other threads' connections would not
+see its uncommitted writes.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, connection
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from monitoring import limiter
+from monitoring.middleware import shed_response
+from . import deadlines
+from .routers import ReplicaRoutingMiddleware
+
+# Resolved explicitly: the ASGI URLconf maps some of the same paths to async views.
+URLCONF = 'config.urls'
+
+# Request headers describing the batch request's own body.
+BODY_HEADERS = ('CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_CONTENT_ENCODING')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(settings.BATCH_MAX_WORKERS, thread_name_prefix='batch')
+        return _pool
+
+
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=['GET'], default='GET')
+    path = serializers.CharField(max_length=2000)
+
+    def validate_path(self, value):
+        if not value.startswith('/api/'):
+            raise serializers.ValidationError('Only /api/ paths can be batched.')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = serializers.ListField(child=SubRequestSerializer(), min_length=1)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f'At most {settings.BATCH_MAX_REQUESTS} requests per batch.')
+        return value
+
+
+def _error(code, detail):
+    return code, json.dumps({'error': detail}).encode()
+
+
+def _body(response):
+    if response.streaming:
+        return _error(status.HTTP_400_BAD_REQUEST, 'Streaming responses cannot be batched.')
+    if hasattr(response, 'render'):
+        response.render()
+    content = response.content
+    if not content:
+        return response.status_code, b'null'
+    if response.get('Content-Type', '').startswith('application/json'):
+        return response.status_code, content
+    return response.status_code, json.dumps(content.decode(response.charset)).encode()
+
+
+class BatchView(APIView):
+    """
+    Run GET sub-requests and return their responses together.
+
+    Body: ``{"requests": [{"path": "/api/..."}]}``, at most
+    ``BATCH_MAX_REQUESTS`` items. See ``config/batch.py``.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        paths = [item['path'] for item in serializer.validated_data['requests']]
+
+        # Authenticated once, here; the sub-requests get the result.
+        user, auth = request.user, request.auth
+        dispatch = partial(self.dispatch_sub_request, request, user=user, auth=auth)
+        if connection.in_atomic_block or len(paths) == 1:
+            results = [dispatch(path) for path in paths]
+        else:
+            results = list(pool().map(partial(self.in_worker_thread, dispatch), paths))
+
+        items = [
+            b'{"path":%s,"status":%d,"body":%s}' % (json.dumps(path).encode(), code, body)
+            for path, (code, body) in zip(paths, results)
+        ]
+        return HttpResponse(b'{"responses":[%s]}' % b','.join(items), content_type='application/json')
+
+    @staticmethod
+    def in_worker_thread(dispatch, path):
+        # What the request handler does around a request: drop connections
+        # past CONN_MAX_AGE or broken by an earlier sub-request.
+        close_old_connections()
+        try:
+            return dispatch(path)
+        finally:
+            close_old_connections()
+
+    def dispatch_sub_request(self, request, path, user, auth):
+        """Call the view of ``path``; returns ``(status code, JSON body)``."""
+        parts = urlsplit(path)
+        try:
+            match = resolve(parts.path, urlconf=URLCONF)
+        except Resolver404:
+            return _error(status.HTTP_404_NOT_FOUND, 'Not found.')
+        if getattr(match.func, 'view_class', None) is type(self):
+            return _error(status.HTTP_400_BAD_REQUEST, 'Batches cannot be nested.')
+
+        environ = {
+            key: value for key, value in request.META.items()
+            if isinstance(value, str) and key not in BODY_HEADERS
+        }
+        environ.update({
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': parts.path,
+            'QUERY_STRING': parts.query,
+            'wsgi.input': BytesIO(),
+            'wsgi.url_scheme': request.scheme,
+        })
+        sub_request = WSGIRequest(environ)
+        sub_request.user = user
+        if user.is_authenticated:
+            # DRF views use these instead of running the authenticators
+            # again. Anonymous sub-requests do run them (they find no
+            # credentials) so that 401 responses name the auth scheme.
+            sub_request._force_auth_user = user
+            sub_request._force_auth_token = auth
+        sub_request.resolver_match = match
+
+        @convert_exception_to_response
+        def view(sub_request):
+            with deadlines.enforce(sub_request):
+                try:
+                    return match.func(sub_request, *match.args, **match.kwargs)
+                except deadlines.DeadlineExceeded:
+                    return deadlines.exceeded_response(sub_request)
+
+        if settings.LOAD_SHEDDING_ENABLED:
+            # Each sub-request takes its own slot, so batching cannot get
+            # shed routes past the limiter.
+            priority = limiter.priority(match.view_name)
+            if not limiter.limiter.acquire(priority):
+                return _body(shed_response(priority))
+            started = time.perf_counter()
+            try:
+                return _body(ReplicaRoutingMiddleware(view)(sub_request))
+            finally:
+                limiter.limiter.release(priority, time.perf_counter() - started)
+
+        return _body(ReplicaRoutingMiddleware(view)(sub_request))
@@ -0,0 +1,228 @@
+"""
+Per-route request deadlines enforced on database work.
+
+Every request gets a time budget: ``REQUEST_DEADLINES`` by URL name, else
+``REQUEST_DEADLINE_SECONDS``. Its queries, on every database connection,
+are held to it so that one pathological query (an ``icontains`` search over
+the whole catalog, a category with thousands of products) cannot keep a
+connection and a worker busy until gunicorn's 120 s timeout:
+
+- On PostgreSQL the time left is the session's ``statement_timeout``: the
+  server cancels any statement that would run past the deadline. The
+  value is rounded down to a tenth of the budget and remembered, so it
+  only takes a ``SET`` at the first query and when a further tenth of the
+  budget is used up. Inside a transaction it is a ``SET LOCAL``,
+  remembered until the transaction (or a savepoint rolled back) ends.
+  When the request finishes the timeout is ``RESET``, so work outside of
+  requests never inherits a nearly spent one.
+- On SQLite a progress handler interrupts a statement once the request's
+  deadline has passed.
+- Queries issued after the deadline fail at once, before reaching the
+  database.
+
+A cancelled or refused query raises ``DeadlineExceeded`` (an
+``OperationalError``); ``DeadlineMiddleware`` answers it with a 504 and
+counts it in ``db_deadline_exceeded_total``. Transactions are rolled back
+as for any other database error.
+
+Queries run while a streaming response is consumed (exports) are not held
+to the deadline, as the middleware has returned by then. Work
+that is not the request's own, such as loading a per-worker index on first
+use, runs under ``exempt()``.
+"""
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, OperationalError, connections
+from django.http import JsonResponse
+
+from monitoring.metrics import record_deadline_exceeded
+
+# PostgreSQL's SQLSTATE for statements cancelled by statement_timeout.
+QUERY_CANCELED = '57014'
+# SQLite virtual machine instructions between deadline checks.
+SQLITE_PROGRESS_STEPS = 10000
+# The PostgreSQL timeout is the time left rounded down to this share of the
+# budget.
+TIMEOUT_STEPS = 10
+
+_exempt = ContextVar('deadline_exempt', default=False)
+
+
+class DeadlineExceeded(OperationalError):
+    """The request's database work outlasted its deadline."""
+
+
+class LocalTimeout:
+    """
+    Marks a ``SET LOCAL statement_timeout``.
+
+    Registered as an on_commit hook that does nothing: Django drops the
+    hook when the transaction ends or the savepoint it was made in is rolled
+    back, which is when PostgreSQL drops the setting.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def __call__(self):
+        pass
+
+
+def route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+def budget(request):
+    """Seconds the request's database work may take."""
+    return settings.REQUEST_DEADLINES.get(route(request), settings.REQUEST_DEADLINE_SECONDS)
+
+
+class Deadline:
+    """Execute wrapper holding a request's queries to its deadline."""
+
+    def __init__(self, request):
+        self.request = request
+        self.started = time.monotonic()
+
+    def __call__(self, execute, sql, params, many, context):
+        connection = context['connection']
+        if _exempt.get():
+            if connection.vendor == 'postgresql':
+                self.set_statement_timeout(context, 0)
+            return execute(sql, params, many, context)
+        # The URL is resolved after middleware runs, so the budget is looked
+        # up when the first query is made.
+        seconds = budget(self.request)
+        remaining = self.started + seconds - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f'Deadline of {seconds}s exceeded before the query was run')
+        if connection.vendor == 'postgresql':
+            return self.execute_postgresql(execute, sql, params, many, context, seconds, remaining)
+        if connection.vendor == 'sqlite':
+            return self.execute_sqlite(execute, sql, params, many, context, self.started + seconds)
+        return execute(sql, params, many, context)
+
+    @staticmethod
+    def set_statement_timeout(context, timeout):
+        """Set the connection's ``statement_timeout`` (ms, 0 for none) unless it has it."""
+        connection = context['connection']
+        session = getattr(connection, '_statement_timeout', None)
+        current = session[1] if session and session[0] is connection.connection else None
+        if not connection.in_atomic_block:
+            if current != timeout:
+                context['cursor'].execute(f'SET statement_timeout = {timeout}')
+                connection._statement_timeout = (connection.connection, timeout)
+            return
+        local = getattr(connection, '_local_statement_timeout', None)
+        if local is not None and any(hook[1] is local for hook in connection.run_on_commit):
+            current = local.timeout
+        if current != timeout:
+            context['cursor'].execute(f'SET LOCAL statement_timeout = {timeout}')
+            connection._local_statement_timeout = LocalTimeout(timeout)
+            connection.on_commit(connection._local_statement_timeout)
+
+    def execute_postgresql(self, execute, sql, params, many, context, seconds, remaining):
+        step = seconds / TIMEOUT_STEPS
+        if remaining >= step:
+            remaining = remaining // step * step
+        self.set_statement_timeout(context, max(int(remaining * 1000), 1))
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as exc:
+            # psycopg2 and psycopg 3 name the SQLSTATE differently.
+            code = getattr(exc.__cause__, 'pgcode', None) or getattr(exc.__cause__, 'sqlstate', None)
+            if code == QUERY_CANCELED:
+                raise DeadlineExceeded(f'Statement cancelled at the {seconds}s deadline') from exc
+            raise
+
+    def execute_sqlite(self, execute, sql, params, many, context, deadline):
+        raw = context['connection'].connection
+        interrupted = []
+
+        def check():
+            if time.monotonic() > deadline:
+                interrupted.append(True)
+                return 1
+            return 0
+
+        raw.set_progress_handler(check, SQLITE_PROGRESS_STEPS)
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as exc:
+            if interrupted:
+                raise DeadlineExceeded('Statement interrupted at the request deadline') from exc
+            raise
+        finally:
+            raw.set_progress_handler(None, SQLITE_PROGRESS_STEPS)
+
+
+@contextmanager
+def enforce(request):
+    """Hold the queries made in the block, on every connection, to the request's deadline."""
+    if not settings.REQUEST_DEADLINES_ENABLED:
+        yield
+        return
+    deadline = Deadline(request)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(deadline))
+            yield
+    finally:
+        for alias in connections:
+            reset_statement_timeout(connections[alias])
+
+
+def reset_statement_timeout(connection):
+    """Give a connection set up by ``Deadline`` its default ``statement_timeout`` back."""
+    if getattr(connection, '_statement_timeout', None) is None or connection.in_atomic_block:
+        return
+    connection._statement_timeout = None
+    if connection.connection is None:
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('RESET statement_timeout')
+    except DatabaseError:
+        # A connection that cannot be reset must not keep the timeout.
+        connection.close()
+
+
+@contextmanager
+def exempt():
+    """Run the block's queries without the current request's deadline."""
+    token = _exempt.set(True)
+    try:
+        yield
+    finally:
+        _exempt.reset(token)
+
+
+def exceeded_response(request):
+    record_deadline_exceeded(route(request))
+    return JsonResponse(
+        {'error': 'The request took too long to complete, please narrow it down or retry later'}, status=504
+    )
+
+
+class DeadlineMiddleware:
+    """Enforces request deadlines; see the module docstring."""
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_DEADLINES_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with enforce(request):
+            return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, DeadlineExceeded):
+            return exceeded_response(request)
+        return None
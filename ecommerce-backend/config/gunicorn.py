@@ -0,0 +1,43 @@
+"""
+Gunicorn settings loaded by ``entrypoint.sh``; command line options there
+take precedence.
+"""
+import gc
+import os
+
+from prometheus_client import multiprocess
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 3))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+
+def when_ready(server):
+    # Each worker thread keeps its own persistent connection to every
+    # database it uses (CONN_MAX_AGE), so this is the connection budget.
+    # The batch endpoint's threads (config/batch.py) count too.
+    batch_threads = int(os.environ.get('BATCH_MAX_WORKERS', 4))
+    per_database = server.cfg.workers * (server.cfg.threads + batch_threads)
+    server.log.info(
+        'Database connections: up to %d per database (%d workers x (%d threads + %d batch threads))',
+        per_database, server.cfg.workers, server.cfg.threads, batch_threads,
+    )
+    limit = int(os.environ.get('DB_MAX_CONNECTIONS', 0))
+    if limit and per_database > limit:
+        server.log.warning(
+            'Connections (%d) exceed DB_MAX_CONNECTIONS (%d); lower WEB_CONCURRENCY, GUNICORN_THREADS or BATCH_MAX_WORKERS',
+            per_database, limit,
+        )
+
+
+def pre_fork(server, worker):
+    # With --preload the application is loaded in the master. Moving its
+    # objects out of the collector's reach keeps the workers' garbage
+    # collections from writing to (and so copying) the shared pages.
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of a worker that exited; its counters and
+    # histograms stay in the multiprocess directory so totals never go back.
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,41 @@
+"""
+Warm-up run when ``config.wsgi`` or ``config.asgi`` is imported.
+
+Under ``gunicorn --preload`` (see entrypoint.sh) this runs once in the
+master, and the forked workers share the imported code and loaded arrays
+copy-on-write. The URLconf (every view and serializer) is always imported;
+the per-worker indexes are only loaded when ``PRELOAD_INDEXES`` is set, so
+management commands, ``runserver`` and processes that never serve
+autocomplete neither query the database nor import numpy on import. A
+database that is unreachable or not migrated yet only logs a warning: the
+indexes then load on first use, exempt from the request deadline (see
+``products/refresh.py``).
+"""
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def preload():
+    get_resolver().url_patterns
+    if not settings.PRELOAD_INDEXES:
+        return
+    from products.autocomplete import index
+
+    indexes = [index]
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        from products.catalog import snapshot
+
+        indexes.append(snapshot)
+    try:
+        for loader in indexes:
+            loader.refresh()
+    except DatabaseError:
+        logger.warning('Could not preload %s; it loads on first use', type(loader).__name__, exc_info=True)
+    finally:
+        # The master's connection must not be shared with forked workers.
+        connections.close_all()
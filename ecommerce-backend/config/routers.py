@@ -0,0 +1,110 @@
+"""
+Read replica routing.
+
+Reads of ``DATABASE_REPLICA_APPS`` models (the catalog and orders) made
+while serving a GET, HEAD or OPTIONS request go to one of
+``DATABASE_REPLICAS``, picked at random. Everything else, including reads
+inside POST, PUT, PATCH and DELETE requests and outside requests
+(management commands, background refreshes), uses ``default``.
+
+Replicas lag behind the primary, so a user who just wrote (added to the
+cart, placed an order) is pinned to the primary for
+``DATABASE_PIN_SECONDS``: the pin is kept in the cache under the user's id,
+which needs a shared cache (``REDIS_URL``) when there are several workers.
+A request that writes also reads from the primary for the rest of the
+request. ``get_or_create()`` counts as a write even when it only reads, so
+hot read paths look the row up first (see ``CartViewSet``). Anonymous
+requests are never pinned; they cannot write to the routed apps.
+
+Replicas are not migrated; they receive the schema through replication.
+"""
+from contextvars import ContextVar
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current = ContextVar('replica_routing', default=None)
+
+
+class RequestState:
+    """What the router needs to know about the request being served."""
+
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        # (user id, pinned) of the last check; the user can change when DRF
+        # authenticates the request after the middleware ran.
+        self.pin = None
+
+    def pinned(self):
+        user = getattr(self.request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return False
+        if self.pin is None or self.pin[0] != user.pk:
+            self.pin = (user.pk, cache.get(pin_key(user.pk)) is not None)
+        return self.pin[1]
+
+
+def pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Send the user's reads to the primary for ``DATABASE_PIN_SECONDS``."""
+    cache.set(pin_key(user_id), 1, settings.DATABASE_PIN_SECONDS)
+
+
+class ReplicaRouter:
+    """Routes safe-method reads of the catalog and orders to replicas."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in settings.DATABASE_REPLICA_APPS or not settings.DATABASE_REPLICAS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from the database their parent came from.
+            return instance._state.db
+        state = _current.get()
+        if state is None or state.request.method not in SAFE_METHODS or state.wrote or state.pinned():
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Exposes the request to the router and pins users after writes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(request)
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        user = getattr(request, 'user', None)
+        if state.wrote and settings.DATABASE_REPLICAS and user is not None and user.is_authenticated:
+            pin_to_primary(user.pk)
+        return response
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
@@ -29,9 +30,16 @@ INSTALLED_APPS = [
     'accounts',
     'products',
     'orders',
+    'benchmarks',
+    'monitoring',
+    'apidocs',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware',
+    'monitoring.middleware.LoadSheddingMiddleware',
+    'monitoring.middleware.MemoryMiddleware',
+    'monitoring.middleware.SQLInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -39,11 +47,15 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'config.routers.ReplicaRoutingMiddleware',
+    'config.deadlines.DeadlineMiddleware',
+    'monitoring.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'config.urls'
+# config/asgi.py switches to config.asgi_urls (async read endpoints)
+ROOT_URLCONF = config('ROOT_URLCONF', default='config.urls')
 
 TEMPLATES = [
     {
@@ -64,17 +76,34 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
+# Connections are persistent: every worker thread keeps one connection per
+# database for DB_CONN_MAX_AGE seconds and checks it before reusing it, so
+# a worker holds at most as many as it has threads (see config/gunicorn.py).
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+
+
+def postgres_database(host):
+    return {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': config('DB_NAME', default='ecommerce_db'),
         'USER': config('DB_USER', default='ecommerce_user'),
         'PASSWORD': config('DB_PASSWORD', default='db_password'),
-        'HOST': config('DB_HOST', default='localhost'),
+        'HOST': host,
         'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
+
+
+DATABASES = {
+    'default': postgres_database(config('DB_HOST', default='localhost')),
 }
 
+# Read replicas (see config/routers.py): safe-method catalog and order
+# reads go to them; tests run them against the default test database.
+for index, host in enumerate(filter(None, config('DB_REPLICA_HOSTS', default='').split(',')), 1):
+    DATABASES[f'replica{index}'] = dict(postgres_database(host.strip()), TEST={'MIRROR': 'default'})
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -105,7 +134,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -117,6 +146,146 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Proxies in front of the app that append to X-Forwarded-For: 0 uses the
+    # socket address, 1 behind Render's proxy. Never trust the header as-is.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+    # Route classes of config/throttling.py
+    'DEFAULT_THROTTLE_RATES': {
+        'login': config('THROTTLE_LOGIN_RATE', default='10/min'),
+        'registration': config('THROTTLE_REGISTRATION_RATE', default='5/hour'),
+        'search': config('THROTTLE_SEARCH_RATE', default='60/min'),
+        'checkout': config('THROTTLE_CHECKOUT_RATE', default='10/min'),
+    },
+}
+THROTTLING_ENABLED = config('THROTTLING_ENABLED', default=True, cast=bool)
+
+# Shared by all workers when REDIS_URL is set (replica pins, see
+# config/routers.py); otherwise every process has its own.
+if config('REDIS_URL', default=''):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_URL'),
+        }
+    }
+
+# Autocomplete prefix index (built per worker, see products/autocomplete.py)
+AUTOCOMPLETE_REFRESH_SECONDS = config('AUTOCOMPLETE_REFRESH_SECONDS', default=60, cast=int)
+AUTOCOMPLETE_MAX_RESULTS = 10
+
+# Columnar catalog snapshot for product list filtering (see products/catalog.py)
+CATALOG_SNAPSHOT_ENABLED = config('CATALOG_SNAPSHOT_ENABLED', default=False, cast=bool)
+CATALOG_SNAPSHOT_REFRESH_SECONDS = config('CATALOG_SNAPSHOT_REFRESH_SECONDS', default=30, cast=int)
+
+# Load the indexes above when config.wsgi/config.asgi is imported (see
+# config/preload.py) instead of on first use
+PRELOAD_INDEXES = config('PRELOAD_INDEXES', default=False, cast=bool)
+
+# Precomputed storefront home document (see products/storefront.py)
+STOREFRONT_PRODUCTS_PER_SECTION = config('STOREFRONT_PRODUCTS_PER_SECTION', default=8, cast=int)
+STOREFRONT_MIN_REVIEWS = config('STOREFRONT_MIN_REVIEWS', default=1, cast=int)
+STOREFRONT_REBUILD_DELAY_SECONDS = config('STOREFRONT_REBUILD_DELAY_SECONDS', default=5, cast=float)
+STOREFRONT_MAX_AGE_SECONDS = config('STOREFRONT_MAX_AGE_SECONDS', default=900, cast=int)
+
+# Users resolved by JWT authentication (see accounts/authentication.py):
+# per-worker LRU size and lifetime, then the shared cache's lifetime
+AUTH_USER_CACHE_SIZE = config('AUTH_USER_CACHE_SIZE', default=10000, cast=int)
+AUTH_USER_CACHE_LOCAL_SECONDS = config('AUTH_USER_CACHE_LOCAL_SECONDS', default=30, cast=int)
+AUTH_USER_CACHE_SECONDS = config('AUTH_USER_CACHE_SECONDS', default=300, cast=int)
+
+# Batch endpoint (see config/batch.py): sub-requests per batch and how many
+# run at once in each worker
+BATCH_MAX_REQUESTS = config('BATCH_MAX_REQUESTS', default=20, cast=int)
+BATCH_MAX_WORKERS = config('BATCH_MAX_WORKERS', default=4, cast=int)
+
+# Request deadlines (see config/deadlines.py): seconds the database work of
+# a request may take, by URL name, else the default; also the PostgreSQL
+# statement_timeout. Keep them below gunicorn's 120 s timeout.
+REQUEST_DEADLINES_ENABLED = config('REQUEST_DEADLINES_ENABLED', default=True, cast=bool)
+REQUEST_DEADLINE_SECONDS = config('REQUEST_DEADLINE_SECONDS', default=30, cast=float)
+REQUEST_DEADLINES = {
+    'products:product-search': config('REQUEST_DEADLINE_SEARCH_SECONDS', default=3, cast=float),
+    'products:category-products': 5,
+    'products:product-autocomplete': 1,
+    'products:product-bulk-import': 110,
+}
+
+# Product delta sync (/api/products/changes/)
+PRODUCT_SYNC_PAGE_SIZE = 500
+PRODUCT_SYNC_MAX_PAGE_SIZE = 2000
+PRODUCT_SYNC_SETTLE_SECONDS = config('PRODUCT_SYNC_SETTLE_SECONDS', default=2, cast=int)
+
+# Per-request SQL instrumentation (see monitoring/middleware.py)
+SQL_INSTRUMENTATION_ENABLED = config('SQL_INSTRUMENTATION_ENABLED', default=True, cast=bool)
+SQL_INSTRUMENTATION_SAMPLE_RATE = config('SQL_INSTRUMENTATION_SAMPLE_RATE', default=1.0 if DEBUG else 0.1, cast=float)
+SQL_SLOW_REQUEST_MS = config('SQL_SLOW_REQUEST_MS', default=500, cast=int)
+SQL_SLOWEST_STATEMENTS = 3
+SQL_EXPLAIN_SLOW = config('SQL_EXPLAIN_SLOW', default=False, cast=bool)
+
+# Prometheus metrics at /metrics (see monitoring/metrics.py). Set a token
+# to require "Authorization: Bearer <token>" from scrapers; without one the
+# endpoint is only served when METRICS_PUBLIC (development) and 404 otherwise.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_PUBLIC = config('METRICS_PUBLIC', default=DEBUG, cast=bool)
+
+# On-demand profiling of staff requests (see monitoring/profiling.py)
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=True, cast=bool)
+PROFILING_MAX_PER_MINUTE = config('PROFILING_MAX_PER_MINUTE', default=6, cast=int)
+PROFILING_SAMPLE_INTERVAL_MS = 1
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_MAX_PROFILES = config('PROFILING_MAX_PROFILES', default=50, cast=int)
+
+# Worker memory diagnostics (see monitoring/memory.py). Tracing is costly;
+# the RSS limit (0 = off) recycles gunicorn workers that outgrow it.
+MEMORY_TRACKING_ENABLED = config('MEMORY_TRACKING_ENABLED', default=False, cast=bool)
+MEMORY_SAMPLE_SECONDS = config('MEMORY_SAMPLE_SECONDS', default=300, cast=int)
+MEMORY_RSS_LIMIT_MB = config('MEMORY_RSS_LIMIT_MB', default=0, cast=int)
+
+# Adaptive concurrency limit per worker (see monitoring/limiter.py): routes
+# by URL name; critical ones are never shed, low-priority ones first.
+LOAD_SHEDDING_ENABLED = config('LOAD_SHEDDING_ENABLED', default=not DEBUG, cast=bool)
+LOAD_SHEDDING_INITIAL_LIMIT = config('LOAD_SHEDDING_INITIAL_LIMIT', default=20, cast=int)
+LOAD_SHEDDING_MIN_LIMIT = config('LOAD_SHEDDING_MIN_LIMIT', default=1, cast=int)
+LOAD_SHEDDING_MAX_LIMIT = config('LOAD_SHEDDING_MAX_LIMIT', default=200, cast=int)
+LOAD_SHEDDING_LOW_PRIORITY_SHARE = config('LOAD_SHEDDING_LOW_PRIORITY_SHARE', default=0.5, cast=float)
+LOAD_SHEDDING_LOW_PRIORITY_MIN_GRADIENT = config('LOAD_SHEDDING_LOW_PRIORITY_MIN_GRADIENT', default=0.75, cast=float)
+LOAD_SHEDDING_RETRY_AFTER = 1
+LOAD_SHEDDING_CRITICAL_ROUTES = [
+    'orders:order-list',
+    'orders:order-detail',
+    'orders:cart',
+    'orders:cart-add',
+    'orders:cart-update',
+    'orders:cart-remove',
+    'orders:cart-clear',
+]
+LOAD_SHEDDING_LOW_PRIORITY_ROUTES = [
+    'products:product-search',
+    'products:product-export',
+    'products:product-changes',
+    'products:product-bulk-import',
+    'products:product-autocomplete-stats',
+    'monitoring:diagnostics-memory',
+]
+
+# Request logs go to stdout next to the gunicorn access log; in development
+# only slow requests are logged, and under manage.py test none (tests
+# capture them with assertLogs).
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'null': {'class': 'logging.NullHandler'},
+    },
+    'loggers': {
+        'monitoring': {
+            'handlers': ['null' if sys.argv[1:2] == ['test'] else 'console'],
+            'level': config('MONITORING_LOG_LEVEL', default='WARNING' if DEBUG else 'INFO'),
+            'propagate': False,
+        },
+    },
 }
 
 # JWT Configuration
@@ -125,9 +294,17 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(minutes=config('JWT_REFRESH_TOKEN_LIFETIME', default=1440, cast=int)),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.TokenRefreshSerializer',
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Refresh token blacklist (see accounts/blacklist.py): how stale a worker's
+# filter may get, how often it is rebuilt without expired ids, and its size
+TOKEN_BLACKLIST_SYNC_SECONDS = config('TOKEN_BLACKLIST_SYNC_SECONDS', default=5, cast=int)
+TOKEN_BLACKLIST_REBUILD_SECONDS = config('TOKEN_BLACKLIST_REBUILD_SECONDS', default=3600, cast=int)
+TOKEN_BLACKLIST_MIN_CAPACITY = config('TOKEN_BLACKLIST_MIN_CAPACITY', default=100000, cast=int)
+TOKEN_BLACKLIST_ERROR_RATE = config('TOKEN_BLACKLIST_ERROR_RATE', default=0.001, cast=float)
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -147,6 +324,12 @@ SWAGGER_SETTINGS = {
         }
     },
     'USE_SESSION_AUTH': False,
+    # The docs UIs load the schema written by `manage.py generate_schema`
+    'SPEC_URL': 'schema-json',
+}
+
+REDOC_SETTINGS = {
+    'SPEC_URL': 'schema-json',
 }
 
 # Add this to the BOTTOM of config/settings.py
@@ -155,15 +338,27 @@ SWAGGER_SETTINGS = {
 # PRODUCTION SETTINGS
 # ========================================
 
-import dj_database_url
-
 # Override database if DATABASE_URL exists (for Render)
 if 'DATABASE_URL' in os.environ:
-    DATABASES['default'] = dj_database_url.parse(
-        os.environ.get('DATABASE_URL'),
-        conn_max_age=600,
-        conn_health_checks=True,
-    )
+    import dj_database_url
+    
+    DATABASES = {
+        'default': dj_database_url.parse(
+            os.environ.get('DATABASE_URL'),
+            conn_max_age=DB_CONN_MAX_AGE,
+            conn_health_checks=True,
+        ),
+    }
+    for index, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+        DATABASES[f'replica{index}'] = dict(
+            dj_database_url.parse(url.strip(), conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=True),
+            TEST={'MIRROR': 'default'},
+        )
+
+DATABASE_ROUTERS = ['config.routers.ReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_REPLICA_APPS = ['products', 'orders']
+DATABASE_PIN_SECONDS = config('DATABASE_PIN_SECONDS', default=5, cast=int)
 
 # Security settings for production
 if not DEBUG:
@@ -180,6 +375,9 @@ if not DEBUG:
     
     # Trust Render's proxy
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+    
+    # Scrapers and health checks use plain HTTP inside the private network
+    SECURE_REDIRECT_EXEMPT = [r'^$', r'^ready$', r'^metrics$']
 
 # Allow all hosts in production (Render will handle this)
 if 'RENDER' in os.environ:
@@ -0,0 +1,115 @@
+"""
+Sliding-window throttles for expensive and abuse-prone routes.
+
+Each throttle class is a route class (``scope``) with a rate in
+``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']`` and an identity requests are
+counted by:
+
+- ``user``: the authenticated user, or the client IP for anonymous requests
+- ``ip``: the client IP (``NUM_PROXIES`` applies to ``X-Forwarded-For``)
+- ``token``: the bearer token, or the client IP without one
+
+Requests are counted in fixed windows of the rate's period; the current
+window's count plus the previous window's, weighted by how much of it still
+overlaps the sliding window, approximates the number of requests in the
+last period. Rejected requests count too, so clients that keep retrying
+stay throttled.
+
+Counts are kept with the cache's atomic ``add``/``incr``, so concurrent
+requests are all counted; with several workers the cache has to be shared
+(``REDIS_URL``), locmem counts per process.
+
+Rejections answer 429 with ``Retry-After`` and are counted in the
+``throttled_requests_total`` metric. ``THROTTLING_ENABLED=False`` turns all
+throttles off (load tests from one address).
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from monitoring.metrics import record_throttle
+
+def hit(key, window):
+    """
+    Count a request against ``key``; returns ``(current, previous, elapsed)``:
+    the counts of the current and previous windows and the seconds since the
+    current one started.
+    """
+    now = time.time()
+    index = int(now // window)
+    current_key, previous_key = f'{key}:{index}', f'{key}:{index - 1}'
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # The window's first request; ``add`` sets its expiry, and loses to
+        # a concurrent first request without dropping either count.
+        current = 1 if cache.add(current_key, 1, window * 2) else cache.incr(current_key)
+    previous = cache.get(previous_key, 0)
+    return current, int(previous or 0), now - index * window
+
+
+def retry_after(limit, window, current, previous, elapsed):
+    """Seconds until a request would be allowed again."""
+    if current >= limit:
+        # Once this window is the previous one, its weight must fall below
+        # limit / current.
+        wait = window - elapsed + window * (1 - limit / current)
+    else:
+        wait = window * (1 - (limit - current) / previous) - elapsed
+    return max(math.ceil(wait), 1)
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """Base class: set ``scope`` and ``identity``."""
+
+    identity = 'user'
+
+    def get_rate(self):
+        # Read on every instantiation so overridden settings apply.
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        if self.identity == 'user' and request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        elif self.identity == 'token' and request.auth is not None:
+            ident = 'token:' + hashlib.sha256(str(request.auth).encode()).hexdigest()[:32]
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'throttle:{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLING_ENABLED or self.rate is None:
+            return True
+        current, previous, elapsed = hit(self.get_cache_key(request, view), self.duration)
+        count = current + previous * (1 - elapsed / self.duration)
+        if count <= self.num_requests:
+            return True
+        self._wait = retry_after(self.num_requests, self.duration, current, previous, elapsed)
+        record_throttle(self.scope)
+        return False
+
+    def wait(self):
+        return self._wait
+
+
+class LoginThrottle(SlidingWindowThrottle):
+    scope = 'login'
+    identity = 'ip'
+
+
+class RegistrationThrottle(SlidingWindowThrottle):
+    scope = 'registration'
+    identity = 'ip'
+
+
+class SearchThrottle(SlidingWindowThrottle):
+    scope = 'search'
+
+
+class CheckoutThrottle(SlidingWindowThrottle):
+    scope = 'checkout'
@@ -6,42 +6,20 @@ echo "================================================"
 echo "🚀 Starting E-Commerce API Deployment"
 echo "================================================"
 
-# Wait for database to be ready
+# Wait for the database to accept connections
 echo " Waiting for database to be ready..."
-sleep 5
-
-# Additional database check
-echo " Checking database connection..."
-python << END
-import sys
-import time
-import psycopg2
-import os
-
-max_retries = 30
-retry_count = 0
-
-while retry_count < max_retries:
-    try:
-        conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
-        conn.close()
-        print(" Database connection successful!")
-        sys.exit(0)
-    except psycopg2.OperationalError as e:
-        retry_count += 1
-        print(f" Attempt {retry_count}/{max_retries}: Database not ready yet...")
-        time.sleep(2)
-
-print(" Could not connect to database after maximum retries")
-sys.exit(1)
-END
+python manage.py wait_for_db --timeout 60
 
 # Run database migrations
 echo ""
 echo "  Running database migrations..."
 python manage.py migrate --noinput
 
-# Collect static files
+# Generate the OpenAPI schema and collect static files
+echo ""
+echo " Generating API schema..."
+python manage.py generate_schema
+
 echo ""
 echo " Collecting static files..."
 python manage.py collectstatic --noinput
@@ -56,13 +34,32 @@ echo "================================================"
 echo " Deployment Complete!"
 echo "================================================"
 
-# Start Gunicorn server
+# Prometheus metrics are shared between workers through files in this
+# directory; stale files from a previous run would be summed in
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus-multiproc}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Load the autocomplete index and catalog snapshot in the gunicorn master
+# so the forked workers share them (config/preload.py)
+export PRELOAD_INDEXES="${PRELOAD_INDEXES:-True}"
+
+# Start Gunicorn server; ASGI=1 runs uvicorn workers with the async read
+# endpoints (config/asgi.py) instead of sync workers
+if [ "${ASGI:-0}" = "1" ]; then
+    APPLICATION="config.asgi:application --worker-class uvicorn.workers.UvicornWorker"
+else
+    APPLICATION="config.wsgi:application"
+fi
+
 echo ""
 echo " Starting Gunicorn server on port ${PORT:-8000}..."
 echo ""
-exec gunicorn config.wsgi:application \
+exec gunicorn $APPLICATION \
+    --config config/gunicorn.py \
     --bind 0.0.0.0:${PORT:-8000} \
-    --workers 3 \
+    --preload \
     --timeout 120 \
     --access-logfile - \
+    --access-logformat '%(h)s %(t)s "%(r)s" %(s)s %(b)s %(M)sms server-timing="%({server-timing}o)s"' \
     --error-logfile -
\ No newline at end of file
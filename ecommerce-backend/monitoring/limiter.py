@@ -0,0 +1,152 @@
+"""
+Adaptive concurrency limit and load shedding.
+
+Each worker keeps a concurrency limit that follows request latency, in the
+style of gradient limiters: a fast moving average of response times is
+compared with a slow one (the latency the worker is used to), and their
+ratio, the gradient, scales the limit down when requests get slower and
+lets it grow back, by up to its square root per update, while they are
+not::
+
+    gradient = clamp(long_latency / short_latency, 0.5, 1)
+    limit = smooth(limit * gradient + sqrt(limit))
+
+Routes have priorities (``LOAD_SHEDDING_LOW_PRIORITY_ROUTES``,
+``LOAD_SHEDDING_CRITICAL_ROUTES``, the rest normal):
+
+- critical routes (checkout, cart) are always admitted;
+- normal routes are admitted while fewer requests than the limit are in
+  flight;
+- low-priority routes (search, exports, reports) only up to
+  ``LOAD_SHEDDING_LOW_PRIORITY_SHARE`` of the limit, and not at all while
+  the gradient is below ``LOAD_SHEDDING_LOW_PRIORITY_MIN_GRADIENT``.
+
+Rejected requests get a 503 with ``Retry-After`` at once instead of waiting
+for a slow database. The gradient rule is what sheds with gunicorn's sync
+workers, which only ever have one request in flight: when the database
+slows down, search and exports are turned away first while catalog reads,
+cart and checkout keep going. The in-flight limit matters with threaded or
+ASGI workers.
+
+Latency is sampled from normal and critical requests; low-priority ones are
+slow by nature. While no samples arrive (say only low-priority traffic is
+left, and all of it shed) the short average decays towards the long one,
+halving the gap every ``IDLE_HALF_LIFE`` seconds, so the gradient recovers
+on its own. ``/api/diagnostics/concurrency/`` shows the worker's state.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+
+LOW = 'low'
+NORMAL = 'normal'
+CRITICAL = 'critical'
+PRIORITIES = (LOW, NORMAL, CRITICAL)
+
+# Weights of a new latency sample in the short and long moving averages,
+# and of a new limit in the smoothed one.
+SHORT_WEIGHT = 0.05
+LONG_WEIGHT = 0.005
+LIMIT_SMOOTHING = 0.2
+MIN_GRADIENT = 0.5
+# Samples are capped at this multiple of the long average, so one slow
+# request does not shed anything; sustained slowness does.
+OUTLIER_FACTOR = 4
+# The gradient is 1 until this many samples were taken.
+WARMUP_SAMPLES = 20
+# Seconds without samples that halve the gap between the short and long
+# averages.
+IDLE_HALF_LIFE = 5.0
+
+
+def priority(view_name):
+    if view_name in settings.LOAD_SHEDDING_CRITICAL_ROUTES:
+        return CRITICAL
+    if view_name in settings.LOAD_SHEDDING_LOW_PRIORITY_ROUTES:
+        return LOW
+    return NORMAL
+
+
+class AdaptiveLimiter:
+    """Per-worker concurrency limit; see the module docstring."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.limit = float(settings.LOAD_SHEDDING_INITIAL_LIMIT)
+            self.in_flight = 0
+            self.short_latency = None
+            self.long_latency = None
+            self.samples = 0
+            self.sampled_at = None
+            self.admitted = dict.fromkeys(PRIORITIES, 0)
+            self.shed = dict.fromkeys(PRIORITIES, 0)
+
+    def _short_latency(self):
+        """The short average, decayed towards the long one since the last sample."""
+        idle = time.monotonic() - self.sampled_at
+        return self.long_latency + (self.short_latency - self.long_latency) * 0.5 ** (idle / IDLE_HALF_LIFE)
+
+    @property
+    def gradient(self):
+        if self.samples < WARMUP_SAMPLES or not self.short_latency:
+            return 1.0
+        return min(max(self.long_latency / self._short_latency(), MIN_GRADIENT), 1.0)
+
+    def acquire(self, priority):
+        """Admit a request of ``priority``; returns False to shed it."""
+        with self._lock:
+            admit = priority == CRITICAL
+            if priority == NORMAL:
+                admit = self.in_flight < self.limit
+            elif priority == LOW:
+                admit = (
+                    self.gradient >= settings.LOAD_SHEDDING_LOW_PRIORITY_MIN_GRADIENT
+                    and self.in_flight < max(self.limit * settings.LOAD_SHEDDING_LOW_PRIORITY_SHARE, 1)
+                )
+            if not admit:
+                self.shed[priority] += 1
+                return False
+            self.admitted[priority] += 1
+            self.in_flight += 1
+            return True
+
+    def release(self, priority, seconds=None):
+        """Finish an admitted request, sampling its latency in ``seconds`` if given."""
+        with self._lock:
+            self.in_flight -= 1
+            if seconds is None or priority == LOW:
+                return
+            self.samples += 1
+            if self.short_latency is None:
+                self.short_latency = self.long_latency = seconds
+            else:
+                seconds = min(seconds, self.long_latency * OUTLIER_FACTOR)
+                self.short_latency = self._short_latency()
+                self.short_latency += SHORT_WEIGHT * (seconds - self.short_latency)
+                self.long_latency += LONG_WEIGHT * (seconds - self.long_latency)
+            self.sampled_at = time.monotonic()
+            target = self.limit * self.gradient + math.sqrt(self.limit)
+            limit = self.limit + LIMIT_SMOOTHING * (target - self.limit)
+            self.limit = min(max(limit, settings.LOAD_SHEDDING_MIN_LIMIT), settings.LOAD_SHEDDING_MAX_LIMIT)
+
+    def state(self):
+        with self._lock:
+            return {
+                'limit': round(self.limit, 2),
+                'in_flight': self.in_flight,
+                'gradient': round(self.gradient, 3),
+                'samples': self.samples,
+                'short_latency_ms': round(self._short_latency() * 1000, 2) if self.short_latency else None,
+                'long_latency_ms': round(self.long_latency * 1000, 2) if self.long_latency else None,
+                'admitted': dict(self.admitted),
+                'shed': dict(self.shed),
+            }
+
+
+limiter = AdaptiveLimiter()
@@ -0,0 +1,108 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: what a gunicorn worker (or the master, with
+# --preload) does before it can serve a request.
+STARTUP_SCRIPT = '''
+import json, os, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+application = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urlconf = time.perf_counter()
+print(json.dumps({'application_ms': (application - started) * 1000, 'urlconf_ms': (urlconf - application) * 1000}))
+'''
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def parse_importtime(output):
+    """Return ``(module, self_us, cumulative_us, depth)`` from ``-X importtime`` output."""
+    imports = []
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            imports.append((module, int(own), int(cumulative), len(indent) // 2))
+    return imports
+
+
+class Command(BaseCommand):
+    help = 'Measure cold start time and the imports it is spent on'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Runs; the median is reported')
+        parser.add_argument('--top', type=int, default=15, help='Packages and modules listed')
+        parser.add_argument('--budget-ms', type=float, help='Fail when the cold start exceeds this')
+        parser.add_argument('--output', help='Write the measurements to this JSON file')
+
+    def handle(self, *args, **options):
+        runs = [self.measure() for _ in range(max(options['repeat'], 1))]
+        run = sorted(runs, key=lambda item: item['cold_start_ms'])[len(runs) // 2]
+        cold_start = statistics.median(item['cold_start_ms'] for item in runs)
+
+        self.stdout.write(f'Cold start: {cold_start:.0f} ms (median of {len(runs)})')
+        self.stdout.write(f"  interpreter and imports   {run['interpreter_ms']:8.0f} ms")
+        self.stdout.write(f"  settings and WSGI app     {run['application_ms']:8.0f} ms")
+        self.stdout.write(f"  URLconf, views            {run['urlconf_ms']:8.0f} ms")
+        self.stdout.write(f"  imports in total          {run['imports_ms']:8.0f} ms")
+
+        self.stdout.write('\nImport time by package (self time):')
+        for package, ms in run['packages'][:options['top']]:
+            self.stdout.write(f'  {ms:8.1f} ms  {package}')
+        self.stdout.write('\nSlowest project modules (including their imports):')
+        for module, ms in run['project_modules'][:options['top']]:
+            self.stdout.write(f'  {ms:8.1f} ms  {module}')
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump({'cold_start_ms': cold_start, 'runs': runs}, handle, indent=2)
+
+        if options['budget_ms'] is not None and cold_start > options['budget_ms']:
+            raise CommandError(f"Cold start {cold_start:.0f} ms exceeds the budget of {options['budget_ms']:.0f} ms")
+
+    def measure(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'))
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+        if result.returncode:
+            raise CommandError(f'Startup failed:\n{result.stderr[-2000:]}')
+        phases = json.loads(result.stdout.strip().splitlines()[-1])
+
+        imports = parse_importtime(result.stderr)
+        packages = {}
+        for module, own, _, _ in imports:
+            package = module.split('.')[0]
+            packages[package] = packages.get(package, 0) + own / 1000
+        project = {
+            path.name for path in settings.BASE_DIR.iterdir() if (path / '__init__.py').exists()
+        }
+        project_modules = {}
+        for module, _, cumulative, _ in imports:
+            if module.split('.')[0] in project:
+                project_modules[module] = max(project_modules.get(module, 0), cumulative / 1000)
+
+        return {
+            'cold_start_ms': elapsed,
+            'application_ms': phases['application_ms'],
+            'urlconf_ms': phases['urlconf_ms'],
+            'interpreter_ms': elapsed - phases['application_ms'] - phases['urlconf_ms'],
+            'imports_ms': sum(own for _, own, _, _ in imports) / 1000,
+            'packages': sorted(packages.items(), key=lambda item: -item[1]),
+            'project_modules': sorted(project_modules.items(), key=lambda item: -item[1]),
+        }
@@ -0,0 +1,88 @@
+from datetime import datetime
+import json
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.profiling import ProfileStore
+
+FORMATS = ('folded', 'pstats', 'json', 'sql')
+
+
+class Command(BaseCommand):
+    help = 'List stored request profiles or export one of them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', nargs='?', choices=('list', 'export'), default='list')
+        parser.add_argument('profile_id', nargs='?', help="Profile to export, or 'latest'")
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default='folded',
+            help='folded stacks (flamegraph.pl, speedscope), pstats (snakeviz), '
+                 'the JSON document or the SQL timeline'
+        )
+        parser.add_argument('--output', help='File to write to (default: stdout; required for pstats)')
+        parser.add_argument('--dir', help='Profile directory (default: PROFILING_DIR)')
+
+    def handle(self, *args, **options):
+        store = ProfileStore(options['dir'])
+        if options['action'] == 'list':
+            self.list(store)
+        else:
+            self.export(store, options)
+
+    def list(self, store):
+        ids = store.ids()
+        if not ids:
+            self.stdout.write(f'No profiles in {store.directory}')
+            return
+        self.stdout.write(f"{'id':<30} {'created':<19} {'status':>6} {'ms':>9} {'queries':>7}  request")
+        for profile_id in reversed(ids):
+            try:
+                profile = store.load(profile_id)
+            except KeyError:
+                continue
+            created = datetime.fromtimestamp(profile['created']).strftime('%Y-%m-%d %H:%M:%S')
+            self.stdout.write(
+                f"{profile_id:<30} {created:<19} {profile['status']:>6} {profile['duration_ms']:>9.1f} "
+                f"{profile['db_queries']:>7}  {profile['method']} {profile['path']}"
+            )
+
+    def export(self, store, options):
+        profile_id = options['profile_id']
+        if not profile_id:
+            raise CommandError('Give the id of the profile to export.')
+        if profile_id == 'latest':
+            ids = store.ids()
+            if not ids:
+                raise CommandError(f'No profiles in {store.directory}')
+            profile_id = ids[-1]
+        try:
+            profile = store.load(profile_id)
+        except KeyError:
+            raise CommandError(f'Profile {profile_id} not found in {store.directory}')
+
+        output_format = options['format']
+        if output_format == 'pstats':
+            if not options['output']:
+                raise CommandError('--output is required for the pstats format.')
+            shutil.copyfile(store.pstats_path(profile_id), options['output'])
+            return
+
+        if output_format == 'folded':
+            lines = [f'{stack} {count}' for stack, count in profile['folded'].items()]
+        elif output_format == 'sql':
+            lines = [
+                f"{entry['start_ms']:>10.3f}ms +{entry['duration_ms']:.3f}ms [{entry['alias']}] {entry['sql']}"
+                for entry in profile['sql']
+            ]
+        else:
+            lines = [json.dumps(profile, indent=2)]
+
+        text = '\n'.join(lines) + '\n'
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(text)
+        else:
+            self.stdout.write(text, ending='')
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+
+class Command(BaseCommand):
+    help = 'Wait until the database accepts connections (readiness probe for entrypoint.sh)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait before failing')
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds between attempts')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        started = time.monotonic()
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                connection.ensure_connection()
+                break
+            except OperationalError as exc:
+                waited = time.monotonic() - started
+                if waited >= options['timeout']:
+                    raise CommandError(f'Database unavailable after {waited:.1f}s: {exc}')
+                if attempts == 1:
+                    self.stdout.write('Waiting for database...')
+                time.sleep(options['interval'])
+        connection.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Database ready after {time.monotonic() - started:.1f}s ({attempts} attempts)'
+        ))
@@ -0,0 +1,164 @@
+"""
+Worker memory diagnostics.
+
+With ``MEMORY_TRACKING_ENABLED`` each worker runs ``tracemalloc`` and,
+every ``MEMORY_SAMPLE_SECONDS``, summarizes a snapshot into allocation
+sites (``file:line`` with bytes and blocks). The first, previous and latest
+summaries are kept, so ``/api/diagnostics/memory/`` can report the top
+sites and what grew since the previous sample or since the worker started.
+The peak allocation of every request above the memory in use when it
+started is recorded per route.
+
+tracemalloc slows allocation down noticeably; enable it on one instance
+while investigating rather than everywhere.
+
+Independently of tracing, ``MEMORY_RSS_LIMIT_MB`` makes a gunicorn worker
+whose resident set exceeds the budget finish its request and exit
+(SIGTERM is gunicorn's graceful shutdown); the arbiter starts a fresh one.
+"""
+import logging
+import os
+import resource
+import threading
+import time
+import tracemalloc
+
+from products.refresh import BackgroundRefresh
+
+logger = logging.getLogger(__name__)
+
+# Frames kept per traceback; sites are reported by their innermost frame.
+TRACE_FRAMES = 1
+
+IGNORED_FILES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+
+def rss_bytes():
+    """Return the resident set size of this process."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # No procfs (macOS): fall back to the peak, reported in bytes there.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Sample:
+    """Allocation sites of one snapshot, ``{'file:line': (bytes, blocks)}``."""
+
+    def __init__(self, snapshot):
+        self.taken_at = time.time()
+        self.rss_bytes = rss_bytes()
+        self.traced_bytes = tracemalloc.get_traced_memory()[0]
+        self.sites = {}
+        for stat in snapshot.filter_traces(IGNORED_FILES).statistics('lineno'):
+            frame = stat.traceback[0]
+            self.sites[f'{frame.filename}:{frame.lineno}'] = (stat.size, stat.count)
+
+    def top(self, limit):
+        ranked = sorted(self.sites.items(), key=lambda item: -item[1][0])[:limit]
+        return [{'site': site, 'bytes': size, 'blocks': count} for site, (size, count) in ranked]
+
+    def diff(self, older, limit):
+        """Return the sites that changed most since ``older``."""
+        changes = []
+        for site in self.sites.keys() | older.sites.keys():
+            size, count = self.sites.get(site, (0, 0))
+            old_size, old_count = older.sites.get(site, (0, 0))
+            if size != old_size:
+                changes.append({
+                    'site': site, 'bytes': size, 'bytes_diff': size - old_size,
+                    'blocks': count, 'blocks_diff': count - old_count,
+                })
+        changes.sort(key=lambda change: -abs(change['bytes_diff']))
+        return changes[:limit]
+
+    def header(self):
+        return {'taken_at': self.taken_at, 'rss_bytes': self.rss_bytes, 'traced_bytes': self.traced_bytes}
+
+
+class MemoryTracker(BackgroundRefresh):
+    """Per-worker tracemalloc samples and per-route request peaks."""
+
+    refresh_setting = 'MEMORY_SAMPLE_SECONDS'
+
+    def __init__(self):
+        super().__init__()
+        self.baseline = None
+        self.previous = None
+        self.latest = None
+        self.routes = {}
+        self._routes_lock = threading.Lock()
+        # Snapshots allocate heavily; request peaks overlapping one are dropped.
+        self.sampling = False
+        self.generation = 0
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def refresh(self):
+        """Take a snapshot and rotate the kept samples."""
+        self.sampling = True
+        try:
+            sample = Sample(tracemalloc.take_snapshot())
+        finally:
+            self.sampling = False
+            self.generation += 1
+        if self.baseline is None:
+            self.baseline = sample
+        self.previous, self.latest = self.latest, sample
+        self.mark_refreshed()
+        logger.info(
+            'Memory sample: rss=%d traced=%d sites=%d',
+            sample.rss_bytes, sample.traced_bytes, len(sample.sites)
+        )
+
+    def record_request(self, route, peak):
+        with self._routes_lock:
+            stats = self.routes.setdefault(route, {'requests': 0, 'max_peak_bytes': 0, 'total_peak_bytes': 0})
+            stats['requests'] += 1
+            stats['total_peak_bytes'] += peak
+            stats['max_peak_bytes'] = max(stats['max_peak_bytes'], peak)
+
+    def route_stats(self):
+        with self._routes_lock:
+            return {
+                route: {
+                    'requests': stats['requests'],
+                    'max_peak_bytes': stats['max_peak_bytes'],
+                    'mean_peak_bytes': stats['total_peak_bytes'] // stats['requests'],
+                }
+                for route, stats in sorted(self.routes.items(), key=lambda item: -item[1]['max_peak_bytes'])
+            }
+
+    def report(self, limit, against='previous'):
+        """Return the diagnostics document served by the memory endpoint."""
+        tracing = tracemalloc.is_tracing()
+        traced = tracemalloc.get_traced_memory()[0]
+        older = self.baseline if against == 'baseline' else self.previous
+        latest = self.latest
+        return {
+            'pid': os.getpid(),
+            'rss_bytes': rss_bytes(),
+            'tracing': tracing,
+            'traced_bytes': traced,
+            'latest_sample': latest.header() if latest else None,
+            'compared_sample': older.header() if older and latest and older is not latest else None,
+            'top': latest.top(limit) if latest else [],
+            'diff': latest.diff(older, limit) if older and latest and older is not latest else [],
+            'routes': self.route_stats(),
+        }
+
+
+tracker = MemoryTracker()
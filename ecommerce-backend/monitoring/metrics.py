@@ -0,0 +1,130 @@
+"""
+Prometheus metrics.
+
+Under gunicorn set ``PROMETHEUS_MULTIPROC_DIR`` (``entrypoint.sh`` does):
+every worker then writes its samples to mmap-backed files in that
+directory and ``/metrics`` aggregates all of them, so scraping any worker
+reports the whole process group. Without it, metrics are per process.
+"""
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by route',
+    ['route', 'method'],
+)
+RESPONSES = Counter(
+    'http_responses_total',
+    'Responses by route and status code',
+    ['route', 'method', 'status'],
+)
+REQUEST_SIZE = Histogram(
+    'http_request_size_bytes',
+    'Request body size by route',
+    ['route'],
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Response body size by route (streaming responses excluded)',
+    ['route'],
+    buckets=SIZE_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Requests being processed',
+    multiprocess_mode='livesum',
+)
+DB_QUERIES = Counter(
+    'db_queries_total',
+    'Database queries by route',
+    ['route'],
+)
+DB_SECONDS = Counter(
+    'db_query_duration_seconds_total',
+    'Time spent in database queries by route',
+    ['route'],
+)
+REQUEST_PEAK_ALLOCATION = Histogram(
+    'http_request_peak_allocation_bytes',
+    'Peak Python allocation during a request, with MEMORY_TRACKING_ENABLED',
+    ['route'],
+    buckets=(10_000, 100_000, 1_000_000, 10_000_000, 100_000_000),
+)
+WORKER_RECYCLES = Counter(
+    'worker_recycles_total',
+    'Workers restarted for exceeding MEMORY_RSS_LIMIT_MB',
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Cache lookups by cache and result',
+    ['cache', 'result'],
+)
+THROTTLED_REQUESTS = Counter(
+    'throttled_requests_total',
+    'Requests rejected by throttles, by scope',
+    ['scope'],
+)
+SHED_REQUESTS = Counter(
+    'shed_requests_total',
+    'Requests rejected by the adaptive concurrency limit, by route priority',
+    ['priority'],
+)
+DEADLINE_EXCEEDED = Counter(
+    'db_deadline_exceeded_total',
+    'Requests whose database work outlasted their deadline, by route',
+    ['route'],
+)
+CHECKOUTS = Counter(
+    'checkout_total',
+    'Order creation attempts by outcome',
+    ['outcome'],
+)
+
+CHECKOUT_SUCCESS = 'success'
+CHECKOUT_OVERSELL = 'oversell'
+CHECKOUT_VALIDATION_FAILURE = 'validation_failure'
+
+
+def record_cache(cache, hit):
+    """Count one lookup in the named cache."""
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def record_throttle(scope):
+    THROTTLED_REQUESTS.labels(scope=scope).inc()
+
+
+def record_shed(priority):
+    SHED_REQUESTS.labels(priority=priority).inc()
+
+
+def record_deadline_exceeded(route):
+    DEADLINE_EXCEEDED.labels(route=route).inc()
+
+
+def record_checkout(outcome):
+    CHECKOUTS.labels(outcome=outcome).inc()
+
+
+def exposition():
+    """Return ``(body, content_type)`` of all metrics in text format."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
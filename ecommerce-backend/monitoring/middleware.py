@@ -0,0 +1,241 @@
+"""
+Per-request SQL instrumentation, Prometheus request metrics, load shedding
+and memory tracking.
+
+For a sampled share of requests (``SQL_INSTRUMENTATION_SAMPLE_RATE``) every
+statement on every database connection is timed through an execute
+wrapper. The totals are returned in a ``Server-Timing`` header (which the
+gunicorn access log prints, see ``entrypoint.sh``) and logged as
+``key=value`` fields on the ``monitoring.requests`` logger, also passed as
+``extra`` for structured handlers.
+
+Requests slower than ``SQL_SLOW_REQUEST_MS`` are logged as warnings with
+their slowest statements and repeated query fingerprints and, with
+``SQL_EXPLAIN_SLOW``, the query plan of the slowest ``SELECT``.
+
+Queries run while a streaming response is consumed happen after the view
+returns and are not counted.
+"""
+from contextlib import ExitStack
+import logging
+import os
+import random
+import signal
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+
+from . import limiter, memory, metrics
+from .sql import QueryCounter, StatementTimer, fingerprint
+
+logger = logging.getLogger('monitoring.requests')
+memory_logger = logging.getLogger('monitoring.memory')
+
+
+class SQLInstrumentationMiddleware:
+    """Times the SQL of sampled requests; see the module docstring."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.SQL_INSTRUMENTATION_ENABLED or random.random() >= settings.SQL_INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+
+        timer = StatementTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        response['Server-Timing'] = (
+            f'db;dur={timer.seconds * 1000:.1f};desc="{timer.queries} queries", '
+            f'app;dur={elapsed * 1000:.1f}'
+        )
+        self.log(request, response, timer, elapsed)
+        return response
+
+    def log(self, request, response, timer, elapsed):
+        duplicates = timer.duplicates()
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            'db_queries': timer.queries,
+            'db_ms': round(timer.seconds * 1000, 1),
+            'db_duplicates': sum(count - 1 for count in duplicates.values()),
+        }
+        slow = elapsed * 1000 >= settings.SQL_SLOW_REQUEST_MS
+        if not slow:
+            logger.info(_logfmt(fields), extra={'sql': fields})
+            return
+
+        slowest = timer.slowest(settings.SQL_SLOWEST_STATEMENTS)
+        fields['slowest'] = [
+            {'ms': round(seconds * 1000, 1), 'sql': fingerprint(sql)} for seconds, sql, _, _ in slowest
+        ]
+        fields['duplicates'] = dict(sorted(duplicates.items(), key=lambda item: -item[1])[:5])
+        lines = [_logfmt({key: value for key, value in fields.items() if key not in ('slowest', 'duplicates')})]
+        lines += [f"  slow {entry['ms']}ms {entry['sql']}" for entry in fields['slowest']]
+        lines += [f'  repeated {count}x {sql}' for sql, count in fields['duplicates'].items()]
+
+        if settings.SQL_EXPLAIN_SLOW:
+            plan = self.explain(slowest)
+            if plan:
+                fields['explain'] = plan
+                lines += ['  explain:'] + [f'    {line}' for line in plan]
+        logger.warning('\n'.join(lines), extra={'sql': fields})
+
+    def explain(self, slowest):
+        """Return the plan of the slowest SELECT as text lines, if any."""
+        for _, sql, params, alias in slowest:
+            if not sql.lstrip().upper().startswith('SELECT') or params is None:
+                continue
+            connection = connections[alias]
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                    return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+            except Exception:
+                logger.exception('EXPLAIN failed for %s', fingerprint(sql))
+                return None
+        return None
+
+
+def _logfmt(fields):
+    return ' '.join(f'{key}={value}' for key, value in fields.items())
+
+
+class MetricsMiddleware:
+    """
+    Records the Prometheus request metrics of ``monitoring/metrics.py``.
+
+    Requests are labelled with the name of the URL pattern they resolved to
+    (``unmatched`` otherwise) so label values stay bounded.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with metrics.IN_FLIGHT.track_inprogress(), ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        route = match.view_name if match is not None else 'unmatched'
+        metrics.REQUEST_LATENCY.labels(route=route, method=request.method).observe(elapsed)
+        metrics.RESPONSES.labels(route=route, method=request.method, status=response.status_code).inc()
+        metrics.REQUEST_SIZE.labels(route=route).observe(int(request.META.get('CONTENT_LENGTH') or 0))
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.labels(route=route).observe(len(response.content))
+        metrics.DB_QUERIES.labels(route=route).inc(counter.queries)
+        metrics.DB_SECONDS.labels(route=route).inc(counter.seconds)
+        return response
+
+
+def shed_response(priority):
+    """The 503 answering a request the limiter turned away."""
+    metrics.record_shed(priority)
+    response = JsonResponse({'error': 'The server is overloaded, please retry shortly'}, status=503)
+    response['Retry-After'] = str(settings.LOAD_SHEDDING_RETRY_AFTER)
+    return response
+
+
+class LoadSheddingMiddleware:
+    """
+    Admits requests through the worker's adaptive concurrency limit and
+    answers the ones it sheds with a 503; see ``monitoring/limiter.py``.
+
+    Requests that match no URL pattern are not limited. A streaming
+    response holds its slot until it is closed but is not sampled.
+    """
+
+    def __init__(self, get_response):
+        if not settings.LOAD_SHEDDING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        admitted = getattr(request, '_load_shedding', None)
+        if admitted is None:
+            return response
+        priority, started = admitted
+        if response.streaming:
+            response._resource_closers.append(lambda: limiter.limiter.release(priority))
+        else:
+            limiter.limiter.release(priority, time.perf_counter() - started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        priority = limiter.priority(request.resolver_match.view_name)
+        if not limiter.limiter.acquire(priority):
+            return shed_response(priority)
+        request._load_shedding = (priority, time.perf_counter())
+        return None
+
+
+class MemoryMiddleware:
+    """
+    Records per-route peak allocation and recycles oversized workers; see
+    ``monitoring/memory.py``.
+    """
+
+    def __init__(self, get_response):
+        if not settings.MEMORY_TRACKING_ENABLED and not settings.MEMORY_RSS_LIMIT_MB:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.recycling = False
+        if settings.MEMORY_TRACKING_ENABLED:
+            memory.tracker.start()
+
+    def __call__(self, request):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            generation = memory.tracker.generation
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        response = self.get_response(request)
+
+        if tracing:
+            peak = max(tracemalloc.get_traced_memory()[1] - before, 0)
+            if not memory.tracker.sampling and memory.tracker.generation == generation:
+                match = request.resolver_match
+                route = match.view_name if match is not None else 'unmatched'
+                memory.tracker.record_request(route, peak)
+                metrics.REQUEST_PEAK_ALLOCATION.labels(route=route).observe(peak)
+            memory.tracker.ensure_fresh()
+
+        if settings.MEMORY_RSS_LIMIT_MB and not self.recycling:
+            self.check_rss(request)
+        return response
+
+    def check_rss(self, request):
+        rss = memory.rss_bytes()
+        if rss <= settings.MEMORY_RSS_LIMIT_MB * 1024 * 1024:
+            return
+        # Only gunicorn workers are restarted for us after exiting.
+        if not request.META.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+            return
+        self.recycling = True
+        memory_logger.warning(
+            'Worker %d RSS %.0f MB exceeds MEMORY_RSS_LIMIT_MB=%d; recycling after this request',
+            os.getpid(), rss / 1024 / 1024, settings.MEMORY_RSS_LIMIT_MB
+        )
+        metrics.WORKER_RECYCLES.inc()
+        os.kill(os.getpid(), signal.SIGTERM)
@@ -0,0 +1,244 @@
+"""
+On-demand request profiling for staff.
+
+A staff user (session or JWT) sends ``X-Profile: 1`` or adds ``_profile=1``
+to the query string; the request then runs under ``cProfile`` and its SQL
+statements are recorded with their offsets from the start of the request.
+At most ``PROFILING_MAX_PER_MINUTE`` requests are profiled per worker and
+one at a time; others run normally.
+
+cProfile only keeps caller/callee totals, which cannot be turned back into
+the stacks a flamegraph needs, so a thread also samples the request's stack
+every ``PROFILING_SAMPLE_INTERVAL_MS``.
+
+Each profile is stored in ``PROFILING_DIR`` as ``<id>.prof`` (pstats, for
+snakeviz or ``python -m pstats``) and ``<id>.json`` (request details, SQL
+timeline and sampled folded stacks for flamegraph.pl or speedscope). The
+directory is a ring buffer of the latest ``PROFILING_MAX_PROFILES``
+profiles; the ``profiles`` command lists and exports them. The profile id
+is returned in the ``X-Profile-Id`` header.
+"""
+import cProfile
+from contextlib import ExitStack
+import json
+import os
+from pathlib import Path
+import pstats
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.exceptions import AuthenticationFailed
+
+from accounts.authentication import CachedJWTAuthentication
+
+# Query flag and header that request a profile.
+QUERY_FLAG = '_profile'
+HEADER = 'HTTP_X_PROFILE'
+
+# The request thread may hold the GIL for a whole switch interval (5ms by
+# default) before the sampler gets to run; it is shortened while profiling.
+SWITCH_INTERVAL = 0.0005
+
+
+class SQLTimeline:
+    """Execute wrapper recording when each statement started and ended."""
+
+    def __init__(self, started):
+        self.started = started
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            # Parameters are left out: profiles are kept on disk.
+            self.statements.append({
+                'start_ms': round((started - self.started) * 1000, 3),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                'alias': context['connection'].alias,
+                'sql': sql,
+            })
+
+
+class RateCap:
+    """Allows at most ``limit`` events per rolling minute."""
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def acquire(self, limit):
+        now = time.monotonic()
+        with self.lock:
+            self.events = [event for event in self.events if now - event < 60]
+            if len(self.events) >= limit:
+                return False
+            self.events.append(now)
+            return True
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of one thread every ``interval`` seconds, counting
+    folded stacks (``'outer;inner'``) below ``stop_frame``.
+    """
+
+    def __init__(self, thread_id, stop_frame, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stop_frame = stop_frame
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.folded = {}
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None and frame is not self.stop_frame:
+                code = frame.f_code
+                labels.append(f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if labels:
+                key = ';'.join(reversed(labels))
+                self.folded[key] = self.folded.get(key, 0) + 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class ProfileStore:
+    """Ring buffer of profiles in ``PROFILING_DIR``."""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or settings.PROFILING_DIR)
+
+    def save(self, meta, profile):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_id = f'{time.time_ns()}-{os.getpid()}'
+        pstats.Stats(profile).dump_stats(self.directory / f'{profile_id}.prof')
+        document = dict(meta, id=profile_id)
+        # Written under a temporary name so readers never see partial files.
+        partial = self.directory / f'{profile_id}.json.tmp'
+        partial.write_text(json.dumps(document))
+        partial.rename(self.directory / f'{profile_id}.json')
+        self.prune()
+        return profile_id
+
+    def prune(self, keep=None):
+        keep = settings.PROFILING_MAX_PROFILES if keep is None else keep
+        ids = self.ids()
+        for profile_id in ids[:max(len(ids) - keep, 0)]:
+            for suffix in ('.json', '.prof'):
+                try:
+                    (self.directory / f'{profile_id}{suffix}').unlink()
+                except FileNotFoundError:
+                    # Another worker pruned it first.
+                    pass
+
+    def ids(self):
+        """Return stored profile ids, oldest first."""
+        if not self.directory.is_dir():
+            return []
+        return sorted(
+            (path.stem for path in self.directory.glob('*.json')),
+            key=lambda profile_id: int(profile_id.split('-')[0]),
+        )
+
+    def load(self, profile_id):
+        """Return the JSON document of a profile; raises ``KeyError`` if gone."""
+        try:
+            return json.loads((self.directory / f'{profile_id}.json').read_text())
+        except (FileNotFoundError, ValueError):
+            raise KeyError(profile_id)
+
+    def pstats_path(self, profile_id):
+        return self.directory / f'{profile_id}.prof'
+
+
+class ProfilingMiddleware:
+    """Profiles flagged staff requests; see the module docstring."""
+
+    # One profiler per process; cProfile cannot nest.
+    lock = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cap = RateCap()
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED or not self.requested(request):
+            return self.get_response(request)
+        self.strip_flag(request)
+        if not self.is_staff(request) or not self.cap.acquire(settings.PROFILING_MAX_PER_MINUTE):
+            return self.get_response(request)
+        if not self.lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile(request)
+        finally:
+            self.lock.release()
+
+    def requested(self, request):
+        return request.META.get(HEADER) == '1' or request.GET.get(QUERY_FLAG) == '1'
+
+    def strip_flag(self, request):
+        # Keep the flag away from views so the profiled path is the usual one.
+        if QUERY_FLAG in request.GET:
+            query = request.GET.copy()
+            del query[QUERY_FLAG]
+            query._mutable = False
+            request.GET = query
+
+    def is_staff(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return result is not None and result[0].is_staff
+
+    def profile(self, request):
+        profiler = cProfile.Profile()
+        interval = settings.PROFILING_SAMPLE_INTERVAL_MS / 1000
+        sampler = StackSampler(threading.get_ident(), sys._getframe(), interval)
+        switch_interval = sys.getswitchinterval()
+        started = time.perf_counter()
+        timeline = SQLTimeline(started)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timeline))
+            sys.setswitchinterval(SWITCH_INTERVAL)
+            sampler.start()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                sampler.stop()
+                sys.setswitchinterval(switch_interval)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        profile_id = ProfileStore().save({
+            'created': time.time(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'route': match.view_name if match is not None else None,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 3),
+            'db_queries': len(timeline.statements),
+            'db_ms': round(sum(entry['duration_ms'] for entry in timeline.statements), 3),
+            'sql': timeline.statements,
+            'sample_interval_ms': settings.PROFILING_SAMPLE_INTERVAL_MS,
+            'folded': sampler.folded,
+        }, profiler)
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,72 @@
+"""
+SQL statement recording shared by the request instrumentation and the
+benchmarks.
+"""
+import re
+import time
+
+# Statements kept per request for duplicate/slowest reporting; queries past
+# this are still counted and timed.
+MAX_RECORDED_STATEMENTS = 1000
+
+
+def fingerprint(sql):
+    """Normalize a statement so repeats with different parameters match."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'%s|\b\d+\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryCounter:
+    """Execute wrapper counting and timing statements without keeping them."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+
+class StatementTimer:
+    """
+    Execute wrapper timing every statement run on a connection.
+
+    Install with ``connection.execute_wrapper(timer)``; one timer may wrap
+    several connections.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        # (seconds, sql, params, alias) of the first MAX_RECORDED_STATEMENTS.
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.seconds += elapsed
+            if len(self.statements) < MAX_RECORDED_STATEMENTS:
+                alias = context['connection'].alias
+                self.statements.append((elapsed, sql, None if many else params, alias))
+
+    def duplicates(self):
+        """Return ``{fingerprint: count}`` for statements run more than once."""
+        counts = {}
+        for _, sql, _, _ in self.statements:
+            key = fingerprint(sql)
+            counts[key] = counts.get(key, 0) + 1
+        return {key: count for key, count in counts.items() if count > 1}
+
+    def slowest(self, count):
+        return sorted(self.statements, key=lambda statement: statement[0], reverse=True)[:count]
@@ -0,0 +1,355 @@
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from prometheus_client import REGISTRY
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import User
+from products.models import Category, Product
+from . import limiter, memory
+from .management.commands.profile_startup import parse_importtime
+from .profiling import ProfileStore
+from .sql import fingerprint
+
+
+class FingerprintTests(TestCase):
+    def test_parameters_are_normalized(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = %s AND b IN (%s, %s) AND c = 'x' LIMIT 21"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ? LIMIT ?'
+        )
+
+
+@override_settings(SQL_INSTRUMENTATION_SAMPLE_RATE=1)
+class SQLInstrumentationMiddlewareTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Electronics')
+        Product.objects.create(
+            name='Laptop', description='Laptop', price=Decimal('999.00'),
+            category=category, sku='LAP-1', stock_quantity=3,
+        )
+
+    def test_server_timing_and_log_fields(self):
+        with self.assertLogs('monitoring.requests', 'INFO') as logs:
+            response = self.client.get('/api/products/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="4 queries", app;dur=[\d.]+$')
+        record = logs.records[0]
+        self.assertEqual(record.levelname, 'INFO')
+        self.assertEqual(record.sql['db_queries'], 4)
+        self.assertEqual(record.sql['path'], '/api/products/')
+        self.assertIn('status=200', record.getMessage())
+
+    @override_settings(SQL_SLOW_REQUEST_MS=0, SQL_EXPLAIN_SLOW=True)
+    def test_slow_request_logs_slowest_statements_and_plan(self):
+        with self.assertLogs('monitoring.requests', 'WARNING') as logs:
+            self.client.get('/api/products/')
+        fields = logs.records[0].sql
+        self.assertEqual(len(fields['slowest']), 3)
+        self.assertTrue(fields['explain'])
+        self.assertIn('explain:', logs.records[0].getMessage())
+
+    @override_settings(SQL_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_instrumented(self):
+        response = self.client.get('/api/products/')
+        self.assertNotIn('Server-Timing', response)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(
+            name='Laptop', description='Laptop', price=Decimal('999.00'),
+            category=category, sku='LAP-1', stock_quantity=3,
+        )
+        self.user = User.objects.create_user(email='buyer@example.com', password='testpass123')
+
+    route = 'products:product-list'
+
+    def test_request_metrics_are_labelled_by_route(self):
+        responses = sample('http_responses_total', route=self.route, method='GET', status='200')
+        requests = sample('http_request_duration_seconds_count', route=self.route, method='GET')
+        queries = sample('db_queries_total', route=self.route)
+
+        self.client.get('/api/products/')
+
+        self.assertEqual(sample('http_responses_total', route=self.route, method='GET', status='200'),
+                         responses + 1)
+        self.assertEqual(sample('http_request_duration_seconds_count', route=self.route, method='GET'),
+                         requests + 1)
+        self.assertEqual(sample('db_queries_total', route=self.route), queries + 4)
+        self.assertEqual(sample('http_requests_in_flight'), 0)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_responses_total{method="GET",route="products:product-list",status="200"}', response.content)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN='', METRICS_PUBLIC=False)
+    def test_hidden_without_token_in_production(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_checkout_outcomes(self):
+        self.client.force_authenticate(self.user)
+        before = {outcome: sample('checkout_total', outcome=outcome)
+                  for outcome in ('success', 'oversell', 'validation_failure')}
+
+        def checkout(quantity, product_id=self.product.pk):
+            return self.client.post('/api/orders/', {
+                'shipping_address': '1 Test Street', 'billing_address': '1 Test Street',
+                'items': [{'product_id': product_id, 'quantity': quantity}],
+            }, format='json')
+
+        self.assertEqual(checkout(1).status_code, 201)
+        self.assertEqual(checkout(5).status_code, 400)
+        self.assertEqual(checkout(1, product_id=0).status_code, 400)
+
+        for outcome in before:
+            self.assertEqual(sample('checkout_total', outcome=outcome), before[outcome] + 1, outcome)
+
+    def test_workers_are_aggregated_in_multiprocess_mode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory)
+            worker = 'from monitoring import metrics; metrics.record_checkout("success")'
+            for _ in range(2):
+                subprocess.run([sys.executable, '-c', worker], env=env, cwd=settings.BASE_DIR, check=True)
+            scrape = 'from monitoring import metrics; print(metrics.exposition()[0].decode())'
+            output = subprocess.run(
+                [sys.executable, '-c', scrape], env=env, cwd=settings.BASE_DIR,
+                check=True, capture_output=True, text=True,
+            ).stdout
+        self.assertIn('checkout_total{outcome="success"} 2.0', output)
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(PROFILING_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        category = Category.objects.create(name='Electronics')
+        Product.objects.create(
+            name='Laptop', description='Laptop', price=Decimal('999.00'),
+            category=category, sku='LAP-1', stock_quantity=3,
+        )
+        self.staff = User.objects.create_user(email='staff@example.com', password='testpass123', is_staff=True)
+        self.customer = User.objects.create_user(email='customer@example.com', password='testpass123')
+
+    def authorize(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_staff_request_is_profiled(self):
+        self.authorize(self.staff)
+        response = self.client.get('/api/products/?_profile=1')
+        self.assertEqual(response.status_code, 200)
+
+        profile = ProfileStore(self.directory).load(response['X-Profile-Id'])
+        self.assertEqual(profile['route'], 'products:product-list')
+        self.assertEqual(profile['db_queries'], len(profile['sql']))
+        self.assertGreater(profile['db_queries'], 0)
+        starts = [entry['start_ms'] for entry in profile['sql']]
+        self.assertEqual(starts, sorted(starts))
+        self.assertTrue(any('list (views.py' in stack for stack in profile['folded']))
+
+        out = StringIO()
+        call_command('profiles', 'export', 'latest', '--format', 'folded', stdout=out)
+        self.assertRegex(out.getvalue().splitlines()[0], r'^\S.* \d+$')
+        out = StringIO()
+        call_command('profiles', stdout=out)
+        self.assertIn('GET /api/products/?_profile=1', out.getvalue())
+
+    def test_other_users_are_not_profiled(self):
+        response = self.client.get('/api/products/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.authorize(self.customer)
+        response = self.client.get('/api/products/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(ProfileStore(self.directory).ids(), [])
+
+    @override_settings(PROFILING_MAX_PER_MINUTE=2, PROFILING_MAX_PROFILES=1)
+    def test_rate_cap_and_ring_buffer(self):
+        self.authorize(self.staff)
+        responses = [self.client.get('/api/categories/', HTTP_X_PROFILE='1') for _ in range(3)]
+        profiled = [response['X-Profile-Id'] for response in responses if 'X-Profile-Id' in response]
+        self.assertEqual(len(profiled), 2)
+        self.assertEqual(ProfileStore(self.directory).ids(), profiled[-1:])
+
+
+class MemoryDiagnosticsTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Electronics')
+        Product.objects.create(
+            name='Laptop', description='Laptop', price=Decimal('999.00'),
+            category=category, sku='LAP-1', stock_quantity=3,
+        )
+        self.staff = User.objects.create_user(email='staff@example.com', password='testpass123', is_staff=True)
+        patcher = mock.patch.object(memory, 'tracker', memory.MemoryTracker())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(MEMORY_TRACKING_ENABLED=True)
+    def test_report_lists_sites_diff_and_route_peaks(self):
+        self.addCleanup(tracemalloc.stop)
+        self.client.force_authenticate(self.staff)
+        self.client.get('/api/diagnostics/memory/?sample=1')
+        self.client.get('/api/categories/')
+        response = self.client.get('/api/diagnostics/memory/?sample=1&limit=5')
+
+        self.assertEqual(response.status_code, 200)
+        report = response.data
+        self.assertTrue(report['tracing'])
+        self.assertEqual(len(report['top']), 5)
+        self.assertTrue(report['diff'])
+        self.assertIsNotNone(report['compared_sample'])
+        route = report['routes']['products:category-list']
+        self.assertEqual(route['requests'], 1)
+        self.assertGreater(route['max_peak_bytes'], 0)
+
+    def test_staff_only(self):
+        user = User.objects.create_user(email='customer@example.com', password='testpass123')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get('/api/diagnostics/memory/').status_code, 403)
+
+    @override_settings(MEMORY_RSS_LIMIT_MB=1)
+    def test_gunicorn_worker_over_rss_budget_is_recycled_once(self):
+        with mock.patch('monitoring.middleware.os.kill') as kill, \
+                self.assertLogs('monitoring.memory', 'WARNING') as logs:
+            self.client.get('/api/categories/')
+            kill.assert_not_called()
+            for _ in range(2):
+                self.client.get('/api/categories/', SERVER_SOFTWARE='gunicorn/21.2.0')
+        kill.assert_called_once_with(os.getpid(), signal.SIGTERM)
+        self.assertEqual(len(logs.records), 1)
+
+
+@override_settings(LOAD_SHEDDING_ENABLED=True, LOAD_SHEDDING_INITIAL_LIMIT=4)
+class LoadSheddingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='testpass123')
+        patcher = mock.patch.object(limiter, 'limiter', limiter.AdaptiveLimiter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def slow_down(self, seconds):
+        for _ in range(limiter.WARMUP_SAMPLES):
+            limiter.limiter.acquire(limiter.NORMAL)
+            limiter.limiter.release(limiter.NORMAL, 0.01)
+        for _ in range(40):
+            limiter.limiter.acquire(limiter.NORMAL)
+            limiter.limiter.release(limiter.NORMAL, seconds)
+
+    def test_slow_responses_shed_low_priority_routes_first(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/products/search/').status_code, 200)
+        self.slow_down(0.04)
+        self.assertLess(limiter.limiter.gradient, settings.LOAD_SHEDDING_LOW_PRIORITY_MIN_GRADIENT)
+
+        response = self.client.get('/api/products/search/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.client.get('/api/products/').status_code, 200)
+        self.assertEqual(self.client.get('/api/cart/').status_code, 200)
+        self.assertEqual(limiter.limiter.shed[limiter.LOW], 1)
+        self.assertEqual(limiter.limiter.in_flight, 0)
+
+    def test_gradient_recovers_without_samples(self):
+        self.slow_down(0.04)
+        self.assertFalse(limiter.limiter.acquire(limiter.LOW))
+        later = limiter.time.monotonic() + 6 * limiter.IDLE_HALF_LIFE
+        with mock.patch('monitoring.limiter.time.monotonic', return_value=later):
+            self.assertGreater(limiter.limiter.gradient, settings.LOAD_SHEDDING_LOW_PRIORITY_MIN_GRADIENT)
+            self.assertTrue(limiter.limiter.acquire(limiter.LOW))
+
+    def test_one_slow_response_sheds_nothing(self):
+        self.slow_down(0.01)
+        limiter.limiter.acquire(limiter.NORMAL)
+        limiter.limiter.release(limiter.NORMAL, 5.0)
+        self.assertGreater(limiter.limiter.gradient, settings.LOAD_SHEDDING_LOW_PRIORITY_MIN_GRADIENT)
+
+    def test_in_flight_limit(self):
+        for _ in range(4):
+            self.assertTrue(limiter.limiter.acquire(limiter.NORMAL))
+        self.assertFalse(limiter.limiter.acquire(limiter.NORMAL))
+        self.assertFalse(limiter.limiter.acquire(limiter.LOW))
+        self.assertTrue(limiter.limiter.acquire(limiter.CRITICAL))
+        self.assertEqual(self.client.get('/api/products/').status_code, 503)
+        self.assertEqual(self.client.post('/api/cart/add/', {}, format='json').status_code, 401)
+
+    def test_diagnostics(self):
+        staff = User.objects.create_user(email='staff@example.com', password='testpass123', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/diagnostics/concurrency/').status_code, 403)
+        self.client.force_authenticate(staff)
+        self.client.get('/api/products/')
+        state = self.client.get('/api/diagnostics/concurrency/').json()
+        self.assertTrue(state['enabled'])
+        # The rejected request, the product list and this one.
+        self.assertEqual(state['admitted'][limiter.NORMAL], 3)
+        self.assertEqual(state['in_flight'], 1)
+        self.assertEqual(state['samples'], 2)
+
+
+class StartupTests(APITestCase):
+    def test_readiness_checks_the_database(self):
+        self.assertEqual(self.client.get('/ready').json(), {'status': 'ok'})
+        with mock.patch('monitoring.views.connection.cursor', side_effect=OperationalError):
+            response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 503)
+
+    def test_wait_for_db_retries_until_the_database_answers(self):
+        attempts = [OperationalError, OperationalError, None]
+        with mock.patch('django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection', side_effect=attempts):
+            call_command('wait_for_db', interval=0, stdout=StringIO())
+
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     numpy.core\n'
+            'import time:      2048 |       2168 |   numpy\n'
+        )
+        self.assertEqual(parse_importtime(output), [('numpy.core', 120, 120, 2), ('numpy', 2048, 2168, 1)])
+
+    def test_views_do_not_import_numpy(self):
+        script = (
+            'import os, sys, django; os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings"); '
+            'django.setup(); from django.urls import get_resolver; get_resolver().url_patterns; '
+            'print("numpy" in sys.modules)'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        )
+        self.assertEqual(result.stdout.strip(), 'False')
+
+    def test_preload_loads_indexes_only_when_enabled(self):
+        from config.preload import preload
+
+        with mock.patch('products.autocomplete.index.refresh') as refresh:
+            preload()
+            refresh.assert_not_called()
+            with override_settings(PRELOAD_INDEXES=True):
+                refresh.side_effect = OperationalError
+                with self.assertLogs('config.preload', 'WARNING'):
+                    preload()
+            refresh.assert_called_once()
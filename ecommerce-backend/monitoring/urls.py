@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import ConcurrencyDiagnosticsView, MemoryDiagnosticsView
+
+app_name = 'monitoring'
+
+urlpatterns = [
+    path('diagnostics/memory/', MemoryDiagnosticsView.as_view(), name='diagnostics-memory'),
+    path('diagnostics/concurrency/', ConcurrencyDiagnosticsView.as_view(), name='diagnostics-concurrency'),
+]
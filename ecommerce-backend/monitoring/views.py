@@ -0,0 +1,84 @@
+import hmac
+import tracemalloc
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import limiter, memory
+from .metrics import exposition
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint.
+
+    When ``METRICS_TOKEN`` is set, scrapers must send it as a bearer token.
+    Without a token the endpoint does not exist unless ``METRICS_PUBLIC``.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        supplied = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponseForbidden()
+    elif not settings.METRICS_PUBLIC:
+        raise Http404
+    body, content_type = exposition()
+    return HttpResponse(body, content_type=content_type)
+
+
+class MemoryDiagnosticsView(APIView):
+    """
+    Memory report of the worker that serves the request (staff only).
+
+    Query params:
+    - limit: allocation sites listed (default 20, at most 100)
+    - against: ``previous`` sample (default) or ``baseline``, the first one
+    - sample: ``1`` to take a sample now instead of using the latest
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        against = request.query_params.get('against', 'previous')
+        if against not in ('previous', 'baseline'):
+            return Response(
+                {'error': "against must be 'previous' or 'baseline'"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if request.query_params.get('sample') == '1' and tracemalloc.is_tracing():
+            memory.tracker.refresh()
+        return Response(memory.tracker.report(limit, against))
+
+
+class ConcurrencyDiagnosticsView(APIView):
+    """
+    Adaptive concurrency limit of the worker that serves the request (staff
+    only): limit, requests in flight, latency averages, gradient and the
+    requests admitted and shed per route priority.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(dict(limiter.limiter.state(), enabled=settings.LOAD_SHEDDING_ENABLED))
+
+
+def health_view(request):
+    """Liveness check; touches neither the database nor the schema."""
+    return JsonResponse({'status': 'ok'})
+
+
+def ready_view(request):
+    """Readiness check: the worker is up and reaches the database."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        return JsonResponse({'status': 'unavailable'}, status=503)
+    return JsonResponse({'status': 'ok'})
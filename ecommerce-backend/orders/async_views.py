@@ -0,0 +1,35 @@
+"""
+Async order detail for the ASGI application; see ``products/async_views.py``.
+"""
+import asyncio
+
+from django.http import Http404
+from rest_framework.exceptions import NotAuthenticated
+
+from products.async_views import (
+    async_api_view, attach_prefetched, authenticate, listing, prefetch, product_relations, render, viewset,
+)
+from .models import Order, OrderItem
+from .serializers import OrderDetailSerializer
+from .views import OrderViewSet
+
+
+@async_api_view
+async def order_detail(request, pk):
+    """Async ``GET /api/orders/{id}/``: the order and its items load together."""
+    request = await authenticate(request)
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    view = viewset(OrderViewSet, request, 'retrieve', pk=pk)
+    # The user's orders only (all for staff), as in OrderViewSet.
+    orders = view.get_queryset().prefetch_related(None).filter(pk=pk)
+    try:
+        order, items = await asyncio.gather(
+            orders.aget(),
+            listing(OrderItem.objects.filter(order__in=orders.values('pk')).select_related('product__category')),
+        )
+    except Order.DoesNotExist:
+        raise Http404
+    attach_prefetched(order, 'items', items)
+    await prefetch([item.product for item in items], **product_relations())
+    return render(OrderDetailSerializer(order, context=view.get_serializer_context()).data)
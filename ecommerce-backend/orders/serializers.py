@@ -22,10 +22,8 @@ class OrderItemSerializer(serializers.ModelSerializer):
 class OrderListSerializer(serializers.ModelSerializer):
     """Serializer for listing orders."""
     
-    items_count = serializers.IntegerField(
-        source='items.count',
-        read_only=True
-    )
+    # Annotated by OrderViewSet.get_queryset for the list action.
+    items_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Order
@@ -80,7 +78,8 @@ class OrderCreateSerializer(serializers.ModelSerializer):
                 product = Product.objects.get(id=item['product_id'], is_active=True)
                 if product.stock_quantity < item['quantity']:
                     raise serializers.ValidationError(
-                        f"Insufficient stock for {product.name}. Available: {product.stock_quantity}"
+                        f"Insufficient stock for {product.name}. Available: {product.stock_quantity}",
+                        code='insufficient_stock'
                     )
             except Product.DoesNotExist:
                 raise serializers.ValidationError(
@@ -1,3 +1,181 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.authentication import CachedJWTAuthentication
+from accounts.models import User
+from config.routers import ReplicaRoutingMiddleware, pin_key
+from monitoring import limiter
+from products.models import Category, Product
+from .models import CartItem, Order
 
-# Create your tests here.
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+
+    def read_alias(self, method='GET', user=None, write=False, model=Product):
+        """Return where ``model`` is read from while serving a request."""
+        request = RequestFactory().generic(method, '/api/products/')
+        request.user = user or AnonymousUser()
+        aliases = []
+
+        def view(request):
+            if write:
+                router.db_for_write(CartItem)
+            aliases.append(router.db_for_read(model))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(request)
+        return aliases[0]
+
+    def test_safe_method_catalog_and_order_reads_use_replicas(self):
+        self.assertEqual(self.read_alias('GET'), 'replica1')
+        self.assertEqual(self.read_alias('HEAD', model=Order), 'replica1')
+        self.assertEqual(self.read_alias('POST'), 'default')
+        self.assertEqual(self.read_alias('GET', model=User), 'default')
+        # Outside requests: commands and background refreshes.
+        self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_writer_is_pinned_to_primary(self):
+        other = User.objects.create_user(email='other@example.com', password='pass12345')
+        self.assertEqual(self.read_alias('GET', self.user, write=True), 'default')
+        self.assertEqual(self.read_alias('GET', self.user), 'default')
+        self.assertEqual(self.read_alias('GET', other), 'replica1')
+        # The pin expires after DATABASE_PIN_SECONDS.
+        cache.clear()
+        self.assertEqual(self.read_alias('GET', self.user), 'replica1')
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_cart_reads_do_not_pin(self):
+        token = RefreshToken.for_user(self.user).access_token
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        # Creating the cart is a write.
+        self.assertEqual(self.client.get('/api/cart/', **headers).status_code, 200)
+        self.assertIsNotNone(cache.get(pin_key(self.user.pk)))
+        cache.clear()
+        self.assertEqual(self.client.get('/api/cart/', **headers).status_code, 200)
+        self.assertIsNone(cache.get(pin_key(self.user.pk)))
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate('replica1', 'products'))
+        self.assertTrue(router.allow_migrate('default', 'products'))
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'set DB_REPLICA_HOSTS or DATABASE_REPLICA_URLS')
+class ReplicaRoutingTests(APITransactionTestCase):
+    # Committed data only: the replicas mirror the test database through
+    # connections of their own.
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(
+            name='Laptop', description='Laptop', price=Decimal('999.00'),
+            category=category, sku='LAP-1', stock_quantity=3,
+        )
+        self.client.force_authenticate(self.user)
+
+    def queries(self, method, path, **kwargs):
+        """Return the number of queries per database made by a request."""
+        contexts = {alias: CaptureQueriesContext(connections[alias]) for alias in self.databases}
+        for context in contexts.values():
+            context.__enter__()
+        try:
+            response = getattr(self.client, method)(path, **kwargs)
+        finally:
+            for context in contexts.values():
+                context.__exit__(None, None, None)
+        self.assertLess(response.status_code, 400)
+        replicas = sum(len(contexts[alias]) for alias in settings.DATABASE_REPLICAS)
+        return len(contexts['default']), replicas
+
+    def test_reads_follow_writes_to_primary(self):
+        self.assertEqual(self.queries('get', '/api/products/')[0], 0)
+        self.queries('post', '/api/cart/add/', data={'product_id': self.product.id, 'quantity': 1})
+        primary, replicas = self.queries('get', '/api/cart/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replicas, 0)
+
+
+class BatchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(
+            name='Laptop', description='Laptop', price=Decimal('999.00'),
+            category=category, sku='LAP-1', stock_quantity=3,
+        )
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def batch(self, *paths):
+        return self.client.post('/api/batch/', {'requests': [{'path': path} for path in paths]}, format='json')
+
+    def test_sub_requests_answered_in_order_with_their_status(self):
+        get_user = CachedJWTAuthentication.get_user
+        with mock.patch.object(CachedJWTAuthentication, 'get_user', autospec=True, side_effect=get_user) as user_lookup:
+            response = self.batch(
+                '/api/auth/profile/', '/api/cart/', f'/api/products/{self.product.slug}/',
+                '/api/products/?search=laptop', '/api/products/missing/', '/api/nowhere/',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(user_lookup.call_count, 1)
+        responses = response.json()['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 200, 200, 200, 404, 404])
+        self.assertEqual(responses[0]['body']['email'], 'buyer@example.com')
+        self.assertEqual(responses[1]['body']['items'], [])
+        self.assertEqual(responses[2]['body']['sku'], 'LAP-1')
+        self.assertEqual(responses[3]['body']['count'], 1)
+        self.assertEqual(responses[4]['path'], '/api/products/missing/')
+
+    def test_anonymous_sub_requests_keep_their_permissions(self):
+        self.client.credentials()
+        responses = self.batch('/api/cart/', '/api/products/').json()['responses']
+        self.assertEqual([item['status'] for item in responses], [401, 200])
+
+    def test_invalid_batches_are_rejected(self):
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.batch('/admin/').status_code, 400)
+        with self.settings(BATCH_MAX_REQUESTS=2):
+            self.assertEqual(self.batch('/api/products/', '/api/cart/', '/api/categories/').status_code, 400)
+        response = self.client.post(
+            '/api/batch/', {'requests': [{'method': 'POST', 'path': '/api/cart/clear/'}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.batch('/api/batch/').json()['responses'][0]['status'], 400)
+
+    @override_settings(LOAD_SHEDDING_ENABLED=True)
+    def test_sub_requests_go_through_the_limiter(self):
+        overloaded = limiter.AdaptiveLimiter()
+        overloaded.samples = limiter.WARMUP_SAMPLES
+        overloaded.short_latency, overloaded.long_latency = 1.0, 0.1
+        overloaded.sampled_at = limiter.time.monotonic()
+        with mock.patch.object(limiter, 'limiter', overloaded):
+            response = self.batch('/api/products/search/', '/api/products/search/', '/api/cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['status'] for item in response.json()['responses']], [503, 503, 200])
+        self.assertEqual(overloaded.shed[limiter.LOW], 2)
+        self.assertEqual(overloaded.in_flight, 0)
+
+
+class ConcurrentBatchTests(APITransactionTestCase):
+    def test_sub_requests_run_on_the_pool(self):
+        user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        self.client.force_authenticate(user)
+        paths = ['/api/auth/profile/', '/api/products/', '/api/categories/', '/api/orders/']
+        with mock.patch('config.batch.close_old_connections') as close:
+            response = self.client.post('/api/batch/', {'requests': [{'path': path} for path in paths]}, format='json')
+        self.assertEqual([item['status'] for item in response.json()['responses']], [200] * 4)
+        self.assertEqual(close.call_count, 8)
@@ -2,10 +2,19 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
-from .models import Order, Cart, CartItem
+from django.db.models import Count, Prefetch, prefetch_related_objects
+from .models import Order, OrderItem, Cart, CartItem
 from products.models import Product
+from config.throttling import CheckoutThrottle
+from monitoring.metrics import (
+    CHECKOUT_OVERSELL,
+    CHECKOUT_SUCCESS,
+    CHECKOUT_VALIDATION_FAILURE,
+    record_checkout,
+)
 from .serializers import (
     OrderListSerializer,
     OrderDetailSerializer,
@@ -16,6 +25,29 @@ from .serializers import (
 )
 
 
+def item_product_prefetches(items, item_model):
+    """
+    Prefetches for order/cart items serialized with ``ProductListSerializer``.
+    
+    Loads each item's product with its category, images and reviews in
+    three queries, whatever the number of items.
+    """
+    return [
+        Prefetch(items, queryset=item_model.objects.select_related('product__category')),
+        f'{items}__product__images',
+        f'{items}__product__reviews',
+    ]
+
+
+def _error_codes(codes):
+    """Flatten the nested codes of a ``ValidationError``."""
+    if isinstance(codes, dict):
+        codes = codes.values()
+    elif not isinstance(codes, list):
+        return [codes]
+    return [code for nested in codes for code in _error_codes(nested)]
+
+
 class OrderViewSet(viewsets.ModelViewSet):
     """
     API endpoint for orders.
@@ -32,8 +64,16 @@ class OrderViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Return orders for the current user."""
+        if getattr(self, 'swagger_fake_view', False):
+            # Schema generation inspects the view without a user
+            return Order.objects.none()
         user = self.request.user
-        queryset = Order.objects.prefetch_related('items__product')
+        if self.action == 'list':
+            queryset = Order.objects.annotate(items_count=Count('items'))
+        else:
+            queryset = Order.objects.select_related('user').prefetch_related(
+                *item_product_prefetches('items', OrderItem)
+            )
         
         # Staff can see all orders, regular users only their own
         if not user.is_staff:
@@ -41,6 +81,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def get_throttles(self):
+        """Checkout is throttled per user; reads are not."""
+        if self.action == 'create':
+            return [CheckoutThrottle()]
+        return super().get_throttles()
+    
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
         if self.action == 'list':
@@ -49,6 +95,19 @@ class OrderViewSet(viewsets.ModelViewSet):
             return OrderCreateSerializer
         return OrderDetailSerializer
     
+    def create(self, request, *args, **kwargs):
+        """Create an order, counting the checkout outcome."""
+        try:
+            response = super().create(request, *args, **kwargs)
+        except ValidationError as exc:
+            if 'insufficient_stock' in _error_codes(exc.get_codes()):
+                record_checkout(CHECKOUT_OVERSELL)
+            else:
+                record_checkout(CHECKOUT_VALIDATION_FAILURE)
+            raise
+        record_checkout(CHECKOUT_SUCCESS)
+        return response
+    
     def perform_create(self, serializer):
         """Set the user when creating an order."""
         serializer.save(user=self.request.user)
@@ -90,14 +149,22 @@ class CartViewSet(viewsets.ViewSet):
     
     def get_or_create_cart(self, user):
         """Get or create cart for user."""
-        cart, created = Cart.objects.get_or_create(user=user)
+        # get_or_create is routed as a write, which would pin the user to
+        # the primary (config/routers.py) on every cart read; look first.
+        cart = Cart.objects.filter(user=user).first()
+        if cart is None:
+            cart, created = Cart.objects.get_or_create(user=user)
         return cart
     
+    def cart_data(self, cart):
+        """Serialize the cart with its items' products loaded in bulk."""
+        prefetch_related_objects([cart], *item_product_prefetches('items', CartItem))
+        return CartSerializer(cart).data
+    
     def list(self, request):
         """Get user's cart."""
         cart = self.get_or_create_cart(request.user)
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        return Response(self.cart_data(cart))
     
     @action(detail=False, methods=['post'])
     def add(self, request):
@@ -135,7 +202,7 @@ class CartViewSet(viewsets.ViewSet):
         
         return Response({
             'message': 'Item added to cart',
-            'cart': CartSerializer(cart).data
+            'cart': self.cart_data(cart)
         }, status=status.HTTP_201_CREATED)
     
     @action(detail=False, methods=['patch'], url_path='update/(?P<item_id>[^/.]+)')
@@ -166,7 +233,7 @@ class CartViewSet(viewsets.ViewSet):
         
         return Response({
             'message': 'Cart item updated',
-            'cart': CartSerializer(cart).data
+            'cart': self.cart_data(cart)
         })
     
     @action(detail=False, methods=['delete'], url_path='remove/(?P<item_id>[^/.]+)')
@@ -183,7 +250,7 @@ class CartViewSet(viewsets.ViewSet):
         
         return Response({
             'message': 'Item removed from cart',
-            'cart': CartSerializer(cart).data
+            'cart': self.cart_data(cart)
         })
     
     @action(detail=False, methods=['delete'])
@@ -194,5 +261,5 @@ class CartViewSet(viewsets.ViewSet):
         
         return Response({
             'message': 'Cart cleared',
-            'cart': CartSerializer(cart).data
+            'cart': self.cart_data(cart)
         })
\ No newline at end of file
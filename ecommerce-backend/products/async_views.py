@@ -0,0 +1,242 @@
+"""
+Async versions of the hot catalog reads.
+
+The ASGI application (``config/asgi.py``) routes product list, product
+detail and category list requests here (see ``config/asgi_urls.py``); WSGI
+keeps serving the DRF views. The views reuse the DRF viewsets for
+authentication, visibility, filtering, ordering and pagination, and the DRF
+serializers for the response, so both return the same documents.
+
+Independent queries of a request (a product, its images, its reviews and
+the category hierarchy) are issued together with ``asyncio.gather`` and
+attached to the instances as prefetched relations before serializing.
+Django runs the async ORM's queries in the request's own thread, so they
+reach the database one after another; the worker's event loop serves other
+requests meanwhile.
+"""
+import asyncio
+from functools import wraps
+from math import ceil
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import exception_handler
+
+from .models import Category, Product, ProductImage, Review
+from .serializers import CategorySerializer, CategoryTree, ProductDetailSerializer, ProductListSerializer
+from . import views
+from monitoring.metrics import record_cache
+
+
+def render(data, status=200, headers=None):
+    """Render ``data`` the way the DRF views do."""
+    return HttpResponse(
+        JSONRenderer().render(data), status=status, headers=headers, content_type='application/json'
+    )
+
+
+def async_api_view(view):
+    """Answer DRF exceptions and ``Http404`` raised by ``view`` like ``APIView`` does."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except (APIException, Http404) as exc:
+            if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+                authenticator = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+                exc.auth_header = authenticator.authenticate_header(request)
+            response = exception_handler(exc, {'request': request})
+            headers = {
+                header: response[header] for header in ('WWW-Authenticate', 'Retry-After')
+                if response.has_header(header)
+            }
+            return render(response.data, response.status_code, headers)
+
+    return wrapper
+
+
+async def authenticate(request):
+    """Wrap ``request`` for DRF and run its authenticators (they query the database)."""
+    request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    # DRF also sets the user on the Django request, where the replica router
+    # looks for it.
+    await sync_to_async(lambda: request.user)()
+    return request
+
+
+def viewset(view_class, request, action, **kwargs):
+    """Instantiate a DRF viewset for ``action`` without dispatching to it."""
+    return view_class(request=request, action=action, format_kwarg=None, args=(), kwargs=kwargs)
+
+
+async def listing(queryset):
+    return [obj async for obj in queryset]
+
+
+def attach_prefetched(instance, name, objects):
+    """Store ``objects`` as the prefetched ``name`` relation, as ``prefetch_related`` does."""
+    queryset = getattr(instance, name).get_queryset()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    if not hasattr(instance, '_prefetched_objects_cache'):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[name] = queryset
+
+
+async def prefetch(instances, **querysets):
+    """
+    Load reverse foreign key relations of ``instances`` concurrently, e.g.
+    ``await prefetch(products, images=ProductImage.objects.all())``.
+    """
+    if not instances:
+        return
+    meta = type(instances[0])._meta
+    fields = {name: meta.get_field(name).field for name in querysets}
+    ids = {instance.pk for instance in instances}
+    results = await asyncio.gather(*(
+        listing(queryset.filter(**{f'{fields[name].name}__in': ids}))
+        for name, queryset in querysets.items()
+    ))
+    for name, objects in zip(querysets, results):
+        grouped = {}
+        for obj in objects:
+            grouped.setdefault(getattr(obj, fields[name].attname), []).append(obj)
+        for instance in instances:
+            attach_prefetched(instance, name, grouped.get(instance.pk, []))
+
+
+async def paginate(view, queryset):
+    """
+    Async ``PageNumberPagination``: counts and loads the page together.
+
+    Returns the objects of the page and a function wrapping serialized
+    results in the paginated document.
+    """
+    paginator = view.paginator
+    request = view.request
+    page_size = paginator.get_page_size(request) if paginator is not None else None
+    if page_size is None:
+        return await listing(queryset), lambda results: results
+
+    number = request.query_params.get(paginator.page_query_param) or 1
+    if number in paginator.last_page_strings:
+        count = await queryset.acount()
+        number = max(ceil(count / page_size), 1)
+        objects = await listing(queryset[(number - 1) * page_size:number * page_size])
+    else:
+        try:
+            number = int(number)
+            if number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(paginator.invalid_page_message)
+        offset = (number - 1) * page_size
+        count, objects = await asyncio.gather(queryset.acount(), listing(queryset[offset:offset + page_size]))
+    pages = max(ceil(count / page_size), 1)
+    if number > pages:
+        raise NotFound(paginator.invalid_page_message)
+
+    url = request.build_absolute_uri()
+    param = paginator.page_query_param
+    if number == 1:
+        previous = None
+    elif number == 2:
+        previous = remove_query_param(url, param)
+    else:
+        previous = replace_query_param(url, param, number - 1)
+
+    def wrap(results):
+        return {
+            'count': count,
+            'next': replace_query_param(url, param, number + 1) if number < pages else None,
+            'previous': previous,
+            'results': results,
+        }
+    return objects, wrap
+
+
+def product_relations():
+    """Relations serialized for listed products."""
+    return {'images': ProductImage.objects.all(), 'reviews': Review.objects.all()}
+
+
+@async_api_view
+async def product_list(request):
+    """Async ``GET /api/products/``, including the catalog snapshot path."""
+    request = await authenticate(request)
+    view = viewset(views.ProductViewSet, request, 'list')
+    queryset = view.filter_queryset(view.get_queryset()).prefetch_related(None)
+
+    ids = None
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        ids = await sync_to_async(views.catalog_snapshot.filter_ids)(request, view)
+        record_cache('catalog_snapshot', ids is not None)
+    if ids is None:
+        products, wrap = await paginate(view, queryset)
+    else:
+        # The snapshot resolved the filters to ids; only the page is loaded.
+        page_ids = view.paginate_queryset(ids)
+        page_ids = [int(pk) for pk in (ids if page_ids is None else page_ids)]
+        loaded = {
+            product.pk: product
+            async for product in view.get_queryset().prefetch_related(None).filter(pk__in=page_ids)
+        }
+        products = [loaded[pk] for pk in page_ids if pk in loaded]
+
+        def wrap(results):
+            if view.paginator is not None and view.paginator.page is not None:
+                return view.get_paginated_response(results).data
+            return results
+
+    await prefetch(products, **product_relations())
+    data = ProductListSerializer(products, many=True, context=view.get_serializer_context()).data
+    return render(wrap(data))
+
+
+@async_api_view
+async def product_detail(request, slug):
+    """Async ``GET /api/products/{slug}/``."""
+    request = await authenticate(request)
+    view = viewset(views.ProductViewSet, request, 'retrieve', slug=slug)
+    products = view.get_queryset().prefetch_related(None).filter(slug=slug)
+    try:
+        product, images, reviews, categories = await asyncio.gather(
+            products.aget(),
+            listing(ProductImage.objects.filter(product__slug=slug)),
+            listing(Review.objects.filter(product__slug=slug).select_related('user')),
+            listing(Category.objects.order_by('name')),
+        )
+    except Product.DoesNotExist:
+        raise Http404
+    attach_prefetched(product, 'images', images)
+    attach_prefetched(product, 'reviews', reviews)
+
+    tree = CategoryTree()
+    tree.set_categories(categories)
+    await tree.aload_product_counts([product.category])
+    context = dict(view.get_serializer_context(), category_tree=tree)
+    return render(ProductDetailSerializer(product, context=context).data)
+
+
+@async_api_view
+async def category_list(request):
+    """Async ``GET /api/categories/``: nested subtrees with product counts."""
+    request = await authenticate(request)
+    view = viewset(views.CategoryViewSet, request, 'list')
+    queryset = view.filter_queryset(view.get_queryset())
+    (categories, wrap), hierarchy = await asyncio.gather(
+        paginate(view, queryset),
+        listing(Category.objects.order_by('name')),
+    )
+    tree = CategoryTree()
+    tree.set_categories(hierarchy)
+    await tree.aload_product_counts(categories)
+    context = dict(view.get_serializer_context(), category_tree=tree)
+    return render(wrap(CategorySerializer(categories, many=True, context=context).data))
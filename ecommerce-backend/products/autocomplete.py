@@ -0,0 +1,206 @@
+"""
+In-memory prefix index for search-box autocomplete.
+
+Each worker holds a sorted list of lower-cased keys (every word start of a
+product or category name, plus SKUs) with parallel NumPy arrays pointing at
+suggestions and their popularity weights. A query is two bisections and a
+partial sort of the matching slice; the database is never touched on the
+request path. Changes are picked up from ``updated_at`` deltas, and new
+popularity from the products of orders placed since, by a background
+refresh once the index is older than ``AUTOCOMPLETE_REFRESH_SECONDS``.
+"""
+from bisect import bisect_left
+import logging
+import sys
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from orders.models import OrderItem
+from .models import Category, Product
+from .refresh import BackgroundRefresh
+
+logger = logging.getLogger(__name__)
+
+KIND_PRODUCT = 0
+KIND_SKU = 1
+KIND_CATEGORY = 2
+KIND_NAMES = {KIND_PRODUCT: 'product', KIND_SKU: 'sku', KIND_CATEGORY: 'category'}
+
+MAX_LIMIT = 50
+HEAVY_PREFIX_KEYS = 1000
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def word_starts(text):
+    """Return ``text`` from the start of each of its words."""
+    words = normalize(text).split(' ')
+    return [' '.join(words[idx:]) for idx in range(len(words)) if words[idx]]
+
+
+class PrefixSnapshot:
+    """Immutable sorted-array index; replaced wholesale on refresh."""
+
+    def __init__(self, suggestions):
+        """``suggestions`` is a list of ``(kind, label, slug, weight, keys)``."""
+        entries = sorted(
+            (key, idx)
+            for idx, (_, _, _, _, keys) in enumerate(suggestions)
+            for key in keys
+        )
+        self.keys = [key for key, _ in entries]
+        self.targets = np.fromiter((idx for _, idx in entries), dtype=np.int32, count=len(entries))
+        self.kinds = np.fromiter((s[0] for s in suggestions), dtype=np.int8, count=len(suggestions))
+        self.weights = np.fromiter((s[3] for s in suggestions), dtype=np.float32, count=len(suggestions))
+        self.labels = [s[1] for s in suggestions]
+        self.slugs = [s[2] for s in suggestions]
+        self.heavy = self._precompute_heavy_prefixes()
+
+    def search(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        ranked = self.heavy.get(prefix)
+        if ranked is None:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + '\uffff', lo)
+            ranked = self._top(lo, hi, limit)
+        return [
+            {
+                'type': KIND_NAMES[self.kinds[idx]],
+                'text': self.labels[idx],
+                'slug': self.slugs[idx],
+            }
+            for idx in ranked[:limit]
+        ]
+
+    def _top(self, lo, hi, limit):
+        """Return the ``limit`` heaviest distinct suggestions for keys[lo:hi]."""
+        candidates = self.targets[lo:hi]
+        # A suggestion can match through several of its word starts, so take
+        # some slack before de-duplicating.
+        wanted = limit * 3
+        if len(candidates) > wanted:
+            weights = self.weights[candidates]
+            candidates = candidates[np.argpartition(-weights, wanted)[:wanted]]
+
+        return sorted(
+            set(candidates.tolist()),
+            key=lambda idx: (-self.weights[idx], self.labels[idx])
+        )[:limit]
+
+    def _precompute_heavy_prefixes(self):
+        """
+        Cache results for prefixes matching more than ``HEAVY_PREFIX_KEYS``.
+
+        Short prefixes ("a", "wi") match a large share of the keys; ranking
+        them per request would dominate tail latency, so they are ranked once
+        per build by walking the sorted keys one character deeper at a time.
+        """
+        heavy = {}
+        stack = [('', 0, len(self.keys))]
+        while stack:
+            parent, lo, hi = stack.pop()
+            depth = len(parent) + 1
+            while lo < hi:
+                if len(self.keys[lo]) < depth:
+                    lo += 1
+                    continue
+                prefix = self.keys[lo][:depth]
+                end = bisect_left(self.keys, prefix + '\uffff', lo, hi)
+                if end - lo > HEAVY_PREFIX_KEYS:
+                    heavy[prefix] = self._top(lo, end, MAX_LIMIT)
+                    stack.append((prefix, lo, end))
+                lo = end
+        return heavy
+
+    def memory_bytes(self):
+        """Approximate memory held by the index structures."""
+        strings = sum(sys.getsizeof(key) for key in self.keys)
+        strings += sum(sys.getsizeof(label) for label in self.labels)
+        strings += sum(sys.getsizeof(slug) for slug in self.slugs)
+        lists = sum(sys.getsizeof(items) for items in (self.keys, self.labels, self.slugs))
+        arrays = self.targets.nbytes + self.kinds.nbytes + self.weights.nbytes
+        heavy = sys.getsizeof(self.heavy) + sum(
+            sys.getsizeof(prefix) + sys.getsizeof(ranked)
+            for prefix, ranked in self.heavy.items()
+        )
+        return strings + lists + arrays + heavy
+
+
+class AutocompleteIndex(BackgroundRefresh):
+    """Per-worker autocomplete index over active products and categories."""
+
+    refresh_setting = 'AUTOCOMPLETE_REFRESH_SECONDS'
+
+    def __init__(self):
+        super().__init__()
+        self._snapshot = None
+        self._products = {}
+        self._watermark = None
+
+    def search(self, prefix, limit=None):
+        self.ensure_fresh()
+        return self._snapshot.search(prefix, limit or settings.AUTOCOMPLETE_MAX_RESULTS)
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'products': len(self._products),
+            'keys': len(snapshot.keys) if snapshot else 0,
+            'memory_bytes': snapshot.memory_bytes() if snapshot else 0,
+            'watermark': self._watermark,
+        }
+
+    def refresh(self):
+        """Fetch products changed since the last refresh and rebuild the index."""
+        started = timezone.now()
+        products = Product.objects.annotate(popularity=Count('order_items'))
+        if self._watermark is not None:
+            ordered = OrderItem.objects.filter(order__created_at__gt=self._watermark).values('product_id')
+            products = products.filter(Q(updated_at__gt=self._watermark) | Q(pk__in=ordered))
+
+        changed = 0
+        for pk, is_active, name, slug, sku, category_id, popularity in products.values_list(
+            'id', 'is_active', 'name', 'slug', 'sku', 'category_id', 'popularity'
+        ).iterator(chunk_size=2000):
+            changed += 1
+            if is_active:
+                self._products[pk] = (name, slug, sku, category_id, popularity + 1)
+            else:
+                self._products.pop(pk, None)
+
+        categories_changed = self._watermark is not None and Category.objects.filter(
+            updated_at__gt=self._watermark
+        ).exists()
+        if changed or categories_changed or self._snapshot is None:
+            self._snapshot = PrefixSnapshot(self._suggestions())
+            logger.info(
+                'Autocomplete index rebuilt: %d changed products, %d keys, %d bytes',
+                changed, len(self._snapshot.keys), self._snapshot.memory_bytes()
+            )
+        self._watermark = started
+        self.mark_refreshed()
+
+    def _suggestions(self):
+        category_weights = {}
+        suggestions = []
+        for name, slug, sku, category_id, weight in self._products.values():
+            suggestions.append((KIND_PRODUCT, name, slug, weight, word_starts(name)))
+            suggestions.append((KIND_SKU, sku, slug, weight, [normalize(sku)]))
+            category_weights[category_id] = category_weights.get(category_id, 0) + weight
+
+        for pk, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+            if pk in category_weights:
+                suggestions.append(
+                    (KIND_CATEGORY, name, slug, category_weights[pk], word_starts(name))
+                )
+        return suggestions
+
+
+index = AutocompleteIndex()
@@ -0,0 +1,233 @@
+"""
+Read-only in-process catalog snapshot for product list filtering and sorting.
+
+Active products are held per worker in columnar NumPy arrays (price in
+cents, stock, category id, created_at, name rank). A list
+request with only ``ProductFilter`` parameters and ``ordering`` is answered
+by vectorized masking and a lexsort; only the ids of the requested page are
+then fetched from the database.
+
+The arrays are plain numeric buffers, so when the snapshot is loaded in the
+gunicorn master (``--preload`` and ``PRELOAD_INDEXES``, see
+``config/preload.py``) forked workers share them copy-on-write until their
+first refresh. Refreshes apply ``updated_at`` deltas of products and drop
+the ones with a ``ProductDeletion`` tombstone. As in delta sync
+(``products/sync.py``), the watermark trails the refresh by
+``PRODUCT_SYNC_SETTLE_SECONDS`` so rows committed late are not missed.
+
+Enabled with ``CATALOG_SNAPSHOT_ENABLED``.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import logging
+import math
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.filters import OrderingFilter
+
+from .filters import ProductFilter
+from .models import Category, Product, ProductDeletion
+from .refresh import BackgroundRefresh
+
+logger = logging.getLogger(__name__)
+
+# Query parameters the snapshot can answer; anything else (``search``,
+# unknown filters) takes the ORM path.
+SUPPORTED_PARAMS = frozenset([
+    'page', 'ordering', 'name', 'min_price', 'max_price', 'category',
+    'category_slug', 'in_stock', 'is_active', 'price', 'price__gte', 'price__lte',
+])
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _to_cents(price):
+    return int(Decimal(price) * 100)
+
+
+def _to_micros(value):
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+class Columns:
+    """One immutable generation of the snapshot arrays, sorted by id."""
+
+    def __init__(self, ids, price, stock, category, created, names):
+        self.ids = ids
+        self.price = price
+        self.stock = stock
+        self.category = category
+        self.created = created
+        self.names = names
+        # Rank of each name so name ordering works in both directions.
+        self.name_rank = np.empty(len(names), dtype=np.int32)
+        self.name_rank[np.argsort(names, kind='stable')] = np.arange(len(names), dtype=np.int32)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from ``(id, price, stock, category_id, created_at, name)`` rows."""
+        rows = sorted(rows)
+        return cls(
+            ids=np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)),
+            price=np.fromiter((_to_cents(r[1]) for r in rows), dtype=np.int64, count=len(rows)),
+            stock=np.fromiter((r[2] for r in rows), dtype=np.int32, count=len(rows)),
+            category=np.fromiter((r[3] for r in rows), dtype=np.int64, count=len(rows)),
+            created=np.fromiter((_to_micros(r[4]) for r in rows), dtype=np.int64, count=len(rows)),
+            names=np.array([r[5] for r in rows], dtype=str),
+        )
+
+    def merge(self, changed_ids, rows):
+        """Return a new generation with ``changed_ids`` replaced by ``rows``."""
+        keep = ~np.isin(self.ids, np.asarray(changed_ids, dtype=np.int64))
+        fresh = Columns.from_rows(rows)
+        merged = {
+            name: np.concatenate([getattr(self, name)[keep], getattr(fresh, name)])
+            for name in ('ids', 'price', 'stock', 'category', 'created', 'names')
+        }
+        order = np.argsort(merged['ids'], kind='stable')
+        return Columns(**{name: column[order] for name, column in merged.items()})
+
+    def nbytes(self):
+        return sum(
+            column.nbytes for column in (
+                self.ids, self.price, self.stock, self.category, self.created,
+                self.names, self.name_rank,
+            )
+        )
+
+
+class CatalogSnapshot(BackgroundRefresh):
+    """Per-worker columnar snapshot of the active catalog."""
+
+    refresh_setting = 'CATALOG_SNAPSHOT_REFRESH_SECONDS'
+
+    ORDER_KEYS = {
+        'price': lambda columns: columns.price,
+        'created_at': lambda columns: columns.created,
+        'name': lambda columns: columns.name_rank,
+        'stock_quantity': lambda columns: columns.stock,
+    }
+
+    def __init__(self):
+        super().__init__()
+        self._columns = None
+        self._category_slugs = {}
+        self._watermark = None
+
+    def _rows(self, queryset):
+        return queryset.values_list(
+            'id', 'price', 'stock_quantity', 'category_id', 'created_at', 'name'
+        ).iterator(chunk_size=2000)
+
+    def refresh(self):
+        """Load the snapshot, or apply changes since the last refresh."""
+        started = timezone.now() - timedelta(seconds=settings.PRODUCT_SYNC_SETTLE_SECONDS)
+        products = Product.objects.filter(is_active=True)
+
+        if self._columns is None:
+            columns = Columns.from_rows(list(self._rows(products)))
+            changed = len(columns.ids)
+        else:
+            changed_ids = set(
+                Product.objects.filter(updated_at__gt=self._watermark).values_list('id', flat=True)
+            )
+            # Deleted products have no rows left, so merging drops them.
+            changed_ids.update(
+                ProductDeletion.objects.filter(deleted_at__gt=self._watermark).values_list('product_id', flat=True)
+            )
+            columns = self._columns
+            if changed_ids:
+                rows = list(self._rows(products.filter(id__in=changed_ids)))
+                columns = columns.merge(sorted(changed_ids), rows)
+            changed = len(changed_ids)
+
+        self._category_slugs = dict(Category.objects.values_list('slug', 'id'))
+        self._columns = columns
+        self._watermark = started
+        self.mark_refreshed()
+        if changed:
+            logger.info(
+                'Catalog snapshot refreshed: %d changed, %d products, %d bytes',
+                changed, len(columns.ids), columns.nbytes()
+            )
+
+    def filter_ids(self, request, view):
+        """
+        Return the ordered ids matching a product list request.
+
+        Returns ``None`` when the request has to take the ORM path: staff
+        users (who also see inactive products), unsupported parameters or
+        parameters that fail validation (so the ORM path reports the error).
+        """
+        params = request.query_params
+        if request.user.is_staff or not SUPPORTED_PARAMS.issuperset(params.keys()):
+            return None
+
+        filterset = ProductFilter(params, queryset=Product.objects.none(), request=request)
+        if not filterset.is_valid():
+            return None
+        ordering = OrderingFilter().get_ordering(request, Product.objects.none(), view)
+        if any(field.lstrip('-') not in self.ORDER_KEYS for field in ordering):
+            return None
+
+        self.ensure_fresh()
+        columns = self._columns
+        mask = self._mask(columns, filterset.form.cleaned_data)
+
+        # lexsort sorts by the last key first; ids break remaining ties.
+        keys = [columns.ids[mask]]
+        for field in reversed(ordering):
+            key = self.ORDER_KEYS[field.lstrip('-')](columns)[mask]
+            keys.append(-key if field.startswith('-') else key)
+        order = np.lexsort(keys)
+        return columns.ids[mask][order]
+
+    def _mask(self, columns, data):
+        mask = np.ones(len(columns.ids), dtype=bool)
+
+        if data.get('is_active') is False:
+            mask[:] = False
+
+        # Prices are compared in whole cents, rounding bounds inwards.
+        for name, compare in (
+            ('min_price', 'gte'), ('price__gte', 'gte'),
+            ('max_price', 'lte'), ('price__lte', 'lte'), ('price', 'exact'),
+        ):
+            value = data.get(name)
+            if value is None:
+                continue
+            cents = Decimal(value) * 100
+            if compare == 'gte':
+                mask &= columns.price >= math.ceil(cents)
+            elif compare == 'lte':
+                mask &= columns.price <= math.floor(cents)
+            else:
+                mask &= columns.price == cents if cents == int(cents) else False
+
+        category = data.get('category')
+        if category is not None:
+            mask &= columns.category == category if category == int(category) else False
+
+        category_slug = data.get('category_slug')
+        if category_slug:
+            mask &= columns.category == self._category_slugs.get(category_slug, -1)
+
+        in_stock = data.get('in_stock')
+        if in_stock is True:
+            mask &= columns.stock > 0
+        elif in_stock is False:
+            mask &= columns.stock == 0
+
+        name = data.get('name')
+        if name:
+            candidates = np.flatnonzero(mask)
+            found = np.char.find(np.char.lower(columns.names[candidates]), name.lower()) >= 0
+            mask[candidates[~found]] = False
+
+        return mask
+
+
+snapshot = CatalogSnapshot()
@@ -0,0 +1,108 @@
+"""
+Streaming catalog export in NDJSON or CSV, optionally gzip-compressed.
+
+Products are read through a server-side cursor (``iterator(chunk_size=...)``)
+and primary images are looked up with one query per chunk, so memory use
+stays flat whatever the catalog size.
+"""
+from itertools import islice
+import csv
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Product, ProductImage
+
+DEFAULT_CHUNK_SIZE = 2000
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+FIELDS = [
+    'id', 'sku', 'name', 'slug', 'description', 'price', 'stock_quantity',
+    'category_id', 'category_name', 'category_slug', 'primary_image_url',
+    'updated_at',
+]
+
+
+def _primary_images(product_ids):
+    """Return ``{product_id: image_url}`` for a chunk, in one query."""
+    images = {}
+    rows = ProductImage.objects.filter(product_id__in=product_ids).order_by(
+        'product_id', '-is_primary', 'display_order', 'id'
+    ).values_list('product_id', 'image_url')
+    for product_id, image_url in rows:
+        images.setdefault(product_id, image_url)
+    return images
+
+
+def iter_product_chunks(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of export rows (dicts keyed by ``FIELDS``) per chunk."""
+    products = Product.objects.filter(is_active=True).order_by('id').values_list(
+        'id', 'sku', 'name', 'slug', 'description', 'price', 'stock_quantity',
+        'category_id', 'category__name', 'category__slug', 'updated_at',
+    ).iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(products, chunk_size))
+        if not chunk:
+            return
+        images = _primary_images([row[0] for row in chunk])
+        yield [
+            {
+                'id': pk,
+                'sku': sku,
+                'name': name,
+                'slug': slug,
+                'description': description,
+                'price': price,
+                'stock_quantity': stock_quantity,
+                'category_id': category_id,
+                'category_name': category_name,
+                'category_slug': category_slug,
+                'primary_image_url': images.get(pk),
+                'updated_at': updated_at,
+            }
+            for (
+                pk, sku, name, slug, description, price, stock_quantity,
+                category_id, category_name, category_slug, updated_at
+            ) in chunk
+        ]
+
+
+def _ndjson(chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows).encode()
+
+
+def _csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _gzip(parts):
+    compressor = zlib.compressobj(wbits=31)
+    for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_catalog(fmt='ndjson', compress=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return an iterator of encoded byte blocks for the whole catalog."""
+    encode = _ndjson if fmt == 'ndjson' else _csv
+    parts = encode(iter_product_chunks(chunk_size))
+    return _gzip(parts) if compress else parts
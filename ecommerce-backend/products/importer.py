@@ -0,0 +1,218 @@
+"""
+Bulk product import: streamed CSV/JSONL rows upserted by SKU.
+
+Rows are validated and written per chunk. Each chunk costs one category
+lookup, one SKU lookup, at most two slug lookups and one
+``bulk_create(update_conflicts=True)`` upsert keyed on ``sku``, instead of
+the per-row queries of ``ProductCreateUpdateSerializer``.
+"""
+from itertools import islice
+import csv
+import io
+import json
+import time
+import uuid
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+from rest_framework import serializers
+
+from .models import Category, Product
+from .storefront import scheduler
+
+DEFAULT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ('csv', 'jsonl')
+
+UPDATE_FIELDS = [
+    'name', 'description', 'price', 'category', 'stock_quantity',
+    'is_active', 'updated_at',
+]
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """Validates one import row; ``category`` is a category id or slug."""
+
+    sku = serializers.CharField(max_length=50)
+    name = serializers.CharField(max_length=200)
+    description = serializers.CharField(allow_blank=True, default='')
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    category = serializers.CharField(max_length=100)
+    stock_quantity = serializers.IntegerField(min_value=0, default=0)
+    is_active = serializers.BooleanField(default=True)
+
+
+class ImportParseError(ValueError):
+    """The upload cannot be read any further (encoding or CSV syntax)."""
+
+
+def read_rows(stream, fmt):
+    """
+    Yield row dicts from a binary or text stream of CSV or JSON lines.
+
+    Lines that are not valid JSON are yielded as row errors; an upload that
+    is not UTF-8 or not parseable CSV raises ``ImportParseError``.
+    """
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            for row in csv.DictReader(stream):
+                yield {key: value for key, value in row.items() if value != ''}
+        else:
+            for line in stream:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield {'__error__': 'Invalid JSON line.'}
+    except UnicodeDecodeError:
+        raise ImportParseError('The file is not valid UTF-8.')
+    except csv.Error as exc:
+        raise ImportParseError(f'Invalid CSV: {exc}')
+
+
+def _unique_slugs(new_products):
+    """Assign slugs not used by any product, with at most two lookups."""
+    for product in new_products:
+        product.slug = slugify(product.name)[:200] or slugify(product.sku)[:200]
+
+    taken = set(
+        Product.objects.filter(slug__in=[p.slug for p in new_products]).values_list('slug', flat=True)
+    )
+    seen = set()
+    clashing = []
+    for product in new_products:
+        if product.slug in taken or product.slug in seen:
+            # SKUs are unique, so they make natural disambiguating suffixes.
+            suffix = f'-{slugify(product.sku)}'
+            product.slug = product.slug[:200 - len(suffix)] + suffix
+            clashing.append(product)
+        seen.add(product.slug)
+
+    if clashing:
+        taken = set(
+            Product.objects.filter(slug__in=[p.slug for p in clashing]).values_list('slug', flat=True)
+        )
+        for product in clashing:
+            if product.slug in taken:
+                suffix = f'-{uuid.uuid4().hex[:8]}'
+                product.slug = product.slug[:200 - len(suffix)] + suffix
+
+
+def import_chunk(rows, first_row):
+    """
+    Validate and upsert one chunk of rows.
+
+    Returns ``(created, updated, errors)`` where errors are
+    ``{'row': n, 'errors': ...}`` dicts with 1-based row numbers.
+    """
+    errors = []
+    valid = []
+    # One serializer validates every row: building its fields per row (a
+    # deepcopy of each declared field) would dominate the import time.
+    validator = ProductImportRowSerializer()
+    for offset, row in enumerate(rows):
+        number = first_row + offset
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'errors': 'Expected an object.'})
+            continue
+        if '__error__' in row:
+            errors.append({'row': number, 'errors': row['__error__']})
+            continue
+        if 'category' not in row:
+            row = dict(row, category=row.get('category_slug') or row.get('category_id'))
+        try:
+            valid.append((number, validator.run_validation(row)))
+        except serializers.ValidationError as exc:
+            errors.append({'row': number, 'errors': exc.detail})
+
+    refs = {data['category'] for _, data in valid}
+    ids = [int(ref) for ref in refs if ref.isdigit()]
+    categories = {}
+    for pk, slug in Category.objects.filter(Q(slug__in=refs) | Q(id__in=ids)).values_list('id', 'slug'):
+        categories[slug] = pk
+        categories[str(pk)] = pk
+
+    existing = dict(
+        Product.objects.filter(sku__in=[data['sku'] for _, data in valid]).values_list('sku', 'slug')
+    )
+
+    products = []
+    seen_skus = set()
+    for number, data in valid:
+        if data['category'] not in categories:
+            errors.append({'row': number, 'errors': {'category': ['Category not found.']}})
+            continue
+        if data['sku'] in seen_skus:
+            errors.append({'row': number, 'errors': {'sku': ['Duplicate SKU in this chunk.']}})
+            continue
+        seen_skus.add(data['sku'])
+        products.append(Product(
+            sku=data['sku'],
+            name=data['name'],
+            description=data['description'],
+            price=data['price'],
+            category_id=categories[data['category']],
+            stock_quantity=data['stock_quantity'],
+            is_active=data['is_active'],
+            slug=existing.get(data['sku'], ''),
+        ))
+
+    new_products = [product for product in products if not product.slug]
+    if new_products:
+        _unique_slugs(new_products)
+
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=UPDATE_FIELDS,
+        )
+
+    errors.sort(key=lambda error: error['row'])
+    return len(new_products), len(products) - len(new_products), errors
+
+
+def import_products(stream, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import a CSV/JSONL stream chunk by chunk and return a report.
+
+    If the stream cannot be parsed to the end, the rows before the problem
+    are imported and the report's ``error`` says where it stopped.
+    """
+    started = time.perf_counter()
+    rows = read_rows(stream, fmt)
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    while True:
+        chunk = []
+        try:
+            chunk.extend(islice(rows, chunk_size))
+        except ImportParseError as exc:
+            # Rows read before the error are still imported.
+            report['error'] = f"Row {report['rows'] + len(chunk) + 1}: {exc}"
+        if not chunk:
+            break
+        created, updated, errors = import_chunk(chunk, report['rows'] + 1)
+        report['rows'] += len(chunk)
+        report['created'] += created
+        report['updated'] += updated
+        report['failed'] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(report['errors'])
+        report['errors'].extend(errors[:max(room, 0)])
+        if 'error' in report:
+            break
+
+    if report['created'] or report['updated']:
+        # bulk_create sends no signals.
+        transaction.on_commit(scheduler.schedule)
+
+    elapsed = time.perf_counter() - started
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_minute'] = round(report['rows'] / elapsed * 60) if elapsed else 0
+    return report
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from products.autocomplete import (
+    PrefixSnapshot,
+    word_starts,
+    normalize,
+    KIND_PRODUCT,
+    KIND_SKU,
+)
+import numpy as np
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark autocomplete prefix index latency and memory on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=20_000)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        words = [f'word{idx}' for idx in range(20_000)]
+        popularity = rng.pareto(1.5, size=options['products']) + 1
+
+        suggestions = []
+        names = []
+        for idx in range(options['products']):
+            name = ' '.join(words[w] for w in rng.integers(0, len(words), size=3))
+            names.append(name)
+            slug = f'product-{idx}'
+            suggestions.append(
+                (KIND_PRODUCT, name, slug, popularity[idx], word_starts(name))
+            )
+            suggestions.append(
+                (KIND_SKU, f'SKU-{idx:07d}', slug, popularity[idx], [f'sku-{idx:07d}'])
+            )
+
+        started = time.perf_counter()
+        snapshot = PrefixSnapshot(suggestions)
+        built = time.perf_counter() - started
+
+        latencies = np.empty(options['queries'])
+        for idx in range(options['queries']):
+            name = normalize(names[rng.integers(0, len(names))])
+            prefix = name[:rng.integers(1, min(len(name), 8) + 1)]
+            started = time.perf_counter()
+            snapshot.search(prefix, options['limit'])
+            latencies[idx] = time.perf_counter() - started
+
+        p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+        self.stdout.write(
+            f"{options['products']} products, {len(snapshot.keys)} keys: "
+            f'built in {built:.2f}s, {snapshot.memory_bytes() / 1024 ** 2:.1f} MB; '
+            f'latency p50 {p50:.3f} ms, p95 {p95:.3f} ms, p99 {p99:.3f} ms'
+        )
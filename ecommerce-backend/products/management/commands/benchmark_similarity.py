@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand
+from products.recommendations import TfidfIndex, product_terms, DEFAULT_TOP_K
+import numpy as np
+import resource
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the content-similarity index build on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[100_000, 1_000_000],
+            help='Catalog sizes to benchmark'
+        )
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=0,
+            help='Score only this many products (0 scores the whole catalog)'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            self.run(size, options['top_k'], options['sample'], options['seed'])
+
+    def synthetic_catalog(self, size, seed):
+        """Yield ``(id, name, description, category_id, category_name)`` rows."""
+        rng = np.random.default_rng(seed)
+        words = [f'w{idx}' for idx in range(50_000)]
+        n_categories = max(size // 500, 5)
+        # Zipf-like word popularity, as in real product text.
+        popularity = 1.0 / np.arange(1, len(words) + 1)
+        popularity /= popularity.sum()
+        name_words = rng.choice(len(words), size=(size, 4), p=popularity)
+        description_words = rng.choice(len(words), size=(size, 30), p=popularity)
+        categories = rng.integers(0, n_categories, size=size)
+        for idx in range(size):
+            yield (
+                idx + 1,
+                ' '.join(words[w] for w in name_words[idx]),
+                ' '.join(words[w] for w in description_words[idx]),
+                int(categories[idx]),
+                f'category {categories[idx]}',
+            )
+
+    def run(self, size, top_k, sample, seed):
+        rows = list(self.synthetic_catalog(size, seed))
+
+        started = time.perf_counter()
+        index = TfidfIndex(
+            (pk, product_terms(name, description, category_id, category_name))
+            for pk, name, description, category_id, category_name in rows
+        )
+        vectorized = time.perf_counter() - started
+        del rows
+
+        query_rows = np.arange(len(index))
+        if sample:
+            query_rows = query_rows[:sample]
+        started = time.perf_counter()
+        neighbours = 0
+        for start in range(0, len(query_rows), 2000):
+            source, _, _ = index.neighbours(query_rows[start:start + 2000], top_k)
+            neighbours += len(source)
+        scored = time.perf_counter() - started
+
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            f'{size:>9} products: vectorize {vectorized:.1f}s, '
+            f'top-{top_k} for {len(query_rows)} products {scored:.1f}s '
+            f'({len(query_rows) / scored:.0f}/s), '
+            f'{neighbours} neighbours, peak RSS {peak_mb:.0f} MB'
+        )
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from products.recommendations import (
+    build_copurchase,
+    build_content_similarity,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_TOP_K,
+)
+import time
+
+
+class Command(BaseCommand):
+    help = 'Build product recommendations from order history and catalog content'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            choices=['copurchase', 'content', 'all'],
+            default='all',
+            help='Which recommendations to build'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild from scratch instead of processing only new changes'
+        )
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+
+    def handle(self, *args, **options):
+        kwargs = {
+            'full': options['full'],
+            'chunk_size': options['chunk_size'],
+            'top_k': options['top_k'],
+        }
+        
+        if options['kind'] in ('copurchase', 'all'):
+            started = time.perf_counter()
+            result = build_copurchase(**kwargs)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Co-purchase: processed {result['orders']} orders, "
+                f"rescored {result['products']} products in {elapsed:.2f}s"
+            ))
+        
+        if options['kind'] in ('content', 'all'):
+            started = time.perf_counter()
+            result = build_content_similarity(**kwargs)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Content: indexed {result['products']} products, "
+                f"rescored {result['changed']} in {elapsed:.2f}s"
+            ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from products.storefront import rebuild
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed storefront home document (/api/storefront/home/)'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        _, body = rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Storefront home rebuilt: {len(body)} bytes in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from products.export import export_catalog, FORMATS, DEFAULT_CHUNK_SIZE
+import sys
+import time
+
+
+class Command(BaseCommand):
+    help = 'Stream the active product catalog to a file or stdout as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output')
+        parser.add_argument('--output', help='File path (defaults to stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        parts = export_catalog(options['format'], options['gzip'], options['chunk_size'])
+        
+        written = 0
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for part in parts:
+                    output.write(part)
+                    written += len(part)
+        else:
+            for part in parts:
+                sys.stdout.buffer.write(part)
+                written += len(part)
+            sys.stdout.buffer.flush()
+        
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f'Exported {written} bytes in {elapsed:.2f}s')
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from products.synthetic import DatasetGenerator, DEFAULT_VOLUMES
+import time
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic dataset for load testing and benchmarks'
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULT_VOLUMES.items():
+            parser.add_argument(
+                f"--{name.replace('_', '-')}",
+                type=float if name == 'images_per_product' else int,
+                default=default,
+            )
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Multiply users, categories, products, reviews, carts and orders'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Load rows with COPY instead of bulk_create (PostgreSQL only)'
+        )
+        parser.add_argument(
+            '--password',
+            default='loadtest123',
+            help='Password of every generated user'
+        )
+
+    def handle(self, *args, **options):
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy needs a PostgreSQL database.')
+
+        volumes = {name: options[name] for name in DEFAULT_VOLUMES}
+        for name in ('users', 'categories', 'products', 'reviews', 'carts', 'orders'):
+            volumes[name] = int(volumes[name] * options['scale'])
+
+        generator = DatasetGenerator(
+            volumes,
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            use_copy=options['copy'],
+            password=options['password'],
+            log=self.stdout.write,
+        )
+        started = time.perf_counter()
+        try:
+            stats = generator.run()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        rows = sum(written for written, _ in stats.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)'
+        ))
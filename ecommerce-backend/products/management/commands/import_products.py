@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.importer import import_products, FORMATS, DEFAULT_CHUNK_SIZE
+import json
+
+
+class Command(BaseCommand):
+    help = 'Bulk import/upsert products from a CSV or JSONL file, keyed on SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format (defaults to the file extension)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            '--errors',
+            help='Write the per-row error report to this JSON file'
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if fmt == 'ndjson':
+            fmt = 'jsonl'
+        if fmt not in FORMATS:
+            raise CommandError(f'Cannot infer format of {options["path"]}; use --format')
+
+        with open(options['path'], 'rb') as stream:
+            report = import_products(stream, fmt, options['chunk_size'])
+
+        if options['errors']:
+            with open(options['errors'], 'w') as output:
+                json.dump(report['errors'], output, indent=2)
+        else:
+            for error in report['errors'][:20]:
+                self.stdout.write(self.style.WARNING(f"Row {error['row']}: {error['errors']}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['rows']} rows: {report['created']} created, "
+            f"{report['updated']} updated, {report['failed']} failed "
+            f"in {report['seconds']}s ({report['rows_per_minute']} rows/min)"
+        ))
+        if 'error' in report:
+            raise CommandError(f"Import stopped at {report['error']}")
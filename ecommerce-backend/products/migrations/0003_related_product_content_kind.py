@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_related_products'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='relatedproduct',
+            name='kind',
+            field=models.CharField(choices=[('copurchase', 'Frequently bought together'), ('content', 'Similar products')], max_length=20),
+        ),
+    ]
@@ -76,6 +76,7 @@ class Product(models.Model):
             models.Index(fields=['category', 'is_active']),
             models.Index(fields=['price']),
             models.Index(fields=['-created_at']),
+            models.Index(fields=['updated_at', 'id']),
         ]
     
     def __str__(self):
@@ -92,6 +93,24 @@ class Product(models.Model):
         return self.stock_quantity > 0
 
 
+class ProductDeletion(models.Model):
+    """Tombstone recorded when a product is deleted, for delta sync clients."""
+    
+    product_id = models.BigIntegerField()
+    slug = models.SlugField(max_length=200)
+    sku = models.CharField(max_length=50)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'product_deletions'
+        verbose_name = 'Product Deletion'
+        verbose_name_plural = 'Product Deletions'
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"Deleted product {self.product_id} ({self.sku})"
+
+
 class ProductImage(models.Model):
     """Product image model for multiple images per product."""
     
@@ -151,4 +170,99 @@ class Review(models.Model):
         ]
     
     def __str__(self):
-        return f"Review by {self.user.email} for {self.product.name}"
\ No newline at end of file
+        return f"Review by {self.user.email} for {self.product.name}"
+
+
+class ProductPairCount(models.Model):
+    """Sparse co-purchase matrix: number of orders containing both products.
+
+    Only the upper triangle is stored (``product_a_id <= product_b_id``); the
+    diagonal holds the number of orders containing a single product.
+    """
+    
+    product_a = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    product_b = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'product_pair_counts'
+        verbose_name = 'Product Pair Count'
+        verbose_name_plural = 'Product Pair Counts'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product_a', 'product_b'],
+                name='unique_product_pair'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['product_b']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_a_id}/{self.product_b_id}: {self.count}"
+
+
+class RelatedProduct(models.Model):
+    """Precomputed top-k neighbours of a product."""
+    
+    KIND_COPURCHASE = 'copurchase'
+    KIND_CONTENT = 'content'
+    
+    KIND_CHOICES = [
+        (KIND_COPURCHASE, 'Frequently bought together'),
+        (KIND_CONTENT, 'Similar products'),
+    ]
+    
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='related_products'
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        db_table = 'related_products'
+        verbose_name = 'Related Product'
+        verbose_name_plural = 'Related Products'
+        ordering = ['kind', 'rank']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'kind', 'rank'],
+                name='unique_related_product_rank'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.kind})"
+
+
+class RecommendationBuild(models.Model):
+    """Watermark of the last recommendation build, one row per kind."""
+    
+    kind = models.CharField(max_length=20, unique=True)
+    watermark_id = models.BigIntegerField(default=0)
+    watermark_at = models.DateTimeField(null=True, blank=True)
+    built_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'recommendation_builds'
+        verbose_name = 'Recommendation Build'
+        verbose_name_plural = 'Recommendation Builds'
+    
+    def __str__(self):
+        return f"{self.kind} build at {self.built_at}"
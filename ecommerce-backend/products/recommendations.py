@@ -0,0 +1,481 @@
+"""
+Offline product recommendations, stored as top-k rows in ``RelatedProduct``.
+
+Co-purchase ("frequently bought together"): order baskets are streamed in
+chunks of order ids, turned into pair counts with vectorized NumPy counting
+and accumulated into the sparse ``ProductPairCount`` matrix. Products
+touched by the new orders then get their neighbours rescored by cosine
+similarity. Cancelled orders are not counted; an order cancelled after it
+was counted has its pairs subtracted again (``adjust_order``, called from
+the ``Order`` signals), and one that is reinstated has them added back.
+
+Content similarity: product name, description and category are turned into
+L2-normalised TF-IDF vectors held in NumPy CSR/CSC arrays. Products changed
+since the last build are scored against the whole catalog through the
+inverted index.
+"""
+from array import array
+import re
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from .models import Product, ProductPairCount, RelatedProduct, RecommendationBuild
+
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_TOP_K = 10
+
+# Baskets larger than this are bulk/wholesale orders; their pairs say little
+# about affinity and grow quadratically, so they are skipped.
+MAX_BASKET_SIZE = 50
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'is', 'it', 'of', 'on', 'or', 'the', 'this', 'to', 'with', 'your',
+])
+NAME_WEIGHT = 2
+
+# Terms found in more products than this barely discriminate but dominate
+# scoring cost, so their postings are skipped (only on large catalogs).
+MAX_POSTINGS = 2000
+
+# Only a query's highest-weighted terms are walked; the rest add little to
+# the ranking of the top neighbours.
+MAX_QUERY_TERMS = 12
+
+# Upper bound on candidate (query, product) entries scored at once.
+POSTINGS_BUDGET = 4_000_000
+
+
+def _ranges(starts, lengths):
+    """Concatenate ``arange(start, start + length)`` for each pair, vectorized."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + (np.arange(lengths.sum()) - offsets)
+
+
+def basket_pair_counts(order_ids, product_ids):
+    """
+    Count co-occurring product pairs over a set of baskets.
+
+    ``order_ids`` and ``product_ids`` are parallel arrays of order items.
+    Returns ``(product_a, product_b, count)`` arrays for the upper triangle of
+    the co-purchase matrix, including the diagonal (single product counts).
+    """
+    order_ids = np.asarray(order_ids, dtype=np.int64)
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    empty = np.empty(0, dtype=np.int64)
+    if not len(order_ids):
+        return empty, empty, empty
+
+    # One entry per (order, product), sorted by order then product.
+    items = np.unique(np.stack([order_ids, product_ids], axis=1), axis=0)
+    orders, products = items[:, 0], items[:, 1]
+
+    _, starts, sizes = np.unique(orders, return_index=True, return_counts=True)
+    keep = np.repeat(sizes <= MAX_BASKET_SIZE, sizes)
+    products = products[keep]
+    sizes = sizes[sizes <= MAX_BASKET_SIZE]
+    if not len(products):
+        return empty, empty, empty
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    # Each item pairs with itself and every later item of its basket.
+    positions = np.arange(len(products))
+    pairs_per_item = np.repeat(starts + sizes, sizes) - positions
+    left = np.repeat(positions, pairs_per_item)
+    right = _ranges(positions, pairs_per_item)
+
+    catalog, dense = np.unique(products, return_inverse=True)
+    size = len(catalog)
+    codes = dense[left].astype(np.int64) * size + dense[right]
+    codes, counts = np.unique(codes, return_counts=True)
+    return catalog[codes // size], catalog[codes % size], counts
+
+
+def _accumulate_pairs(product_a, product_b, counts):
+    """
+    Add pair counts to the stored co-purchase matrix.
+
+    The sum is taken by the database (``ON CONFLICT ... DO UPDATE``), so
+    builds and order adjustments running at the same time add up instead of
+    overwriting each other's counts.
+    """
+    quote = connection.ops.quote_name
+    table = quote(ProductPairCount._meta.db_table)
+    columns = ('product_a_id', 'product_b_id', 'count')
+    rows = list(zip(product_a.tolist(), product_b.tolist(), counts.tolist()))
+    batch_size = connection.ops.bulk_batch_size(columns, rows)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(map(quote, columns))}) '
+                f'VALUES {", ".join(["(%s, %s, %s)"] * len(batch))} '
+                f'ON CONFLICT ({quote("product_a_id")}, {quote("product_b_id")}) '
+                f'DO UPDATE SET {quote("count")} = {table}.{quote("count")} + excluded.{quote("count")}',
+                [value for row in batch for value in row],
+            )
+
+
+def _top_k(source, target, scores, top_k, presorted=False):
+    """
+    Keep the ``top_k`` best targets per source; returns them with ranks.
+
+    Scores are cosine similarities in [0, 1], so ordering by source, then
+    score descending, then target is done with a single float sort key
+    instead of a much slower three-key lexsort. Pass ``presorted`` when the
+    input is already ordered by source and target.
+    """
+    if not presorted:
+        order = np.argsort(source * (int(target.max(initial=0)) + 1) + target)
+        source, target, scores = source[order], target[order], scores[order]
+    order = np.argsort(source * 4.0 - scores, kind='stable')
+    source, target, scores = source[order], target[order], scores[order]
+    _, starts, sizes = np.unique(source, return_index=True, return_counts=True)
+    ranks = np.arange(len(source)) - np.repeat(starts, sizes)
+    keep = ranks < top_k
+    return source[keep], target[keep], ranks[keep], scores[keep]
+
+
+def _write_neighbours(kind, product_ids, source, target, scores, top_k):
+    """
+    Replace the stored neighbours of ``product_ids`` for one kind.
+
+    ``source``, ``target`` and ``scores`` are parallel arrays of candidate
+    neighbours; the ``top_k`` best per source product are kept.
+    """
+    source, target, ranks, scores = _top_k(source, target, scores, top_k)
+    rows = [
+        RelatedProduct(
+            product_id=product,
+            related_id=related,
+            kind=kind,
+            rank=rank,
+            score=round(score, 6),
+        )
+        for product, related, rank, score in zip(
+            source.tolist(), target.tolist(), ranks.tolist(), scores.tolist()
+        )
+    ]
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=product_ids, kind=kind).delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=DEFAULT_CHUNK_SIZE)
+
+
+def adjust_order(order_id, sign):
+    """
+    Add (``sign`` 1) or subtract (-1) the pairs of an order whose status
+    changed after it could have been counted, and rescore its products.
+    Subtracting never creates pairs or takes a count below zero.
+
+    Orders past the build watermark are left to the next build, which
+    counts them unless they are cancelled.
+    """
+    build = RecommendationBuild.objects.filter(kind=RelatedProduct.KIND_COPURCHASE).first()
+    if build is None or order_id > build.watermark_id:
+        return
+    items = np.array(
+        list(OrderItem.objects.filter(order_id=order_id).values_list('order_id', 'product_id')),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    product_a, product_b, counts = basket_pair_counts(items[:, 0], items[:, 1])
+    if not len(counts):
+        return
+    if sign > 0:
+        _accumulate_pairs(product_a, product_b, counts)
+    else:
+        # A single basket's pairs are every stored pair of its products.
+        # Counts are decremented in place and never go below zero, as an
+        # order committed just behind the build may never have been counted.
+        pairs = ProductPairCount.objects.filter(
+            product_a_id__in=product_a.tolist(), product_b_id__in=product_b.tolist()
+        )
+        with transaction.atomic():
+            pairs.update(count=Greatest(F('count') - 1, 0))
+            pairs.filter(count=0).delete()
+    off = product_a != product_b
+    touched = np.unique(np.concatenate([product_a[off], product_b[off]])).tolist()
+    if touched:
+        _score_copurchase(touched, DEFAULT_TOP_K)
+
+
+def _score_copurchase(product_ids, top_k):
+    """Rewrite the top-k co-purchase neighbours of the given products."""
+    pairs = np.array(
+        list(
+            ProductPairCount.objects.filter(product_a_id__in=product_ids).values_list(
+                'product_a_id', 'product_b_id', 'count'
+            )
+        ) + list(
+            ProductPairCount.objects.filter(product_b_id__in=product_ids).values_list(
+                'product_a_id', 'product_b_id', 'count'
+            )
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    pairs = np.unique(pairs, axis=0)
+
+    off = pairs[pairs[:, 0] != pairs[:, 1]]
+    frequency = np.array(
+        list(
+            ProductPairCount.objects.filter(
+                product_a_id__in=np.unique(off[:, :2]).tolist(),
+                product_b_id=F('product_a_id'),
+            ).order_by('product_a_id').values_list('product_a_id', 'count')
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+    # Mirror so each product sees its neighbours in ``target``.
+    source = np.concatenate([off[:, 0], off[:, 1]])
+    target = np.concatenate([off[:, 1], off[:, 0]])
+    together = np.concatenate([off[:, 2], off[:, 2]]).astype(np.float64)
+
+    wanted = np.isin(source, np.asarray(product_ids, dtype=np.int64))
+    source, target, together = source[wanted], target[wanted], together[wanted]
+
+    # Cosine similarity: c(a, b) / sqrt(c(a, a) * c(b, b)).
+    norm = np.sqrt(
+        frequency[np.searchsorted(frequency[:, 0], source), 1].astype(np.float64)
+        * frequency[np.searchsorted(frequency[:, 0], target), 1]
+    )
+    scores = np.divide(together, norm, out=np.zeros_like(together), where=norm > 0)
+
+    _write_neighbours(
+        RelatedProduct.KIND_COPURCHASE, product_ids, source, target, scores, top_k
+    )
+
+
+def build_copurchase(full=False, chunk_size=DEFAULT_CHUNK_SIZE, top_k=DEFAULT_TOP_K):
+    """
+    Build or incrementally refresh co-purchase recommendations.
+
+    Only orders created after the stored watermark are counted unless
+    ``full`` is set, in which case the matrix is rebuilt from scratch.
+    Returns a dict with the number of orders and products processed.
+    """
+    build, _ = RecommendationBuild.objects.get_or_create(
+        kind=RelatedProduct.KIND_COPURCHASE
+    )
+    if full:
+        ProductPairCount.objects.all().delete()
+        RelatedProduct.objects.filter(kind=RelatedProduct.KIND_COPURCHASE).delete()
+        build.watermark_id = 0
+
+    orders = Order.objects.exclude(status='cancelled').order_by('id')
+    cursor = build.watermark_id
+    touched = set()
+    processed = 0
+
+    while True:
+        order_ids = list(
+            orders.filter(id__gt=cursor).values_list('id', flat=True)[:chunk_size]
+        )
+        if not order_ids:
+            break
+        items = np.array(
+            list(
+                OrderItem.objects.filter(order_id__in=order_ids).values_list(
+                    'order_id', 'product_id'
+                )
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        product_a, product_b, counts = basket_pair_counts(items[:, 0], items[:, 1])
+
+        with transaction.atomic():
+            if len(counts):
+                _accumulate_pairs(product_a, product_b, counts)
+            cursor = order_ids[-1]
+            build.watermark_id = cursor
+            build.save(update_fields=['watermark_id', 'built_at'])
+
+        touched.update(product_a[product_a != product_b].tolist())
+        touched.update(product_b[product_a != product_b].tolist())
+        processed += len(order_ids)
+
+    touched = sorted(touched)
+    for start in range(0, len(touched), chunk_size):
+        _score_copurchase(touched[start:start + chunk_size], top_k)
+
+    return {'orders': processed, 'products': len(touched)}
+
+
+def product_terms(name, description, category_id, category_name):
+    """Return the terms of a product document; name terms count double."""
+    name_terms = [t for t in TOKEN_RE.findall(name.lower()) if t not in STOP_WORDS]
+    terms = name_terms * NAME_WEIGHT
+    terms += [t for t in TOKEN_RE.findall(description.lower()) if t not in STOP_WORDS]
+    terms += TOKEN_RE.findall(category_name.lower())
+    terms.append(f'category:{category_id}')
+    return terms
+
+
+class TfidfIndex:
+    """
+    TF-IDF vectors of a product catalog in NumPy arrays.
+
+    Vectors are stored row-wise (CSR: ``row_ptr``, ``cols``, ``weights``) and
+    as an inverted index (CSC: ``term_ptr``, ``post_rows``, ``post_weights``)
+    so cosine neighbours are found by walking the postings of a query's terms.
+    """
+    
+    def __init__(self, documents):
+        """Build the index from an iterable of ``(product_id, terms)``."""
+        vocabulary = {}
+        product_ids = array('q')
+        rows = array('q')
+        cols = array('q')
+        for row, (product_id, terms) in enumerate(documents):
+            product_ids.append(product_id)
+            cols.extend([vocabulary.setdefault(term, len(vocabulary)) for term in terms])
+            rows.extend([row] * len(terms))
+        
+        self.product_ids = np.frombuffer(product_ids, dtype=np.int64)
+        n_docs, n_terms = len(self.product_ids), max(len(vocabulary), 1)
+        
+        codes, tf = np.unique(
+            np.frombuffer(rows, dtype=np.int64) * n_terms
+            + np.frombuffer(cols, dtype=np.int64),
+            return_counts=True,
+        )
+        del rows, cols
+        doc_rows, self.cols = np.divmod(codes, n_terms)
+        self.df = np.bincount(self.cols, minlength=n_terms)
+        
+        # Sublinear term frequency, smoothed idf, L2-normalised rows.
+        idf = np.log((1 + n_docs) / (1 + self.df)) + 1
+        weights = (1 + np.log(tf)) * idf[self.cols]
+        norms = np.sqrt(np.bincount(doc_rows, weights=weights ** 2, minlength=n_docs))
+        self.weights = weights / norms[doc_rows]
+        self.row_ptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(doc_rows, minlength=n_docs)))
+        )
+        
+        by_term = np.argsort(self.cols, kind='stable')
+        self.post_rows = doc_rows[by_term]
+        self.post_weights = self.weights[by_term]
+        self.term_ptr = np.concatenate(([0], np.cumsum(self.df)))
+    
+    def __len__(self):
+        return len(self.product_ids)
+    
+    def neighbours(self, query_rows, top_k):
+        """
+        Return the ``top_k`` cosine neighbours of the given index rows.
+        
+        Result is ``(product_id, related_id, score)`` arrays. Queries are
+        scored in batches bounded by ``POSTINGS_BUDGET`` candidate entries.
+        """
+        query_rows = np.asarray(query_rows, dtype=np.int64)
+        starts = self.row_ptr[query_rows]
+        lengths = self.row_ptr[query_rows + 1] - starts
+        entries = _ranges(starts, lengths)
+        query = np.repeat(query_rows, lengths)
+        
+        # Skip overly common terms, then keep each query's strongest terms.
+        usable = self.df[self.cols[entries]] <= MAX_POSTINGS
+        entries, query = entries[usable], query[usable]
+        order = np.lexsort((-self.weights[entries], query))
+        entries, query = entries[order], query[order]
+        _, group_starts, group_sizes = np.unique(query, return_index=True, return_counts=True)
+        strongest = np.arange(len(query)) - np.repeat(group_starts, group_sizes) < MAX_QUERY_TERMS
+        entries, query = entries[strongest], query[strongest]
+        
+        _, group_starts = np.unique(query, return_index=True)
+        group_ptr = np.append(group_starts, len(query))
+        terms = self.cols[entries]
+        postings = self.df[terms]
+        cost = np.concatenate(([0], np.cumsum(postings)))[group_ptr]
+        
+        results = []
+        first = 0
+        while first < len(group_starts):
+            last = int(np.searchsorted(cost, cost[first] + POSTINGS_BUDGET, side='right')) - 1
+            last = min(max(last, first + 1), len(group_starts))
+            batch = slice(group_ptr[first], group_ptr[last])
+            results.append(self._score(
+                query[batch], terms[batch], self.weights[entries[batch]],
+                postings[batch], top_k
+            ))
+            first = last
+        
+        if not results:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+        source, target, scores = (np.concatenate(parts) for parts in zip(*results))
+        return self.product_ids[source], self.product_ids[target], scores
+    
+    def _score(self, query, terms, weights, postings, top_k):
+        """Accumulate dot products over the postings of one query batch."""
+        hits = _ranges(self.term_ptr[terms], postings)
+        source = np.repeat(query, postings)
+        target = self.post_rows[hits]
+        contribution = np.repeat(weights, postings) * self.post_weights[hits]
+        
+        other = source != target
+        codes = source[other] * len(self) + target[other]
+        order = np.argsort(codes)
+        codes = codes[order]
+        if not len(codes):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+        boundaries = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        scores = np.add.reduceat(contribution[other][order], boundaries)
+        source, target = np.divmod(codes[boundaries], len(self))
+        source, target, _, scores = _top_k(source, target, scores, top_k, presorted=True)
+        return source, target, scores
+
+
+def build_content_similarity(full=False, chunk_size=DEFAULT_CHUNK_SIZE, top_k=DEFAULT_TOP_K):
+    """
+    Build or incrementally refresh content-similarity recommendations.
+
+    The TF-IDF index always covers the whole active catalog, but only
+    products whose ``updated_at`` is newer than the stored watermark are
+    rescored unless ``full`` is set.
+    Returns a dict with the catalog size and number of products rescored.
+    """
+    build, _ = RecommendationBuild.objects.get_or_create(
+        kind=RelatedProduct.KIND_CONTENT
+    )
+    since = None if full else build.watermark_at
+    started = timezone.now()
+    changed = []
+
+    def documents():
+        products = Product.objects.filter(is_active=True).order_by('id').values_list(
+            'id', 'updated_at', 'name', 'description', 'category_id', 'category__name'
+        )
+        for row, (pk, updated_at, name, description, category_id, category_name) in enumerate(
+            products.iterator(chunk_size=chunk_size)
+        ):
+            if since is None or updated_at > since:
+                changed.append(row)
+            yield pk, product_terms(name, description, category_id, category_name)
+
+    index = TfidfIndex(documents())
+
+    stale = RelatedProduct.objects.filter(kind=RelatedProduct.KIND_CONTENT)
+    if not full:
+        stale = stale.filter(product__is_active=False)
+    stale.delete()
+
+    for start in range(0, len(changed), chunk_size):
+        rows = changed[start:start + chunk_size]
+        source, target, scores = index.neighbours(rows, top_k)
+        _write_neighbours(
+            RelatedProduct.KIND_CONTENT,
+            index.product_ids[rows].tolist(),
+            source, target, scores, top_k
+        )
+
+    build.watermark_at = started
+    build.save(update_fields=['watermark_at', 'built_at'])
+    return {'products': len(index), 'changed': len(changed)}
@@ -0,0 +1,68 @@
+"""
+Shared plumbing for per-worker in-memory indexes.
+
+Subclasses implement ``refresh()`` (load on first use, then apply
+``updated_at`` deltas) and set ``loaded``. ``ensure_fresh()`` is called on
+the request path: it loads synchronously the first time, exempt from the
+request's deadline (``config/deadlines.py``) so a short one cannot keep the
+index from ever loading, and afterwards starts at most one background
+refresh once the data is older than the number of seconds named by
+``refresh_setting``.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from config.deadlines import exempt
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRefresh:
+    refresh_setting = None
+
+    def __init__(self):
+        self.loaded = False
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self):
+        raise NotImplementedError
+
+    def mark_refreshed(self):
+        self.loaded = True
+        self._refreshed_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    with exempt():
+                        self.refresh()
+        elif time.monotonic() - self._refreshed_at > getattr(settings, self.refresh_setting):
+            self._refresh_in_background()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('%s refresh failed', type(self).__name__)
+            finally:
+                self._refreshing = False
+                connection.close()
+
+        threading.Thread(
+            target=run,
+            name=f'{type(self).__name__}-refresh',
+            daemon=True
+        ).start()
@@ -1,15 +1,93 @@
+from django.db.models import Count, Manager
 from rest_framework import serializers
-from .models import Category, Product, ProductImage, Review
+from .models import Category, Product, ProductImage, Review, RelatedProduct
+
+
+class CategoryTree:
+    """
+    Category hierarchy loaded with one query on first use, for serializing
+    nested trees.
+    
+    Product counts are loaded per subtree on first use, with one query for
+    a category and all its descendants.
+    """
+    
+    def __init__(self):
+        self._tree = None
+        self._product_counts = {}
+    
+    def set_categories(self, categories):
+        """Build the hierarchy from already loaded categories, ordered by name."""
+        self._tree = {}
+        for category in categories:
+            self._tree.setdefault(category.parent_id, []).append(category)
+    
+    @property
+    def _children(self):
+        if self._tree is None:
+            self.set_categories(Category.objects.order_by('name'))
+        return self._tree
+    
+    def children(self, category):
+        return self._children.get(category.pk, [])
+    
+    def _uncounted(self, categories):
+        """Ids of ``categories`` and their descendants without a count yet."""
+        ids = set()
+        pending = [category.pk for category in categories]
+        while pending:
+            pk = pending.pop()
+            if pk in ids or pk in self._product_counts:
+                continue
+            ids.add(pk)
+            pending.extend(child.pk for child in self._children.get(pk, []))
+        return ids
+    
+    def _count_query(self, ids):
+        return (
+            Product.objects.filter(category_id__in=ids).order_by()
+            .values_list('category').annotate(count=Count('id'))
+        )
+    
+    def _store_counts(self, ids, counts):
+        counts = dict(counts)
+        for pk in ids:
+            self._product_counts[pk] = counts.get(pk, 0)
+    
+    def load_product_counts(self, categories):
+        """Count products of ``categories`` and their descendants in one query."""
+        ids = self._uncounted(categories)
+        if ids:
+            self._store_counts(ids, self._count_query(ids))
+    
+    async def aload_product_counts(self, categories):
+        """Async ``load_product_counts``; call ``set_categories`` first."""
+        ids = self._uncounted(categories)
+        if ids:
+            self._store_counts(ids, [row async for row in self._count_query(ids)])
+    
+    def product_count(self, category):
+        if category.pk not in self._product_counts:
+            self.load_product_counts([category])
+        return self._product_counts[category.pk]
+
+
+class CategoryListSerializer(serializers.ListSerializer):
+    """Loads product counts for all listed subtrees at once."""
+    
+    def to_representation(self, data):
+        tree = self.context.get('category_tree')
+        if tree is not None:
+            data = list(data.all() if isinstance(data, Manager) else data)
+            tree.load_product_counts(data)
+        return super().to_representation(data)
 
 
 class CategorySerializer(serializers.ModelSerializer):
     """Serializer for Category model."""
     
     children = serializers.SerializerMethodField()
-    product_count = serializers.IntegerField(
-        source='products.count',
-        read_only=True
-    )
+    product_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
@@ -19,12 +97,33 @@ class CategorySerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['slug', 'created_at', 'updated_at']
+        list_serializer_class = CategoryListSerializer
+    
+    def to_representation(self, instance):
+        tree = self.context.get('category_tree')
+        if tree is not None:
+            tree.load_product_counts([instance])
+        return super().to_representation(instance)
     
     def get_children(self, obj):
-        """Get child categories."""
-        if obj.children.exists():
-            return CategorySerializer(obj.children.all(), many=True).data
+        """
+        Get child categories.
+        
+        Uses the ``category_tree`` context (see ``CategoryTree``) when given,
+        so a whole tree serializes without a query per category.
+        """
+        tree = self.context.get('category_tree')
+        children = tree.children(obj) if tree is not None else obj.children.all()
+        if children:
+            return CategorySerializer(children, many=True, context=self.context).data
         return []
+    
+    def get_product_count(self, obj):
+        """Get number of products in the category."""
+        tree = self.context.get('category_tree')
+        if tree is not None:
+            return tree.product_count(obj)
+        return obj.products.count()
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
@@ -76,13 +175,13 @@ class ProductListSerializer(serializers.ModelSerializer):
         ]
     
     def get_primary_image(self, obj):
-        """Get primary product image."""
-        primary = obj.images.filter(is_primary=True).first()
+        """Get primary product image (from prefetched images when available)."""
+        images = list(obj.images.all())
+        primary = next((image for image in images if image.is_primary), None)
         if primary:
             return ProductImageSerializer(primary).data
-        first_image = obj.images.first()
-        if first_image:
-            return ProductImageSerializer(first_image).data
+        if images:
+            return ProductImageSerializer(images[0]).data
         return None
     
     def get_average_rating(self, obj):
@@ -94,6 +193,40 @@ class ProductListSerializer(serializers.ModelSerializer):
         return None
 
 
+class RelatedProductSerializer(serializers.ModelSerializer):
+    """Serializer for precomputed product recommendations."""
+    
+    id = serializers.IntegerField(source='related.id', read_only=True)
+    name = serializers.CharField(source='related.name', read_only=True)
+    slug = serializers.CharField(source='related.slug', read_only=True)
+    price = serializers.DecimalField(
+        source='related.price',
+        max_digits=10,
+        decimal_places=2,
+        read_only=True
+    )
+    category_name = serializers.CharField(source='related.category.name', read_only=True)
+    is_in_stock = serializers.BooleanField(source='related.is_in_stock', read_only=True)
+    
+    class Meta:
+        model = RelatedProduct
+        fields = [
+            'id', 'name', 'slug', 'price', 'category_name',
+            'is_in_stock', 'score'
+        ]
+
+
+class ProductChangeSerializer(serializers.ModelSerializer):
+    """Flat product row for delta sync; no related lookups."""
+    
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'slug', 'description', 'price', 'category',
+            'stock_quantity', 'sku', 'created_at', 'updated_at'
+        ]
+
+
 class ProductDetailSerializer(serializers.ModelSerializer):
     """Detailed serializer for single product view."""
     
@@ -0,0 +1,52 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from orders.models import Order
+from .models import Category, Product, ProductDeletion, Review
+from .storefront import scheduler
+
+
+@receiver(post_delete, sender=Product)
+def record_product_deletion(sender, instance, **kwargs):
+    """Keep a tombstone so delta sync clients learn about the deletion."""
+    ProductDeletion.objects.create(
+        product_id=instance.pk,
+        slug=instance.slug,
+        sku=instance.sku,
+    )
+
+
+@receiver([post_save, post_delete], sender=Review)
+def touch_reviewed_product(sender, instance, **kwargs):
+    """Bump the product so ``updated_at`` deltas carry its new rating."""
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Review)
+def schedule_storefront_rebuild(sender, **kwargs):
+    """Rebuild the storefront home document once the change is committed."""
+    transaction.on_commit(scheduler.schedule)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    """Keep the stored status; orders are only updated when they change status."""
+    instance._stored_status = (
+        Order.objects.filter(pk=instance.pk).order_by().values_list('status', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Order)
+def adjust_copurchase_counts(sender, instance, created, **kwargs):
+    """Uncount the baskets of cancelled orders and recount reinstated ones."""
+    before = instance._stored_status
+    if created or before is None or (before == 'cancelled') == (instance.status == 'cancelled'):
+        return
+    # NumPy is only imported when an order is actually cancelled or reinstated.
+    from .recommendations import adjust_order
+    transaction.on_commit(partial(adjust_order, instance.pk, -1 if instance.status == 'cancelled' else 1))
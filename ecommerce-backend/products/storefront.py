@@ -0,0 +1,140 @@
+"""
+Precomputed storefront home document (``/api/storefront/home/``).
+
+The document holds the category tree and, for every top-level category
+and its descendants, the featured (best-selling in stock), newest and
+best-rated active products, serialized like the product list. It is built
+in the background and stored in the cache already rendered, so the
+endpoint is a single cache read with no database access or serialization.
+
+Saving or deleting a product, category or review schedules a rebuild once
+the transaction commits. Rebuilds are coalesced: changes within
+``STOREFRONT_REBUILD_DELAY_SECONDS`` of the first are picked up by the same
+rebuild. Changes that bypass model signals (bulk imports call
+``scheduler.schedule()`` themselves) and workers that do not share the
+cache (no ``REDIS_URL``) are covered by ``STOREFRONT_MAX_AGE_SECONDS``:
+an older document is still served while a rebuild runs.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Avg, Count, Sum
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Category, Product
+from .serializers import CategorySerializer, CategoryTree, ProductListSerializer
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'storefront:home'
+
+
+def _subtree_ids(tree, category):
+    ids = []
+    pending = [category]
+    while pending:
+        category = pending.pop()
+        ids.append(category.pk)
+        pending.extend(tree.children(category))
+    return ids
+
+
+def build_document():
+    """Return the home document as a dict."""
+    limit = settings.STOREFRONT_PRODUCTS_PER_SECTION
+    tree = CategoryTree()
+    categories = list(Category.objects.order_by('name'))
+    tree.set_categories(categories)
+    roots = [category for category in categories if category.parent_id is None]
+    tree.load_product_counts(roots)
+
+    active = Product.objects.filter(is_active=True).order_by()
+    sections = []
+    for root in roots:
+        products = active.filter(category_id__in=_subtree_ids(tree, root))
+        sections.append({
+            'category': {'id': root.pk, 'name': root.name, 'slug': root.slug},
+            'featured': list(
+                products.filter(stock_quantity__gt=0)
+                .annotate(sold=Sum('order_items__quantity'))
+                .filter(sold__gt=0)
+                .order_by('-sold', 'id')
+                .values_list('id', flat=True)[:limit]
+            ),
+            'newest': list(products.order_by('-created_at', '-id').values_list('id', flat=True)[:limit]),
+            'best_rated': list(
+                products.annotate(rating=Avg('reviews__rating'), ratings=Count('reviews'))
+                .filter(ratings__gte=settings.STOREFRONT_MIN_REVIEWS)
+                .order_by('-rating', '-ratings', 'id')
+                .values_list('id', flat=True)[:limit]
+            ),
+        })
+
+    # Every listed product is loaded and serialized once.
+    ids = {pk for section in sections for kind in ('featured', 'newest', 'best_rated') for pk in section[kind]}
+    listed = Product.objects.filter(pk__in=ids).select_related('category').prefetch_related('images', 'reviews')
+    serialized = {row['id']: row for row in ProductListSerializer(listed, many=True).data}
+    for section in sections:
+        for kind in ('featured', 'newest', 'best_rated'):
+            section[kind] = [serialized[pk] for pk in section[kind] if pk in serialized]
+
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'categories': CategorySerializer(roots, many=True, context={'category_tree': tree}).data,
+        'sections': sections,
+    }
+
+
+def rebuild():
+    """Build, render and store the document; returns the cache entry."""
+    started = time.perf_counter()
+    entry = (time.time(), JSONRenderer().render(build_document()))
+    cache.set(CACHE_KEY, entry, None)
+    logger.info('Storefront home rebuilt in %.0fms (%d bytes)', (time.perf_counter() - started) * 1000, len(entry[1]))
+    return entry
+
+
+def cached_document():
+    """Return the rendered document, building it if the cache has none."""
+    entry = cache.get(CACHE_KEY)
+    if entry is None:
+        entry = rebuild()
+    elif time.time() - entry[0] > settings.STOREFRONT_MAX_AGE_SECONDS:
+        scheduler.schedule(delay=0)
+    return entry[1]
+
+
+class RebuildScheduler:
+    """Runs one background rebuild for a burst of changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def schedule(self, delay=None):
+        with self._lock:
+            if self._timer is not None:
+                return
+            delay = settings.STOREFRONT_REBUILD_DELAY_SECONDS if delay is None else delay
+            self._timer = threading.Timer(delay, self._run)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run(self):
+        # Changes made from now on need another rebuild.
+        with self._lock:
+            self._timer = None
+        try:
+            rebuild()
+        except Exception:
+            logger.exception('Storefront home rebuild failed')
+        finally:
+            connection.close()
+
+
+scheduler = RebuildScheduler()
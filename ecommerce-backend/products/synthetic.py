@@ -0,0 +1,464 @@
+"""
+Synthetic dataset generation for load testing and benchmarks.
+
+Volumes are configurable up to millions of rows. All data derives from one
+seed, so the same options on an empty database always produce the same
+dataset. Rows are generated in NumPy batches with explicit primary keys and
+written with ``bulk_create`` or, on PostgreSQL, ``COPY``; no per-row queries
+are made.
+
+Distributions are skewed the way real shops are: category sizes, product
+popularity and customer activity follow power laws, prices are log-normal,
+ratings lean positive and a share of products is out of stock or inactive.
+"""
+from decimal import Decimal
+import io
+import logging
+import time
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from accounts.models import User
+from orders.models import Cart, CartItem, Order, OrderItem
+from .models import Category, Product, ProductImage, Review
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VOLUMES = {
+    'users': 1_000,
+    'categories': 100,
+    'category_depth': 3,
+    'products': 10_000,
+    'images_per_product': 2,
+    'reviews': 20_000,
+    'carts': 500,
+    'cart_items': 3,
+    'orders': 5_000,
+    'order_items': 3,
+}
+
+SYLLABLES = [
+    'ka', 'lo', 'mi', 'ne', 'ra', 'su', 'ti', 'vo', 'ze', 'ba', 'de', 'fi',
+    'go', 'hu', 'ja', 'ke', 'li', 'mo', 'nu', 'pa', 're', 'si', 'to', 'va',
+]
+
+ORDER_STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+ORDER_STATUS_WEIGHTS = [0.15, 0.10, 0.10, 0.55, 0.10]
+RATING_WEIGHTS = [0.05, 0.07, 0.13, 0.30, 0.45]
+
+
+def _copy_value(value):
+    """Format one value for PostgreSQL ``COPY ... FROM STDIN`` text format."""
+    if value is None:
+        return '\\N'
+    if value is True or value is False:
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+
+class BulkCreateWriter:
+    """Writes column batches of one model with ``bulk_create``."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def write(self, columns):
+        names = list(columns)
+        self.model.objects.bulk_create(
+            [self.model(**dict(zip(names, row))) for row in zip(*columns.values())]
+        )
+
+
+class CopyWriter:
+    """Writes column batches of one model with PostgreSQL ``COPY``."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def write(self, columns):
+        now = timezone.now()
+        # COPY bypasses Django defaults, so fill every omitted column here.
+        for field in self.model._meta.concrete_fields:
+            if field.primary_key or field.attname in columns:
+                continue
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                value = now
+            else:
+                value = field.get_default()
+            columns[field.attname] = [value] * len(columns['id'])
+
+        buffer = io.StringIO()
+        for row in zip(*columns.values()):
+            buffer.write('\t'.join(_copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        opts = self.model._meta
+        quote = connection.ops.quote_name
+        column_list = ', '.join(quote(opts.get_field(name).column) for name in columns)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {quote(opts.db_table)} ({column_list}) FROM STDIN', buffer
+            )
+
+
+def _sampler(rng, weights):
+    """Return ``draw(size)`` sampling indexes proportionally to ``weights``."""
+    cdf = np.cumsum(weights, dtype=np.float64)
+    cdf /= cdf[-1]
+
+    def draw(size):
+        return np.minimum(np.searchsorted(cdf, rng.random(size), side='right'), len(cdf) - 1)
+
+    return draw
+
+
+def _unique_pairs(draw_pair, count, right_size):
+    """
+    Draw ``count`` distinct ``(left, right)`` index pairs.
+
+    Pairs are kept in draw order, so trimming the overdraw drops random
+    pairs rather than those with the highest indexes.
+    """
+    codes = np.empty(0, dtype=np.int64)
+    while len(codes) < count:
+        left, right = draw_pair(int((count - len(codes)) * 1.2) + 16)
+        codes = np.concatenate([codes, left * right_size + right])
+        _, first = np.unique(codes, return_index=True)
+        codes = codes[np.sort(first)]
+    return codes[:count] // right_size, codes[:count] % right_size
+
+
+class DatasetGenerator:
+    """Generates users, categories, products, images, reviews, carts and orders."""
+
+    def __init__(self, volumes=None, seed=42, batch_size=10_000, use_copy=False,
+                 password='loadtest123', log=None):
+        self.volumes = dict(DEFAULT_VOLUMES, **(volumes or {}))
+        self.seed = seed
+        self.batch_size = batch_size
+        self.writer_class = CopyWriter if use_copy else BulkCreateWriter
+        self.password = password
+        self.log = log or logger.info
+        self.stats = {}
+
+    def run(self):
+        """Generate the whole dataset and return ``{table: (rows, seconds)}``."""
+        volumes = self.volumes
+        if volumes['products'] < 1 and (volumes['reviews'] or volumes['carts'] or volumes['orders']):
+            raise ValueError('Reviews, carts and orders need at least one product.')
+        if volumes['users'] < 1 and (volumes['reviews'] or volumes['carts'] or volumes['orders']):
+            raise ValueError('Reviews, carts and orders need at least one user.')
+        if volumes['carts'] > volumes['users']:
+            raise ValueError('Each cart belongs to a different user; use at most one cart per user.')
+
+        # Separate streams per table, derived from the single seed.
+        streams = np.random.SeedSequence(self.seed).spawn(7)
+        rng = {
+            name: np.random.default_rng(stream)
+            for name, stream in zip(
+                ['words', 'users', 'categories', 'products', 'reviews', 'carts', 'orders'], streams
+            )
+        }
+        self.words = self._vocabulary(rng['words'], 5_000)
+        self.word_draw = _sampler(rng['words'], 1.0 / np.arange(1, len(self.words) + 1))
+
+        self.users(rng['users'])
+        self.categories(rng['categories'])
+        self.products(rng['products'])
+        self.reviews(rng['reviews'])
+        self.carts(rng['carts'])
+        self.orders(rng['orders'])
+
+        if connection.vendor == 'postgresql':
+            # Rows carry explicit ids; move the sequences past them.
+            models = [User, Category, Product, ProductImage, Review, Cart, CartItem, Order, OrderItem]
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+        return self.stats
+
+    # Helpers
+
+    def _vocabulary(self, rng, size):
+        words = set()
+        while len(words) < size:
+            count = rng.integers(2, 4)
+            words.add(''.join(SYLLABLES[idx] for idx in rng.integers(0, len(SYLLABLES), count)))
+        return sorted(words)
+
+    def _phrase(self, count, rows):
+        """Return ``rows`` phrases of ``count`` Zipf-distributed words."""
+        codes = self.word_draw(count * rows).reshape(rows, count)
+        words = self.words
+        return [' '.join(words[idx] for idx in row) for row in codes.tolist()]
+
+    def _first_id(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def _write(self, model, total, build):
+        """Write ``total`` rows of ``model`` built batch by batch by ``build``."""
+        started = time.perf_counter()
+        writer = self.writer_class(model)
+        first_id = self._first_id(model)
+        written = 0
+        for start in range(0, total, self.batch_size):
+            ids = np.arange(first_id + start, first_id + min(start + self.batch_size, total))
+            columns = build(ids, start)
+            written += len(columns['id'])
+            writer.write(columns)
+        elapsed = time.perf_counter() - started
+        self.stats[model._meta.db_table] = (written, elapsed)
+        self.log(f'{model._meta.db_table}: {written} rows in {elapsed:.1f}s')
+        return first_id
+
+    def _write_children(self, model, parent_ids, counts, build):
+        """Write a variable number of child rows per parent, in batches of parents."""
+        started = time.perf_counter()
+        writer = self.writer_class(model)
+        next_id = self._first_id(model)
+        written = 0
+        for start in range(0, len(parent_ids), self.batch_size):
+            parents = parent_ids[start:start + self.batch_size]
+            batch_counts = counts[start:start + self.batch_size]
+            total = int(batch_counts.sum())
+            if not total:
+                continue
+            owners = np.repeat(parents, batch_counts)
+            # Position of each child within its parent.
+            offsets = np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+            positions = np.arange(total) - offsets
+            columns = {'id': np.arange(next_id, next_id + total).tolist()}
+            columns.update(build(owners, positions, start))
+            writer.write(columns)
+            next_id += total
+            written += total
+        elapsed = time.perf_counter() - started
+        self.stats[model._meta.db_table] = (written, elapsed)
+        self.log(f'{model._meta.db_table}: {written} rows in {elapsed:.1f}s')
+
+    # Tables
+
+    def users(self, rng):
+        count = self.volumes['users']
+        # Hashing is deliberately slow, so every generated user shares one hash.
+        password = make_password(self.password)
+
+        def build(ids, start):
+            first, last = self._phrase(1, len(ids)), self._phrase(1, len(ids))
+            return {
+                'id': ids.tolist(),
+                'email': [f'user{pk}@loadtest.example.com' for pk in ids.tolist()],
+                'password': [password] * len(ids),
+                'first_name': [name.title() for name in first],
+                'last_name': [name.title() for name in last],
+            }
+
+        self.user_first = self._write(User, count, build)
+        # A few customers place most orders and reviews.
+        self.user_draw = _sampler(rng, rng.pareto(1.2, count) + 0.05) if count else None
+
+    def categories(self, rng):
+        count = self.volumes['categories']
+        depth = max(self.volumes['category_depth'], 1)
+        # Level sizes grow geometrically; the deepest level takes the rest.
+        branching = max(2, round(count ** (1 / depth)))
+        sizes = []
+        while sum(sizes) < count:
+            size = branching ** (len(sizes) + 1)
+            if len(sizes) == depth - 1:
+                size = count - sum(sizes)
+            sizes.append(min(size, count - sum(sizes)))
+
+        levels = np.repeat(np.arange(len(sizes)), sizes)
+        level_starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        level_sizes = np.asarray(sizes, dtype=np.int64)
+
+        def build(ids, start):
+            size = len(ids)
+            first_id = int(ids[0]) - start
+            level = levels[start:start + size]
+            # Each category hangs off a random category one level up.
+            above = np.maximum(level - 1, 0)
+            parents = first_id + level_starts[above] + (rng.random(size) * level_sizes[above]).astype(np.int64)
+            labels = [
+                f'{name.title()} {pk}' for name, pk in zip(self._phrase(2, size), ids.tolist())
+            ]
+            return {
+                'id': ids.tolist(),
+                'name': labels,
+                'slug': [slugify(label) for label in labels],
+                'description': self._phrase(8, size),
+                'parent_id': [
+                    None if top else parent
+                    for top, parent in zip((level == 0).tolist(), parents.tolist())
+                ],
+            }
+
+        first_id = self._write(Category, count, build)
+        # Products hang off the deepest level, with skewed category sizes.
+        leaf_count = sizes[-1] if sizes else 0
+        self.leaf_ids = first_id + level_starts[-1] + np.arange(leaf_count) if leaf_count else None
+        self.category_draw = _sampler(rng, rng.pareto(1.0, leaf_count) + 0.01) if leaf_count else None
+
+    def products(self, rng):
+        count = self.volumes['products']
+        if count and self.leaf_ids is None:
+            raise ValueError('Products need at least one category.')
+        self.prices = np.empty(count, dtype=np.int64)
+
+        def build(ids, start):
+            size = len(ids)
+            cents = np.clip(np.round(rng.lognormal(np.log(3000), 1.0, size)), 99, 99_999_999).astype(np.int64)
+            self.prices[start:start + size] = cents
+            stock = np.where(rng.random(size) < 0.08, 0, rng.geometric(0.02, size))
+            active = rng.random(size) >= 0.03
+            names = [name.title() for name in self._phrase(3, size)]
+            pks = ids.tolist()
+            return {
+                'id': pks,
+                'name': names,
+                'slug': [f'{slugify(name)}-{pk}' for name, pk in zip(names, pks)],
+                'description': self._phrase(20, size),
+                'price': [Decimal(value).scaleb(-2) for value in cents.tolist()],
+                'category_id': self.leaf_ids[self.category_draw(size)].tolist(),
+                'stock_quantity': stock.tolist(),
+                'sku': [f'GEN-{pk:010d}' for pk in pks],
+                'is_active': active.tolist(),
+            }
+
+        self.product_first = self._write(Product, count, build)
+        # Popularity follows a power law: a small head sells most units.
+        self.product_draw = _sampler(rng, rng.pareto(1.1, count) + 0.01) if count else None
+
+        per_product = self.volumes['images_per_product']
+        if count and per_product:
+            counts = np.minimum(rng.poisson(per_product - 1, count) + 1, 8) if per_product >= 1 \
+                else (rng.random(count) < per_product).astype(np.int64)
+
+            def build_images(owners, positions, start):
+                owners, positions = owners.tolist(), positions.tolist()
+                return {
+                    'product_id': owners,
+                    'image_url': [
+                        f'https://images.example.com/products/{pk}/{pos}.jpg'
+                        for pk, pos in zip(owners, positions)
+                    ],
+                    'alt_text': [f'Product {pk} image {pos + 1}' for pk, pos in zip(owners, positions)],
+                    'is_primary': [pos == 0 for pos in positions],
+                    'display_order': positions,
+                }
+
+            product_ids = self.product_first + np.arange(count)
+            self._write_children(ProductImage, product_ids, counts, build_images)
+
+    def reviews(self, rng):
+        count = min(self.volumes['reviews'], self.volumes['users'] * self.volumes['products'])
+        if not count:
+            return
+        users, products = _unique_pairs(
+            lambda size: (self.user_draw(size), self.product_draw(size)),
+            count, self.volumes['products'],
+        )
+        order = rng.permutation(count)
+        users = self.user_first + users[order]
+        products = self.product_first + products[order]
+
+        def build(ids, start):
+            size = len(ids)
+            ratings = rng.choice(5, size, p=RATING_WEIGHTS) + 1
+            comments = self._phrase(10, size)
+            blank = rng.random(size) < 0.3
+            return {
+                'id': ids.tolist(),
+                'product_id': products[start:start + size].tolist(),
+                'user_id': users[start:start + size].tolist(),
+                'rating': ratings.tolist(),
+                'comment': ['' if skip else text for skip, text in zip(blank.tolist(), comments)],
+            }
+
+        self._write(Review, count, build)
+
+    def carts(self, rng):
+        count = self.volumes['carts']
+        if not count:
+            return
+        owners = self.user_first + np.sort(rng.choice(self.volumes['users'], count, replace=False))
+
+        def build(ids, start):
+            return {'id': ids.tolist(), 'user_id': owners[start:start + len(ids)].tolist()}
+
+        cart_first = self._write(Cart, count, build)
+
+        total = min(int(rng.poisson(self.volumes['cart_items'], count).sum()), count * self.volumes['products'])
+        if not total:
+            return
+        carts, products = _unique_pairs(
+            lambda size: (rng.integers(0, count, size), self.product_draw(size)),
+            total, self.volumes['products'],
+        )
+
+        def build_items(ids, start):
+            size = len(ids)
+            return {
+                'id': ids.tolist(),
+                'cart_id': (cart_first + carts[start:start + size]).tolist(),
+                'product_id': (self.product_first + products[start:start + size]).tolist(),
+                'quantity': rng.geometric(0.6, size).tolist(),
+            }
+
+        self._write(CartItem, total, build_items)
+
+    def orders(self, rng):
+        count = self.volumes['orders']
+        if not count:
+            return
+        users = self.user_first + self.user_draw(count)
+        counts = np.maximum(rng.poisson(self.volumes['order_items'] - 1, count) + 1, 1)
+        products = self.product_draw(int(counts.sum()))
+        quantities = rng.geometric(0.7, len(products))
+        subtotals = self.prices[products] * quantities
+        item_starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        totals = np.add.reduceat(subtotals, item_starts)
+        statuses = rng.choice(len(ORDER_STATUSES), count, p=ORDER_STATUS_WEIGHTS)
+
+        def build(ids, start):
+            size = len(ids)
+            owner = users[start:start + size].tolist()
+            addresses = [f'{pk} Load Test Street, Testville' for pk in owner]
+            return {
+                'id': ids.tolist(),
+                'order_number': [f'GEN-{pk:012d}' for pk in ids.tolist()],
+                'user_id': owner,
+                'status': [ORDER_STATUSES[idx] for idx in statuses[start:start + size].tolist()],
+                'total_amount': [Decimal(value).scaleb(-2) for value in totals[start:start + size].tolist()],
+                'shipping_address': addresses,
+                'billing_address': addresses,
+            }
+
+        order_first = self._write(Order, count, build)
+
+        def build_items(orders, positions, start):
+            lo = int(item_starts[start])
+            hi = lo + len(orders)
+            unit = self.prices[products[lo:hi]]
+            return {
+                'order_id': orders.tolist(),
+                'product_id': (self.product_first + products[lo:hi]).tolist(),
+                'quantity': quantities[lo:hi].tolist(),
+                'unit_price': [Decimal(value).scaleb(-2) for value in unit.tolist()],
+                'subtotal': [Decimal(value).scaleb(-2) for value in subtotals[lo:hi].tolist()],
+            }
+
+        self._write_children(OrderItem, order_first + np.arange(count), counts, build_items)
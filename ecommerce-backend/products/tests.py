@@ -1,3 +1,697 @@
-from django.test import TestCase
+from decimal import Decimal
+import asyncio
+import csv
+import gzip
+import io
+import json
+from unittest import mock
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve
+from prometheus_client import REGISTRY
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import User
+from config.deadlines import Deadline, DeadlineExceeded, enforce, reset_statement_timeout
+from orders.models import CartItem, Order, OrderItem
+from .models import (
+    Category, Product, ProductImage, ProductPairCount, RecommendationBuild, RelatedProduct, Review,
+)
+from .autocomplete import AutocompleteIndex
+from .catalog import CatalogSnapshot
+from .export import export_catalog
+from .storefront import CACHE_KEY, scheduler
+from .recommendations import adjust_order, basket_pair_counts, build_copurchase, build_content_similarity
+from .synthetic import DatasetGenerator, _unique_pairs
 
-# Create your tests here.
+
+def make_catalog(count, category=None):
+    """Create ``count`` active products in a single category."""
+    category = category or Category.objects.create(name='Electronics')
+    return [
+        Product.objects.create(
+            name=f'{category.name} Product {idx}',
+            description=f'Description {idx}',
+            price=Decimal('10.00') + idx,
+            category=category,
+            stock_quantity=10,
+            sku=f'SKU-{category.pk}-{idx:05d}',
+        )
+        for idx in range(count)
+    ]
+
+
+def make_order(user, products):
+    order = Order.objects.create(
+        user=user,
+        total_amount=0,
+        shipping_address='1 Main St',
+        billing_address='1 Main St',
+    )
+    for product in products:
+        OrderItem.objects.create(
+            order=order,
+            product=product,
+            quantity=1,
+            unit_price=product.price,
+        )
+    return order
+
+
+class BasketPairCountsTests(TestCase):
+    def test_counts_upper_triangle_with_diagonal(self):
+        product_a, product_b, counts = basket_pair_counts(
+            [1, 1, 1, 2, 2, 2],
+            [10, 20, 20, 10, 20, 30],
+        )
+        pairs = dict(zip(zip(product_a.tolist(), product_b.tolist()), counts.tolist()))
+        self.assertEqual(pairs, {
+            (10, 10): 2, (20, 20): 2, (30, 30): 1,
+            (10, 20): 2, (10, 30): 1, (20, 30): 1,
+        })
+
+
+class CopurchaseRecommendationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        self.products = make_catalog(4)
+
+    def test_incremental_build_and_related_endpoint(self):
+        first, second, third, fourth = self.products
+        make_order(self.user, [first, second])
+        make_order(self.user, [first, second, third])
+        self.assertEqual(build_copurchase(), {'orders': 2, 'products': 3})
+
+        make_order(self.user, [first, fourth])
+        make_order(self.user, [first, fourth])
+        make_order(self.user, [first, fourth])
+        self.assertEqual(build_copurchase(), {'orders': 3, 'products': 2})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/products/{first.slug}/related/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row['slug'] for row in response.data],
+            [fourth.slug, second.slug, third.slug]
+        )
+
+        incremental = list(RelatedProduct.objects.values_list('product', 'related', 'rank'))
+        build_copurchase(full=True)
+        self.assertCountEqual(
+            RelatedProduct.objects.filter(product=first).values_list('product', 'related', 'rank'),
+            [row for row in incremental if row[0] == first.id]
+        )
+
+    @mock.patch.object(scheduler, 'schedule')
+    def test_cancelled_orders_are_uncounted(self, schedule):
+        first, second, third, _ = self.products
+        make_order(self.user, [first, second])
+        order = make_order(self.user, [first, third])
+        build_copurchase()
+        pair = ProductPairCount.objects.filter(product_a=first, product_b=third)
+        self.assertEqual(pair.get().count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_authenticate(self.user)
+            self.assertEqual(self.client.patch(f'/api/orders/{order.pk}/cancel/').status_code, 200)
+        self.assertFalse(pair.exists())
+        self.assertEqual(ProductPairCount.objects.get(product_a=first, product_b=first).count, 1)
+        self.assertEqual(
+            list(RelatedProduct.objects.filter(product=first).values_list('related', flat=True)), [second.pk]
+        )
+
+        order.refresh_from_db()
+        order.status = 'pending'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertEqual(pair.get().count, 1)
+
+    @mock.patch.object(scheduler, 'schedule')
+    def test_cancelling_an_uncounted_order_never_goes_negative(self, schedule):
+        first, second, third, _ = self.products
+        make_order(self.user, [first, second])
+        build_copurchase()
+        # Committed behind the build's scan, so never counted.
+        order = make_order(self.user, [first, third])
+        RecommendationBuild.objects.filter(kind=RelatedProduct.KIND_COPURCHASE).update(watermark_id=order.pk)
+        adjust_order(order.pk, -1)
+        self.assertFalse(ProductPairCount.objects.filter(product_a=first, product_b=third).exists())
+        self.assertFalse(ProductPairCount.objects.filter(count__lte=0).exists())
+        self.assertEqual(ProductPairCount.objects.get(product_a=first, product_b=second).count, 1)
+
+
+class ContentSimilarityTests(APITestCase):
+    def setUp(self):
+        electronics = Category.objects.create(name='Electronics')
+        books = Category.objects.create(name='Books')
+        self.headphones = Product.objects.create(
+            name='Wireless Headphones', description='Bluetooth over-ear headphones',
+            price=Decimal('79.99'), category=electronics, sku='SKU-1',
+        )
+        self.earbuds = Product.objects.create(
+            name='Wireless Earbuds', description='Bluetooth in-ear earbuds',
+            price=Decimal('59.99'), category=electronics, sku='SKU-2',
+        )
+        self.guide = Product.objects.create(
+            name='Python Programming Guide', description='Learn Python programming',
+            price=Decimal('39.99'), category=books, sku='SKU-3',
+        )
+
+    def test_similar_endpoint_and_incremental_rebuild(self):
+        self.assertEqual(build_content_similarity(), {'products': 3, 'changed': 3})
+        self.assertEqual(build_content_similarity(), {'products': 3, 'changed': 0})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/products/{self.headphones.slug}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['slug'], self.earbuds.slug)
+
+        self.guide.description = 'Wireless bluetooth programming'
+        self.guide.save()
+        self.assertEqual(build_content_similarity(), {'products': 3, 'changed': 1})
+        self.assertTrue(
+            RelatedProduct.objects.filter(
+                product=self.guide, kind=RelatedProduct.KIND_CONTENT
+            ).exists()
+        )
+
+
+class AutocompleteTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        self.phone, self.phone_case, self.lamp = make_catalog(3)
+        Product.objects.filter(pk=self.phone.pk).update(name='Smart Phone', slug='smart-phone')
+        Product.objects.filter(pk=self.phone_case.pk).update(name='Phone Case', slug='phone-case')
+        make_order(self.user, [self.phone_case])
+        self.index = AutocompleteIndex()
+        patcher = mock.patch('products.views.autocomplete_index', self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ranks_word_prefixes_by_popularity_without_queries(self):
+        self.index.refresh()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/autocomplete/', {'q': 'PHO'})
+        self.assertEqual(
+            [(row['type'], row['slug']) for row in response.data['results']],
+            [('product', 'phone-case'), ('product', 'smart-phone')]
+        )
+
+        response = self.client.get('/api/products/autocomplete/', {'q': 'sku-'})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['results'][0]['type'], 'sku')
+
+    def test_refresh_applies_updated_at_deltas(self):
+        self.index.refresh()
+        self.lamp.name = 'Phone Stand'
+        self.lamp.save()
+        self.phone.is_active = False
+        self.phone.save()
+        self.index.refresh()
+
+        slugs = [row['slug'] for row in self.index.search('phone')]
+        self.assertIn(self.lamp.slug, slugs)
+        self.assertNotIn('smart-phone', slugs)
+
+        # New orders change the ranking without touching the products.
+        make_order(self.user, [self.lamp])
+        make_order(self.user, [self.lamp])
+        self.index.refresh()
+        self.assertEqual(self.index.search('phone')[0]['slug'], self.lamp.slug)
+
+    def test_limit_is_clamped(self):
+        self.index.refresh()
+        for limit, expected in [('-1', 1), ('0', 1), ('abc', 3), ('1000', 3)]:
+            response = self.client.get('/api/products/autocomplete/', {'q': 'sku-', 'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), expected)
+
+
+class CatalogSnapshotParityTests(APITestCase):
+    """The snapshot must return the same pages as the ORM path."""
+
+    QUERIES = [
+        {},
+        {'ordering': 'price'},
+        {'ordering': '-price'},
+        {'ordering': 'name'},
+        {'ordering': '-stock_quantity,name'},
+        {'min_price': '12.5', 'max_price': '20'},
+        {'price': '13.00'},
+        {'price__gte': '15', 'ordering': 'created_at'},
+        {'category_slug': 'books'},
+        {'in_stock': 'true', 'ordering': 'price'},
+        {'in_stock': 'false'},
+        {'is_active': 'false'},
+        {'name': 'GADGET', 'ordering': '-name'},
+        {'page': '2'},
+        {'page': '2', 'ordering': 'price', 'max_price': '30'},
+    ]
+
+    def setUp(self):
+        user = User.objects.create_user(email='reviewer@example.com', password='pass12345')
+        books = Category.objects.create(name='Books')
+        self.products = make_catalog(30) + make_catalog(6, category=books)
+        for idx, product in enumerate(self.products):
+            product.name = f'{"Gadget" if idx % 3 else "Widget"} {idx:02d}'
+            product.price = Decimal('10.00') + Decimal(idx) * Decimal('0.75')
+            product.stock_quantity = idx % 4
+            product.is_active = idx % 7 != 0
+            product.save()
+        self.products[1].reviews.create(user=user, rating=4)
+        self.snapshot = CatalogSnapshot()
+        patcher = mock.patch('products.views.catalog_snapshot', self.snapshot)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def slugs(self, params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['count'], [row['slug'] for row in response.data['results']]
+
+    def test_parity_with_orm(self):
+        for params in self.QUERIES:
+            with self.subTest(params=params):
+                expected = self.slugs(params)
+                with override_settings(CATALOG_SNAPSHOT_ENABLED=True):
+                    self.assertEqual(self.slugs(params), expected)
+        self.assertTrue(self.snapshot.loaded)
+
+    def test_refresh_applies_updates(self):
+        self.snapshot.refresh()
+        product = self.products[1]
+        product.price = Decimal('999.00')
+        product.save()
+        self.snapshot.refresh()
+        with override_settings(CATALOG_SNAPSHOT_ENABLED=True):
+            self.assertEqual(self.slugs({'min_price': '500'}), (1, [product.slug]))
+
+    def test_refresh_drops_deleted_products(self):
+        self.snapshot.refresh()
+        self.products[2].delete()
+        self.snapshot.refresh()
+        with override_settings(CATALOG_SNAPSHOT_ENABLED=True):
+            count, slugs = self.slugs({'in_stock': 'true', 'ordering': 'price'})
+        self.assertNotIn(self.products[2].slug, slugs)
+        self.assertEqual(count, Product.objects.filter(is_active=True, stock_quantity__gt=0).count())
+
+    def test_unsupported_params_take_orm_path(self):
+        with override_settings(CATALOG_SNAPSHOT_ENABLED=True):
+            response = self.client.get('/api/products/', {'search': 'gadget'})
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(self.snapshot.loaded)
+            response = self.client.get('/api/products/', {'min_price': 'abc'})
+            self.assertEqual(response.status_code, 400)
+
+
+class AsyncReadViewTests(APITransactionTestCase):
+    """The ASGI read endpoints return the documents of the DRF views."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        parent = Category.objects.create(name='Electronics')
+        child = Category.objects.create(name='Laptops', parent=parent)
+        products = make_catalog(25, category=parent) + make_catalog(3, category=child)
+        products[0].is_active = False
+        products[0].save()
+        self.product = products[-1]
+        ProductImage.objects.create(product=self.product, image_url='https://example.com/a.jpg', is_primary=True)
+        Review.objects.create(product=self.product, user=self.user, rating=5, comment='Great')
+        self.order = make_order(self.user, products[-2:])
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def compare(self, path, token=None, status=200):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        expected = self.client.get(path, headers=headers)
+        with override_settings(ROOT_URLCONF='config.asgi_urls'):
+            response = async_to_sync(self.async_client.get)(path, headers=headers)
+            # Resolved lazily, so while the ASGI URLconf is active.
+            match = response.resolver_match
+            self.assertTrue(asyncio.iscoroutinefunction(match.func))
+            self.assertEqual(match.view_name, resolve(path.split('?')[0]).view_name)
+        self.assertEqual((response.status_code, response.json()), (status, expected.json()))
+        return response
+
+    def test_catalog_reads(self):
+        self.compare('/api/products/')
+        self.compare('/api/products/?page=2&ordering=price&min_price=12')
+        self.compare('/api/products/?search=laptops')
+        self.compare('/api/products/?page=9', status=404)
+        self.compare(f'/api/products/{self.product.slug}/')
+        self.compare('/api/products/electronics-product-0/', status=404)
+        self.compare('/api/categories/')
+        with override_settings(CATALOG_SNAPSHOT_ENABLED=True), \
+                mock.patch('products.views.catalog_snapshot', CatalogSnapshot()):
+            self.compare('/api/products/?page=2&ordering=-price')
+
+    def test_order_detail(self):
+        self.compare(f'/api/orders/{self.order.pk}/', self.token)
+        response = self.compare(f'/api/orders/{self.order.pk}/', status=401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        other = User.objects.create_user(email='other@example.com', password='pass12345')
+        self.compare(f'/api/orders/{self.order.pk}/', str(RefreshToken.for_user(other).access_token), status=404)
+
+    def test_other_methods_and_actions_use_the_drf_views(self):
+        with override_settings(ROOT_URLCONF='config.asgi_urls'):
+            response = async_to_sync(self.async_client.get)('/api/products/search/', {'q': 'laptops'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.resolver_match.namespace, 'products')
+            response = async_to_sync(self.async_client.post)('/api/products/', {'name': 'New'})
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.resolver_match.view_name, 'products:product-list')
+
+
+@override_settings(STOREFRONT_PRODUCTS_PER_SECTION=2)
+class StorefrontHomeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        electronics = Category.objects.create(name='Electronics')
+        laptops = Category.objects.create(name='Laptops', parent=electronics)
+        books = Category.objects.create(name='Books')
+        self.gadgets = make_catalog(3, category=electronics)
+        self.laptops = make_catalog(2, category=laptops)
+        self.books = make_catalog(1, category=books)
+        make_order(user, [self.laptops[0], self.gadgets[1]])
+        make_order(user, [self.laptops[0]])
+        Review.objects.create(product=self.gadgets[0], user=user, rating=5)
+        Review.objects.create(product=self.laptops[1], user=user, rating=3)
+
+    def get(self):
+        response = self.client.get('/api/storefront/home/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_document_sections_per_top_level_category(self):
+        document = self.get()
+        self.assertEqual([category['name'] for category in document['categories']], ['Books', 'Electronics'])
+        self.assertEqual(document['categories'][1]['children'][0]['product_count'], 2)
+        electronics = document['sections'][1]
+        slugs = {kind: [row['slug'] for row in electronics[kind]] for kind in ('featured', 'newest', 'best_rated')}
+        self.assertEqual(slugs['featured'], [self.laptops[0].slug, self.gadgets[1].slug])
+        self.assertEqual(slugs['newest'], [self.laptops[1].slug, self.laptops[0].slug])
+        self.assertEqual(slugs['best_rated'], [self.gadgets[0].slug, self.laptops[1].slug])
+        self.assertEqual(document['sections'][0]['featured'], [])
+
+    def test_served_from_cache_without_queries(self):
+        self.get()
+        with self.assertNumQueries(0):
+            self.get()
+
+    def test_changes_schedule_a_rebuild_after_commit(self):
+        with mock.patch.object(scheduler, 'schedule') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.books[0].price = Decimal('1.00')
+                self.books[0].save()
+            schedule.assert_called_once_with()
+        self.get()
+        with mock.patch('products.storefront.threading.Timer') as timer:
+            with self.captureOnCommitCallbacks(execute=True):
+                Review.objects.filter(product=self.gadgets[0]).delete()
+                Category.objects.create(name='Garden')
+            timer.assert_called_once()
+            # The timer would run the rebuild in the background.
+            timer.call_args.args[1]()
+        self.assertEqual(len(self.get()['categories']), 3)
+        self.assertIsNotNone(cache.get(CACHE_KEY))
+
+
+@override_settings(PRODUCT_SYNC_SETTLE_SECONDS=0)
+class DeltaSyncTests(APITestCase):
+    def sync(self, since=None, limit=2):
+        params = {'limit': limit}
+        if since:
+            params['since'] = since
+        response = self.client.get('/api/products/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def drain(self, since=None):
+        changed, removed = [], []
+        while True:
+            page = self.sync(since)
+            changed += [row['sku'] for row in page['changed']]
+            removed += [(row['sku'], row['reason']) for row in page['removed']]
+            since = page['next']
+            if not page['has_more']:
+                return changed, removed, since
+
+    def test_full_then_incremental_sync(self):
+        products = make_catalog(5)
+        changed, removed, cursor = self.drain()
+        self.assertEqual(changed, [product.sku for product in products])
+        self.assertEqual(removed, [])
+
+        products[1].price = Decimal('1.00')
+        products[1].save()
+        products[2].is_active = False
+        products[2].save()
+        products[3].delete()
+
+        with self.assertNumQueries(2):
+            page = self.sync(cursor, limit=10)
+        self.assertEqual([row['sku'] for row in page['changed']], [products[1].sku])
+        self.assertEqual(
+            [(row['sku'], row['reason']) for row in page['removed']],
+            [(products[2].sku, 'deactivated'), (products[3].sku, 'deleted')]
+        )
+        self.assertEqual(self.drain(page['next'])[:2], ([], []))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products/changes/', {'since': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='partner@example.com', password='pass12345', is_staff=True)
+        self.products = make_catalog(5)
+        self.products[0].images.create(image_url='https://img.example.com/0-b.jpg', display_order=1)
+        self.products[0].images.create(
+            image_url='https://img.example.com/0-a.jpg', is_primary=True, display_order=2
+        )
+        self.products[1].images.create(image_url='https://img.example.com/1.jpg')
+
+    def export(self, **params):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/products/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_batches_image_lookups_per_chunk(self):
+        with self.assertNumQueries(1 + 3):
+            b''.join(export_catalog('ndjson', chunk_size=2))
+
+        rows = [json.loads(line) for line in self.export().decode().splitlines()]
+        self.assertEqual([row['sku'] for row in rows], [p.sku for p in self.products])
+        self.assertEqual(rows[0]['primary_image_url'], 'https://img.example.com/0-a.jpg')
+        self.assertEqual(rows[1]['primary_image_url'], 'https://img.example.com/1.jpg')
+        self.assertIsNone(rows[2]['primary_image_url'])
+
+    def test_customers_cannot_export(self):
+        customer = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        self.client.force_authenticate(customer)
+        self.assertEqual(self.client.get('/api/products/export/').status_code, 403)
+
+    def test_gzip_csv(self):
+        body = gzip.decompress(self.export(type='csv', gzip='1')).decode()
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['category_name'], 'Electronics')
+
+
+@override_settings(REQUEST_DEADLINES={'products:product-search': 0.000001, 'products:category-products': 0.05})
+class RequestDeadlineTests(APITestCase):
+    def setUp(self):
+        make_catalog(3)
+
+    def exceeded(self, route):
+        return REGISTRY.get_sample_value('db_deadline_exceeded_total', {'route': route}) or 0
+
+    def test_queries_after_the_deadline_answer_504(self):
+        before = self.exceeded('products:product-search')
+        response = self.client.get('/api/products/search/', {'q': 'Product'})
+        self.assertEqual(response.status_code, 504)
+        self.assertIn('error', response.json())
+        self.assertEqual(self.exceeded('products:product-search'), before + 1)
+        self.assertEqual(self.client.get('/api/products/').status_code, 200)
+
+        response = self.client.post(
+            '/api/batch/', {'requests': [{'path': '/api/products/search/'}, {'path': '/api/categories/'}]},
+            format='json',
+        )
+        self.assertEqual([entry['status'] for entry in response.json()['responses']], [504, 200])
+
+    def test_sqlite_statements_interrupted_at_the_deadline(self):
+        request = RequestFactory().get('/api/categories/electronics/products/')
+        request.resolver_match = resolve(request.path)
+        with self.assertRaises(DeadlineExceeded), transaction.atomic(), enforce(request):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT count(*) FROM n'
+                )
+        self.assertEqual(Product.objects.count(), 3)
+
+    @override_settings(REQUEST_DEADLINES={'products:product-autocomplete': 0.000001})
+    def test_first_index_load_is_exempt(self):
+        index = AutocompleteIndex()
+        with mock.patch('products.views.autocomplete_index', index):
+            response = self.client.get('/api/products/autocomplete/', {'q': 'prod'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(index.loaded)
+
+    def statement_timeouts(self, fake, *elapsed):
+        """Run a query at each ``elapsed`` second on ``fake``; return the SQL sent for the timeout."""
+        request = RequestFactory().get('/api/categories/electronics/products/')
+        request.resolver_match = resolve(request.path)
+        deadline = Deadline(request)
+        context = {'connection': fake, 'cursor': mock.Mock()}
+        execute = mock.Mock()
+        for seconds in elapsed:
+            with mock.patch('config.deadlines.time.monotonic', return_value=deadline.started + seconds):
+                deadline(execute, 'SELECT 1', None, False, context)
+        self.assertEqual(execute.call_count, len(elapsed))
+        return [call.args[0] for call in context['cursor'].execute.call_args_list]
+
+    def fake_postgresql(self, in_atomic_block):
+        fake = mock.MagicMock(
+            vendor='postgresql', connection=object(), in_atomic_block=in_atomic_block,
+            _statement_timeout=None, _local_statement_timeout=None, run_on_commit=[],
+        )
+        fake.on_commit.side_effect = lambda func: fake.run_on_commit.append((set(), func, False))
+        return fake
+
+    def test_postgresql_timeout_is_the_time_left(self):
+        fake = self.fake_postgresql(in_atomic_block=False)
+        self.assertEqual(
+            self.statement_timeouts(fake, 0.001, 0.002, 0.012, 0.049),
+            ['SET statement_timeout = 45', 'SET statement_timeout = 35', 'SET statement_timeout = 1'],
+        )
+        reset_statement_timeout(fake)
+        fake.cursor.return_value.__enter__.return_value.execute.assert_called_once_with('RESET statement_timeout')
+        self.assertIsNone(fake._statement_timeout)
+
+    def test_postgresql_timeout_is_local_to_the_transaction(self):
+        fake = self.fake_postgresql(in_atomic_block=True)
+        self.assertEqual(self.statement_timeouts(fake, 0.001, 0.002), ['SET LOCAL statement_timeout = 45'])
+        # The transaction ended, and the setting with it.
+        fake.run_on_commit.clear()
+        self.assertEqual(self.statement_timeouts(fake, 0.001), ['SET LOCAL statement_timeout = 45'])
+
+
+class BulkImportTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='pass12345')
+        self.category = Category.objects.create(name='Electronics')
+        self.existing = Product.objects.create(
+            name='USB-C Hub', description='Hub', price=Decimal('29.99'),
+            category=self.category, sku='HUB-1',
+        )
+
+    def upload(self, content, name):
+        self.client.force_authenticate(self.admin)
+        upload = SimpleUploadedFile(name, content if isinstance(content, bytes) else content.encode())
+        return self.client.post('/api/products/import/', {'file': upload}, format='multipart')
+
+    def test_csv_upsert_with_row_errors(self):
+        response = self.upload(
+            'sku,name,price,category,stock_quantity\n'
+            'HUB-1,USB-C Hub Pro,34.99,electronics,5\n'
+            'CAB-1,USB-C Hub,9.99,electronics,10\n'
+            'CAB-2,Cable,-1,electronics,10\n'
+            'CAB-3,Cable,4.99,missing,10\n'
+            f'CAB-4,Cable,4.99,{self.category.id},10\n',
+            'products.csv'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data['created'], response.data['updated'], response.data['failed']),
+            (2, 1, 2)
+        )
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.slug), ('USB-C Hub Pro', 'usb-c-hub'))
+        self.assertEqual(Product.objects.get(sku='CAB-1').slug, 'usb-c-hub-cab-1')
+        self.assertEqual(Product.objects.get(sku='CAB-4').slug, 'cable')
+
+    def test_jsonl_import_is_admin_only(self):
+        body = json.dumps({'sku': 'LAMP-1', 'name': 'Desk Lamp', 'price': '24.99',
+                           'category': 'electronics'}) + '\n'
+        response = self.upload(body, 'products.jsonl')
+        self.assertEqual(response.data['created'], 1)
+
+        self.client.force_authenticate(
+            User.objects.create_user(email='user@example.com', password='pass12345')
+        )
+        response = self.client.post(
+            '/api/products/import/',
+            {'file': SimpleUploadedFile('products.jsonl', body.encode())},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+    def test_unparseable_files_answer_400(self):
+        response = self.upload(b'sku,name,price,category\nCAB-1,Caf\xe9,9.99,electronics\n', 'products.csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.data['error'])
+
+        response = self.upload(
+            'sku,name,price,category\nCAB-1,Cable,9.99,electronics\n'
+            f'CAB-2,{"x" * (csv.field_size_limit() + 1)},9.99,electronics\n',
+            'products.csv'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data['error'].startswith('Row 2: Invalid CSV'))
+        self.assertEqual(response.data['created'], 1)
+
+        response = self.upload('{"sku": "CAB-3"\n[1, 2]\n', 'products.jsonl')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2])
+
+
+class SyntheticDatasetTests(TestCase):
+    VOLUMES = {
+        'users': 20, 'categories': 15, 'category_depth': 3, 'products': 60,
+        'images_per_product': 2, 'reviews': 100, 'carts': 10, 'cart_items': 3,
+        'orders': 40, 'order_items': 3,
+    }
+
+    def generate(self, **options):
+        return DatasetGenerator(self.VOLUMES, batch_size=7, log=lambda message: None, **options).run()
+
+    def test_unique_pairs_keep_every_index_range(self):
+        rng = np.random.default_rng(0)
+        left, right = _unique_pairs(
+            lambda size: (rng.integers(0, 1000, size), rng.integers(0, 1000, size)), 50_000, 1000
+        )
+        self.assertEqual(len(np.unique(left * 1000 + right)), 50_000)
+        self.assertGreater(np.count_nonzero(left >= 900), 4000)
+
+    def test_volumes_and_consistency(self):
+        stats = self.generate()
+        self.assertEqual(stats['products'][0], 60)
+        self.assertEqual(Review.objects.count(), 100)
+        self.assertEqual(Category.objects.filter(parent__isnull=True).count(), 2)
+        self.assertFalse(Product.objects.filter(category__children__isnull=False).exists())
+        self.assertEqual(
+            CartItem.objects.values('cart', 'product').distinct().count(), CartItem.objects.count()
+        )
+        for order in Order.objects.prefetch_related('items'):
+            self.assertEqual(order.total_amount, sum(item.subtotal for item in order.items.all()))
+        self.assertTrue(User.objects.first().check_password('loadtest123'))
+
+    def test_same_seed_same_data(self):
+        self.generate()
+        first = list(Product.objects.order_by('id').values_list('name', 'price', 'stock_quantity'))
+        for model in (OrderItem, Order, Product, User, Category):
+            model.objects.all().delete()
+        self.generate()
+        second = list(Product.objects.order_by('id').values_list('name', 'price', 'stock_quantity'))
+        self.assertEqual(first, second)
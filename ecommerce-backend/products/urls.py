@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductViewSet, ReviewViewSet
+from .views import CategoryViewSet, ProductViewSet, ReviewViewSet, storefront_home
 
 app_name = 'products'
 
@@ -10,5 +10,6 @@ router.register(r'products', ProductViewSet, basename='product')
 router.register(r'reviews', ReviewViewSet, basename='review')
 
 urlpatterns = [
+    path('storefront/home/', storefront_home, name='storefront-home'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,18 +1,36 @@
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
 from django.db.models import Avg, Q
-from .models import Category, Product, Review
+from django.utils.functional import SimpleLazyObject
+from importlib import import_module
+from .models import Category, Product, Review, RelatedProduct
 from .serializers import (
+    CategoryTree,
     CategorySerializer,
     ProductListSerializer,
     ProductDetailSerializer,
     ProductCreateUpdateSerializer,
+    RelatedProductSerializer,
+    ProductChangeSerializer,
     ReviewSerializer
 )
 from .filters import ProductFilter
+from .sync import changes_since, InvalidCursor
+from . import storefront
+from config.throttling import SearchThrottle
+from monitoring.metrics import record_cache
+
+# The NumPy-backed indexes (and NumPy itself) are imported on first use, so
+# workers that never serve them start faster.
+catalog_snapshot = SimpleLazyObject(lambda: import_module('products.catalog').snapshot)
+autocomplete_index = SimpleLazyObject(lambda: import_module('products.autocomplete').index)
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -25,7 +43,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
     PUT/PATCH /api/categories/{id}/ - Update category (admin only)
     DELETE /api/categories/{id}/ - Delete category (admin only)
     """
-    queryset = Category.objects.prefetch_related('children', 'products')
+    queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     lookup_field = 'slug'
@@ -34,6 +52,13 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
     
+    def get_serializer_context(self):
+        """Load the category tree once instead of per nested category."""
+        context = super().get_serializer_context()
+        if self.action in ['list', 'retrieve']:
+            context['category_tree'] = CategoryTree()
+        return context
+    
     @action(detail=True, methods=['get'])
     def products(self, request, slug=None):
         """Get all products in a category."""
@@ -74,6 +99,8 @@ class ProductViewSet(viewsets.ModelViewSet):
         queryset = Product.objects.select_related('category').prefetch_related(
             'images', 'reviews'
         )
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('reviews__user')
         
         # Show only active products to non-staff users
         if not self.request.user.is_staff:
@@ -81,6 +108,32 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def list(self, request, *args, **kwargs):
+        """
+        List products, answered from the catalog snapshot when enabled.
+        
+        The snapshot resolves filters and ordering to an ordered id list;
+        only the products of the requested page are loaded from the database.
+        """
+        ids = None
+        if settings.CATALOG_SNAPSHOT_ENABLED:
+            ids = catalog_snapshot.filter_ids(request, self)
+            record_cache('catalog_snapshot', ids is not None)
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        
+        page_ids = self.paginate_queryset(ids)
+        if page_ids is None:
+            page_ids = ids
+        page_ids = [int(pk) for pk in page_ids]
+        products = self.get_queryset().in_bulk(page_ids)
+        page = [products[pk] for pk in page_ids if pk in products]
+        
+        serializer = self.get_serializer(page, many=True)
+        if self.paginator is not None and self.paginator.page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+    
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
         if self.action == 'list':
@@ -89,6 +142,13 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductCreateUpdateSerializer
         return ProductDetailSerializer
     
+    def get_serializer_context(self):
+        """Serialize the nested category subtree of a product in bulk."""
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            context['category_tree'] = CategoryTree()
+        return context
+    
     @action(detail=True, methods=['get'])
     def reviews(self, request, slug=None):
         """Get all reviews for a product."""
@@ -98,7 +158,194 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = ReviewSerializer(reviews, many=True)
         return Response(serializer.data)
     
+    def _related_response(self, slug, kind):
+        """Serve precomputed recommendations of one kind in a single query."""
+        related = RelatedProduct.objects.filter(
+            product__slug=slug,
+            product__is_active=True,
+            kind=kind,
+            related__is_active=True,
+        ).select_related('related__category')
+        
+        serializer = RelatedProductSerializer(related, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def related(self, request, slug=None):
+        """
+        Get products frequently bought together with this product.
+        
+        Refresh with ``manage.py build_recommendations --kind copurchase``.
+        """
+        return self._related_response(slug, RelatedProduct.KIND_COPURCHASE)
+    
+    @action(detail=True, methods=['get'])
+    def similar(self, request, slug=None):
+        """
+        Get products similar in name, description and category.
+        
+        Refresh with ``manage.py build_recommendations --kind content``.
+        """
+        return self._related_response(slug, RelatedProduct.KIND_CONTENT)
+    
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser]
+    )
+    def bulk_import(self, request):
+        """
+        Bulk create/update products from an uploaded CSV or JSONL file.
+        
+        Form fields:
+        - file: the upload; columns sku, name, description, price,
+          category (id or slug), stock_quantity, is_active
+        - type: csv or jsonl (defaults to the file extension)
+        
+        Rows are upserted by SKU; the response reports per-row errors, and
+        answers 400 with an ``error`` if the file cannot be parsed.
+        """
+        # Admin-only: imported here to keep it out of worker startup
+        from .importer import import_products, FORMATS as IMPORT_FORMATS
+        
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({
+                'error': 'Upload a CSV or JSONL file in the "file" field.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        fmt = request.data.get('type') or upload.name.rsplit('.', 1)[-1].lower()
+        if fmt == 'ndjson':
+            fmt = 'jsonl'
+        if fmt not in IMPORT_FORMATS:
+            return Response({
+                'error': f"Unsupported import type: {fmt}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        report = import_products(upload.file, fmt)
+        if 'error' in report:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Stream the active catalog for partner feeds.
+        
+        Query params:
+        - type: ndjson (default) or csv
+        - gzip: set to 1 for a gzip-compressed download
+        """
+        from . import export
+        
+        fmt = request.query_params.get('type', 'ndjson')
+        if fmt not in export.FORMATS:
+            return Response({
+                'error': f"Unsupported export type: {fmt}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        
+        filename = f'products.{fmt}'
+        content_type = export.FORMATS[fmt]
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        
+        response = StreamingHttpResponse(
+            export.export_catalog(fmt, compress),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
     @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Delta sync: products created, updated, deactivated or deleted.
+        
+        Query params:
+        - since: cursor returned as ``next`` by the previous call (omit for a full sync)
+        - limit: maximum rows per stream in this page
+        
+        Keep calling with ``next`` while ``has_more`` is true.
+        """
+        try:
+            limit = int(request.query_params.get('limit', settings.PRODUCT_SYNC_PAGE_SIZE))
+        except ValueError:
+            limit = settings.PRODUCT_SYNC_PAGE_SIZE
+        limit = max(1, min(limit, settings.PRODUCT_SYNC_MAX_PAGE_SIZE))
+        
+        try:
+            page = changes_since(request.query_params.get('since'), limit)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        active = [product for product in page['products'] if product.is_active]
+        removed = [
+            {
+                'id': product.id,
+                'slug': product.slug,
+                'sku': product.sku,
+                'reason': 'deactivated',
+                'at': product.updated_at,
+            }
+            for product in page['products'] if not product.is_active
+        ] + [
+            {
+                'id': deletion.product_id,
+                'slug': deletion.slug,
+                'sku': deletion.sku,
+                'reason': 'deleted',
+                'at': deletion.deleted_at,
+            }
+            for deletion in page['deletions']
+        ]
+        
+        return Response({
+            'changed': ProductChangeSerializer(active, many=True).data,
+            'removed': removed,
+            'next': page['next'],
+            'has_more': page['has_more'],
+        })
+    
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Search-box completions for product names, SKUs and categories.
+        
+        Query params:
+        - q: prefix typed so far
+        - limit: maximum number of suggestions
+        
+        Answered from the per-worker prefix index without a database query.
+        """
+        from .autocomplete import MAX_LIMIT
+        
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', settings.AUTOCOMPLETE_MAX_RESULTS))
+        except ValueError:
+            limit = settings.AUTOCOMPLETE_MAX_RESULTS
+        limit = max(1, min(limit, MAX_LIMIT))
+        
+        return Response({
+            'query': query,
+            'results': autocomplete_index.search(query, limit),
+        })
+    
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='autocomplete/stats',
+        permission_classes=[IsAdminUser]
+    )
+    def autocomplete_stats(self, request):
+        """Report size and memory footprint of this worker's autocomplete index."""
+        return Response(autocomplete_index.stats())
+    
+    @action(detail=False, methods=['get'], throttle_classes=[SearchThrottle])
     def search(self, request):
         """
         Advanced search endpoint.
@@ -174,4 +421,16 @@ class ReviewViewSet(viewsets.ModelViewSet):
         if product_id:
             queryset = queryset.filter(product_id=product_id)
         
-        return queryset
\ No newline at end of file
+        return queryset
+
+
+@require_safe
+def storefront_home(request):
+    """
+    Storefront home page in one response: the category tree and featured,
+    newest and best-rated products per top-level category.
+    
+    GET /api/storefront/home/ - served from the precomputed document
+    (see products/storefront.py)
+    """
+    return HttpResponse(storefront.cached_document(), content_type='application/json')